@@ -0,0 +1,286 @@
+# admission.py
+"""
+Admission control for expensive requests (uploads that call Gemini).
+
+Without it one user can submit dozens of uploads and starve everyone else,
+and overload shows up as gunicorn timeouts. Every upload that is going to
+generate (not a duplicate replaying an earlier outcome, see idempotency.py)
+first asks the AdmissionController for a slot:
+
+- per-user rate quota (token bucket refilling user_rate per minute, up to user_burst)
+- per-user concurrency quota (user_inflight uploads running or queued at once)
+- global in-flight cap (global_inflight across all workers)
+- a priority queue in front of the global cap: interactive requests are
+  admitted before bulk ones, then first come first served; requests wait at
+  most max_wait seconds and the queue holds at most queue_limit of them
+
+Requests over a quota are rejected straight away with a Retry-After hint so
+the app can answer 429. State lives in a small SQLite database shared by all
+worker processes; slots are leases that expire, so a crashed worker cannot
+leak capacity. held() renews a slot's lease for as long as its job runs, so
+long generations keep counting against the cap. Waiting requests poll for
+their turn, backing off from `poll` to `max_poll` seconds.
+"""
+import asyncio
+import contextlib
+import sqlite3
+import time
+import uuid
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITIES = {"interactive": INTERACTIVE, "bulk": BULK}
+
+
+class Ticket:
+    """Outcome of an admission request: granted (with a slot to release) or rejected with retry_after"""
+
+    def __init__(self, slot=None, retry_after=0, reason=None):
+        self.slot = slot
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def granted(self):
+        return self.slot is not None
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        path="admission.db",
+        global_inflight=32,
+        user_inflight=2,
+        user_rate=10,
+        user_burst=5,
+        queue_limit=64,
+        max_wait=10.0,
+        lease=300.0,
+        poll=0.1,
+        max_poll=1.0,
+    ):
+        self.path = path
+        self.global_inflight = global_inflight
+        self.user_inflight = user_inflight
+        self.user_rate = user_rate / 60.0  # tokens per second
+        self.user_burst = user_burst
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.lease = lease
+        self.poll = poll
+        self.max_poll = max_poll
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS admission_slots(
+                slot TEXT PRIMARY KEY,
+                user_id TEXT,
+                priority INTEGER,
+                expires REAL
+            )""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS admission_waiting(
+                slot TEXT PRIMARY KEY,
+                user_id TEXT,
+                priority INTEGER,
+                enqueued REAL,
+                expires REAL
+            )""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS admission_buckets(
+                user_id TEXT PRIMARY KEY,
+                tokens REAL,
+                updated REAL
+            )""")
+            self._ready = True
+        return conn
+
+    def _attempt(self, slot, user_id, priority, waiting, user_quotas=True):
+        """
+        One admission attempt inside a write transaction. Returns a Ticket when the
+        request is decided (granted or rejected), or None if it should keep waiting.
+        """
+        now = time.time()
+        user_id = str(user_id)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM admission_slots WHERE expires < ?", (now,))
+            conn.execute("DELETE FROM admission_waiting WHERE expires < ?", (now,))
+
+            if not waiting and user_quotas:
+                # Per-user quotas are checked once, on arrival
+                user_count = conn.execute(
+                    "SELECT (SELECT COUNT(*) FROM admission_slots WHERE user_id=?)"
+                    " + (SELECT COUNT(*) FROM admission_waiting WHERE user_id=?)",
+                    (user_id, user_id),
+                ).fetchone()[0]
+                if user_count >= self.user_inflight:
+                    conn.execute("COMMIT")
+                    return Ticket(retry_after=5, reason="too many uploads in progress")
+                row = conn.execute(
+                    "SELECT tokens, updated FROM admission_buckets WHERE user_id=?", (user_id,)
+                ).fetchone()
+                tokens = self.user_burst if row is None else min(
+                    self.user_burst, row[0] + (now - row[1]) * self.user_rate
+                )
+                if tokens < 1:
+                    conn.execute("COMMIT")
+                    return Ticket(retry_after=max(1, int((1 - tokens) / self.user_rate) + 1), reason="upload rate limit")
+            else:
+                tokens = None
+
+            inflight = conn.execute("SELECT COUNT(*) FROM admission_slots").fetchone()[0]
+            enqueued = now
+            if waiting:
+                enqueued = conn.execute(
+                    "SELECT enqueued FROM admission_waiting WHERE slot=?", (slot,)
+                ).fetchone()
+                enqueued = enqueued[0] if enqueued else now
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM admission_waiting WHERE slot<>? AND "
+                "(priority < ? OR (priority = ? AND enqueued < ?))",
+                (slot, priority, priority, enqueued),
+            ).fetchone()[0]
+
+            if inflight < self.global_inflight and ahead == 0:
+                conn.execute("DELETE FROM admission_waiting WHERE slot=?", (slot,))
+                conn.execute(
+                    "INSERT INTO admission_slots(slot, user_id, priority, expires) VALUES(?,?,?,?)",
+                    (slot, user_id, priority, now + self.lease),
+                )
+                self._take_token(conn, user_id, now, tokens)
+                conn.execute("COMMIT")
+                return Ticket(slot=slot)
+
+            if not waiting:
+                queued = conn.execute("SELECT COUNT(*) FROM admission_waiting").fetchone()[0]
+                if queued >= self.queue_limit:
+                    conn.execute("COMMIT")
+                    return Ticket(retry_after=10, reason="server busy")
+                conn.execute(
+                    "INSERT INTO admission_waiting(slot, user_id, priority, enqueued, expires) VALUES(?,?,?,?,?)",
+                    (slot, user_id, priority, now, now + self.max_wait + 30),
+                )
+                # The rate quota is charged on arrival, even if the request then waits
+                self._take_token(conn, user_id, now, tokens)
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _take_token(self, conn, user_id, now, tokens):
+        if tokens is None:
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO admission_buckets(user_id, tokens, updated) VALUES(?,?,?)",
+            (user_id, tokens - 1, now),
+        )
+
+    def _give_up(self, slot):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM admission_waiting WHERE slot=?", (slot,))
+        finally:
+            conn.close()
+
+    def acquire(self, user_id, priority=INTERACTIVE, user_quotas=True):
+        """
+        Blocking admission; returns a Ticket (check .granted). user_quotas=False skips
+        the per-user quotas (operator batch runs) but still waits for the global cap.
+        """
+        slot = uuid.uuid4().hex
+        deadline = time.monotonic() + self.max_wait
+        ticket = self._attempt(slot, user_id, priority, waiting=False, user_quotas=user_quotas)
+        delay = self.poll
+        while ticket is None:
+            if time.monotonic() >= deadline:
+                self._give_up(slot)
+                return Ticket(retry_after=10, reason="server busy")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_poll)
+            ticket = self._attempt(slot, user_id, priority, waiting=True)
+        return ticket
+
+    async def acquire_async(self, user_id, priority=INTERACTIVE, user_quotas=True):
+        """Coroutine version of acquire(): waits in the queue without blocking the event loop"""
+        slot = uuid.uuid4().hex
+        deadline = time.monotonic() + self.max_wait
+        ticket = await asyncio.to_thread(self._attempt, slot, user_id, priority, False, user_quotas)
+        delay = self.poll
+        while ticket is None:
+            if time.monotonic() >= deadline:
+                await asyncio.to_thread(self._give_up, slot)
+                return Ticket(retry_after=10, reason="server busy")
+            await asyncio.sleep(delay)
+            # Every attempt is a write transaction; waiters back off so they do not crowd the database
+            delay = min(delay * 2, self.max_poll)
+            ticket = await asyncio.to_thread(self._attempt, slot, user_id, priority, True)
+        return ticket
+
+    def renew(self, ticket):
+        """Extend a granted slot's lease; False if it had already expired"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "UPDATE admission_slots SET expires=? WHERE slot=?", (time.time() + self.lease, ticket.slot)
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    async def _keep_alive(self, ticket):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(self.renew, ticket)
+
+    @contextlib.asynccontextmanager
+    async def held(self, ticket):
+        """Hold a granted slot for the duration of the block, renewing its lease, then release it"""
+        renewing = asyncio.ensure_future(self._keep_alive(ticket))
+        try:
+            yield ticket
+        finally:
+            renewing.cancel()
+            await asyncio.to_thread(self.release, ticket)
+
+    def release(self, ticket):
+        if not ticket.granted:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM admission_slots WHERE slot=?", (ticket.slot,))
+        finally:
+            conn.close()
+
+    def snapshot(self):
+        """Current in-flight and queued requests by priority, plus the configured limits"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            inflight = dict(conn.execute(
+                "SELECT priority, COUNT(*) FROM admission_slots WHERE expires >= ? GROUP BY priority", (now,)
+            ).fetchall())
+            waiting = dict(conn.execute(
+                "SELECT priority, COUNT(*) FROM admission_waiting WHERE expires >= ? GROUP BY priority", (now,)
+            ).fetchall())
+        finally:
+            conn.close()
+        names = {v: k for k, v in PRIORITIES.items()}
+        return {
+            "inflight": {names[p]: inflight.get(p, 0) for p in names},
+            "waiting": {names[p]: waiting.get(p, 0) for p in names},
+            "limits": {
+                "global_inflight": self.global_inflight,
+                "user_inflight": self.user_inflight,
+                "user_rate_per_min": round(self.user_rate * 60, 2),
+                "user_burst": self.user_burst,
+                "queue_limit": self.queue_limit,
+                "max_wait_s": self.max_wait,
+            },
+        }
+
@@ -0,0 +1,80 @@
+# aio.py
+"""
+Helpers for the coroutine routes used by the async serving mode.
+
+SQLite, boto3 and text extraction are blocking, so they are pushed onto a
+shared I/O thread pool with run_io() while the event loop keeps serving other
+requests. Gemini calls use google-genai's native async client. Async clients
+hold connection pools bound to one event loop, so one client is kept per loop:
+under an ASGI server (asgi.py) that is a single long-lived client, under plain
+WSGI each request gets a short-lived one.
+
+Work that outlives its request (processing a direct-to-S3 upload) runs on a
+BackgroundLoop: an event loop on a daemon thread of the worker process.
+"""
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+_io_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ASYNC_IO_THREADS", "64")),
+    thread_name_prefix="aio-io",
+)
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking call (SQLite, S3, extraction) on the shared I/O thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(fn, *args, **kwargs))
+
+
+class AsyncGemini:
+    """google-genai async clients, one per running event loop"""
+
+    def __init__(self, client_factory):
+        # client_factory() returns a configured genai.Client
+        self._client_factory = client_factory
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._client_factory().aio
+            self._clients[loop] = client
+        return client
+
+    async def generate(self, model, contents, **kwargs):
+        resp = await self.client().models.generate_content(model=model, contents=contents, **kwargs)
+        return resp.text
+
+
+class BackgroundLoop:
+    """An event loop on a daemon thread, started on first use (so after gunicorn forks)"""
+
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # The thread does not survive a fork; the child starts its own on demand
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure())
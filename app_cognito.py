@@ -1,38 +1,63 @@
+import time
+_module_started = time.perf_counter()
+
 from dotenv import load_dotenv
 import os
 
 # Load .env file manually
 load_dotenv()
 
-import sqlite3, io, json, hmac, hashlib, base64
-from flask import Flask, request, render_template, redirect, url_for, session, send_file, flash, Response
+import sqlite3, io, json, hmac, hashlib, base64, asyncio
+from flask import Flask, request, render_template, redirect, url_for, session, send_file, flash, Response, jsonify, abort, g
 from werkzeug.security import generate_password_hash, check_password_hash
-import boto3
-from google import genai
-from PyPDF2 import PdfReader
-from pptx import Presentation
-from docx import Document
-import requests
 from functools import wraps
+import inspect
+
+# boto3, google-genai, PyPDF2, python-pptx, python-docx and reportlab load on
+# first use (or once in the gunicorn master, see gunicorn.conf.py)
+import startup
+from startup import LazyClient, load, require_env
 
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
-from pptx.dml.color import RGBColor
-
-# PDF Generation imports
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT, TA_CENTER
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
+# Rendering (PDF, PPTX, mind map exports) runs in a shared process pool; the
+# renderers are named as "module:function" so only the pool imports them
+from render_pool import RenderPool, RenderError
+from concurrent.futures import TimeoutError as FutureTimeout
+from sandbox import Sandbox, SandboxBusy, SandboxError
+from storage import get_artifact, make_storage, put_artifact, read_artifact, safe_filename
+from direct_upload import (
+    MAX_ATTEMPTS, MAX_UPLOAD_BYTES, UPLOAD_URL_TTL, claim_upload, fail_upload, finish_upload,
+    find_upload, in_progress, queue_upload, stale_uploads, take_finished, upload_key, upload_serializer,
+)
+from itsdangerous import BadSignature
+from blob_store import BlobStore, blob_hash
+from idempotency import IdempotencyStore, idempotency_key
+from model_router import ModelRouter, default_routes, parse_experiment, record_route, route_stats
+from admission import AdmissionController, PRIORITIES, INTERACTIVE
+from jwt_verify import TokenError, TokenVerifier
+from user_directory import UserDirectory
+from session_store import SqliteSessionInterface
+RENDER_MARKDOWN_PDF = "markdown_pdf:render_markdown_pdf"
+RENDER_FLASHCARDS_PPTX = "flashcards_pptx:render_flashcards_pptx"
 import re
 
+from mindmap_export import MindmapExporter
+from aio import AsyncGemini, BackgroundLoop, run_io
+from mindmap_index import MindmapIndexCache
+# Picks the most informative spans of long documents for the prompt budget
+from prompt_window import select_window
+from text_normalize import normalize_text
+from extractors import default_registry
+from doc_similarity import add_signature, find_similar, get_signature, minhash
+from incremental import (
+    MERGERS, chunk_hash, item_counts, load_chunk_outputs, save_chunk_outputs, split_chunks,
+)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-key")
+# Sessions live server-side; the cookie only carries an opaque session id
+app.session_interface = SqliteSessionInterface(os.environ.get("SESSION_DB", "sessions.db"))
+# ...so a user can end all of them at once (the "Sign Out Everywhere" link, see signout_all)
+app.config["SIGNOUT_EVERYWHERE"] = True
 
 # AWS Cognito Configuration
 COGNITO_REGION = os.environ.get("COGNITO_REGION", "us-east-1")
@@ -40,8 +65,13 @@ COGNITO_USER_POOL_ID = os.environ.get("COGNITO_USER_POOL_ID")
 COGNITO_CLIENT_ID = os.environ.get("COGNITO_CLIENT_ID")
 COGNITO_DOMAIN = os.environ.get("COGNITO_DOMAIN", "studymate-auth")
 
-# Initialize Cognito client
-cognito_client = boto3.client('cognito-idp', region_name=COGNITO_REGION)
+# Cognito client (built on first use)
+get_cognito = LazyClient(lambda: load("boto3").client('cognito-idp', region_name=COGNITO_REGION))
+
+# ID tokens are verified locally against the pool's cached signing keys
+token_verifier = TokenVerifier(COGNITO_REGION, COGNITO_USER_POOL_ID, COGNITO_CLIENT_ID)
+# Refresh the tokens this many seconds before the ID token expires
+TOKEN_REFRESH_MARGIN = int(os.environ.get("TOKEN_REFRESH_MARGIN", "300"))
 
 # SQLite setup - Modified to use Cognito user IDs
 def get_db():
@@ -61,37 +91,269 @@ def get_db():
         kind TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )""")
+    # Near-duplicate index (see doc_similarity.py)
+    conn.execute("""CREATE TABLE IF NOT EXISTS doc_signatures(
+        job_id INTEGER PRIMARY KEY,
+        signature BLOB
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS doc_lsh(
+        band INTEGER,
+        bucket INTEGER,
+        job_id INTEGER
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS doc_lsh_bucket ON doc_lsh(band, bucket)")
+    # Per-chunk outputs for incremental regeneration (see incremental.py)
+    conn.execute("""CREATE TABLE IF NOT EXISTS chunk_outputs(
+        job_id INTEGER,
+        chunk_hash TEXT,
+        output TEXT,
+        PRIMARY KEY (job_id, chunk_hash)
+    )""")
+    # Content-addressed inputs and the jobs referencing them (see blob_store.py)
+    conn.execute("""CREATE TABLE IF NOT EXISTS input_blobs(
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER,
+        content_type TEXT,
+        refs INTEGER DEFAULT 0,
+        pending INTEGER DEFAULT 0,
+        last_used REAL
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS job_inputs(
+        job_id INTEGER PRIMARY KEY,
+        sha256 TEXT
+    )""")
+    # Model route and generation time of each generation (see model_router.py)
+    conn.execute("""CREATE TABLE IF NOT EXISTS job_routes(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER,
+        kind TEXT,
+        route TEXT,
+        model TEXT,
+        arm TEXT,
+        chars INTEGER,
+        seconds REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    # Idempotency keys of recent uploads and their outcome (see idempotency.py)
+    conn.execute("""CREATE TABLE IF NOT EXISTS upload_requests(
+        key TEXT PRIMARY KEY,
+        user_id INTEGER,
+        status TEXT,
+        job_id INTEGER,
+        message TEXT,
+        updated REAL
+    )""")
+    # Direct-to-S3 uploads waiting for or in background processing (see direct_upload.py)
+    conn.execute("""CREATE TABLE IF NOT EXISTS direct_uploads(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        kind TEXT,
+        filename TEXT,
+        s3_input_key TEXT,
+        status TEXT DEFAULT 'queued',
+        message TEXT,
+        job_id INTEGER,
+        notified INTEGER DEFAULT 0,
+        attempts INTEGER DEFAULT 0,
+        updated REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    # One upload per staging key: a completion token is redeemed once
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS direct_uploads_key ON direct_uploads(s3_input_key)")
     return conn
 
-# AWS S3
-S3_BUCKET = os.environ["S3_BUCKET"]
+# Cognito sub -> local user id and user profiles, cached per process
+users = UserDirectory(get_db, ttl=int(os.environ.get("USER_CACHE_TTL", "300")))
+
+# AWS S3 (client built on first use, so the app starts without S3 settings)
+S3_BUCKET = os.environ.get("S3_BUCKET")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
-s3 = boto3.client("s3", region_name=AWS_REGION)
+
+def new_s3_client():
+    require_env("S3_BUCKET")
+    return load("boto3").client("s3", region_name=AWS_REGION)
+
+get_s3 = LazyClient(new_s3_client)
+
+# Uploads and artifacts: "s3", "local" (files under STORAGE_DIR) or "tiered"
+# (write-through to S3, reads served from STORAGE_DIR)
+storage = make_storage(
+    os.environ.get("STORAGE_BACKEND", "s3"),
+    get_s3_client=get_s3,
+    bucket=S3_BUCKET,
+    local_dir=os.environ.get("STORAGE_DIR", "storage"),
+)
+# Uploaded inputs, stored once per distinct content
+blobs = BlobStore(storage, get_db)
 
 # Gemini client
-ai = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+def new_genai_client():
+    return load("google.genai").Client(api_key=require_env("GEMINI_API_KEY"))
+
+# Async Gemini clients for the coroutine routes (one per event loop)
+gemini_async = AsyncGemini(new_genai_client)
+
+# CPU-bound rendering pool, sized to the machine's cores by default
+render_pool = RenderPool(
+    max_workers=int(os.environ.get("RENDER_WORKERS", "0")) or None,
+    max_queue=int(os.environ.get("RENDER_QUEUE_LIMIT", "0")) or None,
+    timeout=float(os.environ.get("RENDER_TIMEOUT", "60")),
+)
+
+# Document parsing runs in worker processes with per-document CPU time, memory and
+# wall-clock limits, recycled every EXTRACT_MAX_DOCS documents (see sandbox.py)
+extract_sandbox = Sandbox(
+    max_workers=int(os.environ.get("EXTRACT_WORKERS", "2")),
+    timeout=float(os.environ.get("EXTRACT_TIMEOUT", "60")),
+    cpu_seconds=float(os.environ.get("EXTRACT_CPU_SECONDS", "30")),
+    memory_mb=int(os.environ.get("EXTRACT_MEMORY_MB", "1024")),
+    max_tasks=int(os.environ.get("EXTRACT_MAX_DOCS", "50")),
+)
+
+# Server-side mind map exports (rendered off the request thread, cached per job)
+mindmap_exporter = MindmapExporter(
+    max_workers=int(os.environ.get("MINDMAP_EXPORT_WORKERS", "2")),
+    cache_size=int(os.environ.get("MINDMAP_EXPORT_CACHE_SIZE", "64")),
+    run=render_pool.run,
+    # The render's own timeout plus time to load the mind map from storage
+    timeout=render_pool.timeout + 30,
+)
+
+# Per-job mind map indexes for the lazy subtree API
+mindmap_indexes = MindmapIndexCache(max_entries=int(os.environ.get("MINDMAP_INDEX_CACHE_SIZE", "128")))
+MINDMAP_INITIAL_DEPTH = 2
+MINDMAP_MAX_DEPTH = 8
+
+# Near-duplicate uploads: similarity above which the user is offered the earlier
+# output (above 1 disables the check), and whether to look across all users'
+# jobs ("global") or only their own
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.8"))
+DEDUP_SCOPE = os.environ.get("DEDUP_SCOPE", "user")
+
+# Upload admission control: per-user quotas, a global in-flight cap and an
+# interactive-before-bulk queue, shared by all worker processes
+admission = AdmissionController(
+    path=os.environ.get("ADMISSION_DB", "admission.db"),
+    global_inflight=int(os.environ.get("ADMISSION_GLOBAL_INFLIGHT", "32")),
+    user_inflight=int(os.environ.get("ADMISSION_USER_INFLIGHT", "2")),
+    user_rate=float(os.environ.get("ADMISSION_USER_RATE", "10")),
+    user_burst=int(os.environ.get("ADMISSION_USER_BURST", "5")),
+    queue_limit=int(os.environ.get("ADMISSION_QUEUE_LIMIT", "64")),
+    max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", "10")),
+)
+
+# Direct-to-S3 uploads (needs the s3 or tiered storage backend and a bucket CORS
+# rule allowing POST from the site); processed on a per-worker background loop
+DIRECT_UPLOADS = os.environ.get("DIRECT_UPLOADS", "0") == "1"
+if DIRECT_UPLOADS and not storage.supports_presigned_post:
+    # Fail at startup rather than answering every /upload/presign with an error
+    raise RuntimeError("DIRECT_UPLOADS=1 needs the s3 or tiered storage backend")
+upload_tokens = upload_serializer(app.secret_key)
+background_loop = BackgroundLoop("direct-uploads")
+# Uploads processing for longer than this are taken to be lost with their worker and queued again
+DIRECT_UPLOAD_LEASE = float(os.environ.get("DIRECT_UPLOAD_LEASE", "1800"))
+
+# Duplicate submissions of an upload (double clicks, retries) share the first one's
+# generation; finished outcomes are replayed for IDEMPOTENCY_TTL seconds, and a duplicate
+# waits up to IDEMPOTENCY_WAIT seconds for a running one before reporting it still running
+upload_requests = IdempotencyStore(
+    get_db,
+    ttl=float(os.environ.get("IDEMPOTENCY_TTL", "600")),
+    wait=float(os.environ.get("IDEMPOTENCY_WAIT", "60")),
+)
+
+async def admit(user_id, fields):
+    """
+    Ask admission control for a generation slot (check .granted). Send "X-Priority: bulk"
+    (or a priority=bulk form field) for scripted/batch uploads so interactive ones go first.
+    """
+    priority = PRIORITIES.get(request.headers.get("X-Priority") or fields.get("priority", ""), INTERACTIVE)
+    return await admission.acquire_async(user_id, priority)
+
+
+def over_quota(ticket):
+    """429 with Retry-After for a request admission control turned away"""
+    return (
+        f"Too many requests ({ticket.reason}), please retry in {ticket.retry_after}s",
+        429,
+        {"Retry-After": str(ticket.retry_after)},
+    )
+
+def start_token_session(result, refresh_token=None):
+    """Verify the ID token of an AuthenticationResult and keep what the session needs; returns the claims"""
+    claims = token_verifier.verify(result["IdToken"], token_use="id")
+    session["refresh_token"] = refresh_token or result["RefreshToken"]
+    session["token_expires"] = claims["exp"]
+    return claims
+
+def tokens_expiring():
+    expires = session.get("token_expires")
+    return expires is not None and expires - TOKEN_REFRESH_MARGIN <= time.time()
 
-# Authentication decorator
+def fetch_refreshed_tokens(refresh_token):
+    """New AuthenticationResult for a refresh token, or None (no request context needed, so it can run in run_io)"""
+    try:
+        response = get_cognito().initiate_auth(
+            ClientId=COGNITO_CLIENT_ID,
+            AuthFlow='REFRESH_TOKEN_AUTH',
+            AuthParameters={'REFRESH_TOKEN': refresh_token}
+        )
+    except Exception as e:
+        app.logger.info("Token refresh failed: %s", e)
+        return None
+    return response['AuthenticationResult']
+
+def apply_refreshed_tokens(result):
+    """Store refreshed tokens in the session; False if the user must sign in again"""
+    if result is None:
+        return False
+    try:
+        claims = start_token_session(result, session["refresh_token"])
+    except TokenError as e:
+        app.logger.warning("Rejected refreshed Cognito token: %s", e)
+        return False
+    return claims["sub"] == session.get("cognito_sub", claims["sub"])
+
+def _signed_out():
+    session.clear()
+    flash("Your session has expired. Please sign in again.")
+    return redirect(url_for("signin"))
+
+# Authentication decorator (works for both plain and coroutine views)
 def login_required(f):
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            if "user_id" not in session:
+                flash("Please sign in to continue.")
+                return redirect(url_for("signin"))
+            if tokens_expiring():
+                result = await run_io(fetch_refreshed_tokens, session["refresh_token"])
+                if not apply_refreshed_tokens(result):
+                    return _signed_out()
+            g.user = users.profile(session["user_id"])
+            if g.user is None:
+                return _signed_out()
+            return await f(*args, **kwargs)
+        return decorated_coroutine
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if "user_id" not in session:
             flash("Please sign in to continue.")
             return redirect(url_for("signin"))
+        if tokens_expiring():
+            if not apply_refreshed_tokens(fetch_refreshed_tokens(session["refresh_token"])):
+                return _signed_out()
+        g.user = users.profile(session["user_id"])
+        if g.user is None:
+            return _signed_out()
         return f(*args, **kwargs)
     return decorated_function
 
-# Helper function to get or create user in local DB
+# Helper function to get or create user in local DB (upsert, cached per process)
 def get_or_create_user(cognito_sub, email):
-    db = get_db()
-    user = db.execute("SELECT id FROM users WHERE cognito_sub=?", (cognito_sub,)).fetchone()
-    
-    if not user:
-        db.execute("INSERT INTO users(cognito_sub, email) VALUES(?,?)", (cognito_sub, email))
-        db.commit()
-        user = db.execute("SELECT id FROM users WHERE cognito_sub=?", (cognito_sub,)).fetchone()
-    
-    return user[0]
+    return users.resolve(cognito_sub, email)
 
 @app.route("/")
 def index():
@@ -107,7 +369,7 @@ def signup():
         
         try:
             # Sign up user in Cognito
-            response = cognito_client.sign_up(
+            response = get_cognito().sign_up(
                 ClientId=COGNITO_CLIENT_ID,
                 Username=email,
                 Password=password,
@@ -119,9 +381,9 @@ def signup():
             flash("Account created! Please check your email to verify your account.", "success")
             return redirect(url_for("signin"))
             
-        except cognito_client.exceptions.UsernameExistsException:
+        except get_cognito().exceptions.UsernameExistsException:
             flash("This email is already registered.", "error")
-        except cognito_client.exceptions.InvalidPasswordException:
+        except get_cognito().exceptions.InvalidPasswordException:
             flash("Password does not meet requirements. Use at least 8 characters with uppercase, lowercase, numbers, and special characters.", "error")
         except Exception as e:
             flash(f"Sign up failed: {str(e)}", "error")
@@ -136,7 +398,7 @@ def signin():
         
         try:
             # Authenticate with Cognito
-            response = cognito_client.initiate_auth(
+            response = get_cognito().initiate_auth(
                 ClientId=COGNITO_CLIENT_ID,
                 AuthFlow='USER_PASSWORD_AUTH',
                 AuthParameters={
@@ -145,13 +407,11 @@ def signin():
                 }
             )
             
-            # Get user attributes
-            access_token = response['AuthenticationResult']['AccessToken']
-            user_info = cognito_client.get_user(AccessToken=access_token)
-            
-            # Extract user details
-            cognito_sub = user_info['Username']
-            user_email = next((attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'email'), email)
+            # User details come from the verified ID token (no get_user round trip)
+            session.clear()
+            claims = start_token_session(response['AuthenticationResult'])
+            cognito_sub = claims['sub']
+            user_email = claims.get('email', email)
             
             # Store in local database
             user_id = get_or_create_user(cognito_sub, user_email)
@@ -159,15 +419,19 @@ def signin():
             # Set session
             session["user_id"] = user_id
             session["email"] = user_email
-            session["access_token"] = access_token
+            session["cognito_sub"] = cognito_sub
             
             flash("Welcome back!", "success")
             return redirect(url_for("dashboard"))
             
-        except cognito_client.exceptions.NotAuthorizedException:
+        except get_cognito().exceptions.NotAuthorizedException:
             flash("Invalid email or password.", "error")
-        except cognito_client.exceptions.UserNotConfirmedException:
+        except get_cognito().exceptions.UserNotConfirmedException:
             flash("Please verify your email address first. Check your inbox for the verification link.", "error")
+        except TokenError as e:
+            session.clear()
+            app.logger.warning("Rejected Cognito token: %s", e)
+            flash("Sign in failed: could not verify your session.", "error")
         except Exception as e:
             flash(f"Sign in failed: {str(e)}", "error")
     
@@ -184,6 +448,10 @@ def verify():
 @login_required
 def dashboard():
     db = get_db()
+    recover_direct_uploads(session["user_id"])
+    # Results of direct uploads processed in the background since the last visit
+    for status, message in take_finished(db, session["user_id"]):
+        flash(message, "success" if status == "done" else "error")
     items = db.execute(
         "SELECT id,title,kind,s3_output_key,s3_input_key FROM jobs WHERE user_id=? ORDER BY id DESC",
         (session["user_id"],)
@@ -202,58 +470,135 @@ def dashboard():
             'original_filename': original_filename
         })
     
-    return render_template("dashboard.html", title="Dashboard", items=items_with_filenames)
+    return render_template(
+        "dashboard.html", title="Dashboard", items=items_with_filenames,
+        pending=session.get("pending_upload"),
+        processing=in_progress(db, session["user_id"]),
+        direct_upload=DIRECT_UPLOADS,
+    )
 
 @app.route("/signout")
 def signout():
-    # Sign out from Cognito
-    if "access_token" in session:
+    # Sign out from Cognito (revoking the refresh token also revokes its access tokens)
+    if "refresh_token" in session:
         try:
-            cognito_client.global_sign_out(AccessToken=session["access_token"])
+            get_cognito().revoke_token(Token=session["refresh_token"], ClientId=COGNITO_CLIENT_ID)
         except:
             pass  # Token might be expired
-    
+    # Ends this session only (clearing deletes it); the user's other devices stay signed in
     session.clear()
     flash("Successfully signed out.", "success")
     return redirect(url_for("signin"))
 
-def s3_put_fileobj(fileobj, key, content_type):
-    s3.upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs={"ContentType": content_type or "application/octet-stream"})
-
-def extract_text_from_pdf(file_stream):
-    file_stream.seek(0)
-    reader = PdfReader(file_stream)
-    texts = []
-    for p in reader.pages:
-        texts.append(p.extract_text() or "")
-    return "\n".join(texts)
-
-def extract_text_from_pptx(file_stream):
-    file_stream.seek(0)
-    prs = Presentation(file_stream)
-    out = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                out.append(shape.text)
-    return "\n".join(out)
-
-def extract_text_from_docx(file_stream):
-    file_stream.seek(0)
-    doc = Document(file_stream)
-    return "\n".join(p.text for p in doc.paragraphs)
+@app.route("/signout/all")
+@login_required
+def signout_all():
+    """Sign out everywhere: end every session of the user (their other devices included)"""
+    if "refresh_token" in session:
+        try:
+            get_cognito().revoke_token(Token=session["refresh_token"], ClientId=COGNITO_CLIENT_ID)
+        except:
+            pass  # Token might be expired
+    count = app.session_interface.revoke_user(session["user_id"])
+    session.clear()
+    flash(f"Signed out of {count} session(s).", "success")
+    return redirect(url_for("signin"))
+
+
+def fetch_job(job_id, user_id, columns):
+    """Fetch selected columns of one of the user's jobs (None if not theirs)"""
+    db = get_db()
+    return db.execute(
+        f"SELECT {columns} FROM jobs WHERE id=? AND user_id=?",
+        (job_id, user_id),
+    ).fetchone()
+
+def record_job(user_id, title, key_in, out_key, kind):
+    db = get_db()
+    cur = db.execute(
+        "INSERT INTO jobs(user_id,title,s3_input_key,s3_output_key,kind) VALUES(?,?,?,?,?)",
+        (user_id, title, key_in, out_key, kind),
+    )
+    db.commit()
+    return cur.lastrowid
+
+# Extraction backends per sniffed content type, benchmarked on the first documents of each (see extractors.py)
+# A document that breaks the sandbox's limits fails outright rather than trying the next backend
+extractors = default_registry(
+    int(os.environ.get("EXTRACTOR_CALIBRATION_DOCS", "5")), run=extract_sandbox.run, abort_on=(SandboxError,)
+)
+
+def extract_text(filename, data):
+    """Extract text from uploaded bytes with the best backend for their sniffed content type"""
+    text, backend, content_type = extractors.extract(
+        data, filename, log=lambda message, e: app.logger.warning("%s: %s", message, e)
+    )
+    app.logger.info("Extracted %s as %s with %s", filename, content_type, backend or "no backend")
+    return text
+
+def prepare_text(filename, data):
+    """Extract text and strip repeated headers/footers and boilerplate before generation"""
+    text, stats = normalize_text(extract_text(filename, data))
+    app.logger.info(
+        "Normalized %s: %d -> %d chars (%d saved, %d lines removed)",
+        filename, stats["chars_in"], stats["chars_out"], stats["chars_saved"], stats["lines_removed"],
+    )
+    return text
+
+def replay_upload(status, job_id, message, notify=flash):
+    """Report the outcome of an identical upload submitted earlier"""
+    if status == "running":
+        notify("This file is still being processed from an earlier upload; it will appear here when ready.")
+    else:
+        notify(message)
+
+
+async def discard_input(stored, digest):
+    """Clean up after a failed upload: end its pending use of the input blob (dropping an unused blob)"""
+    try:
+        await stored
+    except Exception:
+        return
+    await run_io(blobs.discard, digest)
+
+
+def input_text(digest, filename, data=None):
+    """prepare_text() of an input blob, extracted once per distinct file and then cached next to it"""
+    text = blobs.get_text(digest)
+    if text is None:
+        text = prepare_text(filename, data if data is not None else blobs.get(digest))
+        blobs.put_text(digest, text)
+    return text
 
 # Gemini helpers
 MODEL_ID = "gemini-2.0-flash"
 
-def summarize_text(text):
-    prompt = "Summarize into concise bullet points with clear headings:\n\n" + text[:20000]
-    resp = ai.models.generate_content(model=MODEL_ID, contents=prompt)
-    return resp.text
+# Model, output budget and settings per job (see model_router.py). MODEL_SLO "latency"
+# (prefer routes whose recent p90 is within MODEL_LATENCY_SLO seconds) or "cost";
+# MODEL_EXPERIMENT "a:b:fraction" sends that share of route a's jobs to route b
+model_router = ModelRouter(
+    *default_routes(
+        MODEL_ID,
+        os.environ.get("MODEL_FAST", "gemini-2.0-flash-lite"),
+        mindmap_model=os.environ.get("MODEL_MINDMAP") or None,
+        mindmap_tokens=int(os.environ.get("MINDMAP_MAX_OUTPUT_TOKENS", "8192")),
+    ),
+    slo=os.environ.get("MODEL_SLO") or None,
+    latency_slo=float(os.environ.get("MODEL_LATENCY_SLO", "30")),
+    experiment=parse_experiment(os.environ.get("MODEL_EXPERIMENT", "")),
+)
 
-def generate_mcqs(text):
-    prompt = (
-        "Create 15 multiple choice questions from the following content. "
+async def generate_text_async(prompt, route=None, kind=None):
+    if route is None:
+        return await gemini_async.generate(MODEL_ID, prompt)
+    return await gemini_async.generate(route.model, prompt, config=route.config(kind))
+
+def summarize_prompt(text):
+    return "Summarize into concise bullet points with clear headings:\n\n" + select_window(text)
+
+def mcq_prompt(text, count=15):
+    return (
+        f"Create {count} multiple choice questions from the following content. "
         "Return ONLY valid JSON (no markdown, no backticks) in this exact format:\n"
         "{\n"
         '  "questions": [\n'
@@ -266,38 +611,32 @@ def generate_mcqs(text):
         '  ]\n'
         "}\n\n"
         "Rules:\n"
-        "- Create 15 questions total\n"
+        f"- Create {count} questions total\n"
         "- Each question must have exactly 4 options\n"
         "- 'correct' is the index (0-3) of the correct answer\n"
         "- Include brief explanation for each answer\n"
         "- Mix easy, medium, and hard difficulty questions\n"
         "- Cover different aspects of the content\n\n"
-        "Content:\n" + text[:20000]
+        "Content:\n" + select_window(text)
     )
-    resp = ai.models.generate_content(model=MODEL_ID, contents=prompt)
-    return resp.text
 
-def make_notes(text):
-    prompt = (
+def notes_prompt(text):
+    return (
         "Convert into well-structured study notes with sections, subheadings, terms, and brief definitions:\n\n"
-        + text[:20000]
+        + select_window(text)
     )
-    resp = ai.models.generate_content(model=MODEL_ID, contents=prompt)
-    return resp.text
 
-def generate_flashcards(text):
-    prompt = (
-        "Create 15-20 flashcards from the following content. Format each flashcard as:\n"
+def flashcards_prompt(text, count="15-20"):
+    return (
+        f"Create {count} flashcards from the following content. Format each flashcard as:\n"
         "FRONT: [Question/Term/Concept]\n"
         "BACK: [Answer/Definition/Explanation]\n\n"
         "Make the flashcards concise, clear, and focused on key concepts. Include important terms, definitions, formulas, and key facts.\n\n"
-        + text[:20000]
+        + select_window(text)
     )
-    resp = ai.models.generate_content(model=MODEL_ID, contents=prompt)
-    return resp.text
 
-def generate_mindmap(text):
-    prompt = (
+def mindmap_prompt(text):
+    return (
         "Create a comprehensive hierarchical mind map structure from the following content. "
         "Return ONLY valid JSON (no markdown, no backticks, no explanation) in this exact format:\n"
         "{\n"
@@ -333,266 +672,538 @@ def generate_mindmap(text):
         "- Use shorter phrases for deeper levels\n"
         "- Focus on key concepts, definitions, examples, and relationships\n"
         "- Ensure comprehensive coverage of the content\n\n"
-        "Content:\n" + text[:20000]
+        "Content:\n" + select_window(text)
     )
-    resp = ai.models.generate_content(model=MODEL_ID, contents=prompt)
-    return resp.text
 
+# kind -> (prompt builder, output title)
+GENERATORS = {
+    "summarize": (summarize_prompt, "Summary"),
+    "mcq": (mcq_prompt, "MCQ Quiz"),
+    "notes": (notes_prompt, "Notes"),
+    "flashcards": (flashcards_prompt, "Flash Cards"),
+    "mindmap": (mindmap_prompt, "Mind Map"),
+}
+
+# Kinds generated chunk by chunk, so a re-upload of the same file only regenerates
+# the chunks that changed: (prompt, items per document split over the chunks, or None)
+CHUNK_PROMPTS = {
+    "notes": (notes_prompt, None),
+    "flashcards": (flashcards_prompt, 18),
+    "mcq": (mcq_prompt, 15),
+}
 
-def create_pdf_document(content, title, doc_type="summary"):
+
+def output_location(user_id, title, filename, kind, version):
     """
-    Create a professionally formatted PDF document
-    doc_type: 'summary' or 'notes'
+    S3 key and content type of a generated output - PDF for summarize/notes, JSON for mindmap/mcq,
+    TXT for flashcards. version (the output's content hash) makes the key immutable, so jobs
+    reusing an output are not changed by a later upload of the same file name.
     """
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter,
-                            rightMargin=72, leftMargin=72,
-                            topMargin=72, bottomMargin=72)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#4f46e5'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#4f46e5'),
-        spaceAfter=12,
-        spaceBefore=12,
-        fontName='Helvetica-Bold'
-    )
-    
-    subheading_style = ParagraphStyle(
-        'CustomSubHeading',
-        parent=styles['Heading3'],
-        fontSize=13,
-        textColor=colors.HexColor('#6366f1'),
-        spaceAfter=8,
-        spaceBefore=8,
-        fontName='Helvetica-Bold'
-    )
-    
-    body_style = ParagraphStyle(
-        'CustomBody',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#0f172a'),
-        spaceAfter=8,
-        alignment=TA_JUSTIFY,
-        leading=16
-    )
-    
-    bullet_style = ParagraphStyle(
-        'CustomBullet',
-        parent=styles['BodyText'],
-        fontSize=11,
-        textColor=colors.HexColor('#0f172a'),
-        spaceAfter=6,
-        leftIndent=20,
-        bulletIndent=10,
-        leading=14
+    if kind in ["summarize", "notes"]:
+        return f"outputs/{user_id}/{version}/{title}-{filename}.pdf", "application/pdf"
+    elif kind in ["mindmap", "mcq"]:
+        return f"outputs/{user_id}/{version}/{title}-{filename}.json", "application/json"
+    return f"outputs/{user_id}/{version}/{title}-{filename}.txt", "text/plain"
+
+
+def index_document(job_id, signature):
+    if signature is not None:
+        add_signature(get_db(), job_id, signature)
+
+
+def record_job_route(job_id, kind, route, arm, chars, seconds):
+    record_route(get_db(), job_id, kind, route, arm, chars, seconds)
+
+
+def find_duplicate(user_id, kind, signature):
+    """Most similar earlier job of this kind as (job_id, title, s3_input_key, similarity), or None"""
+    if signature is None or DEDUP_THRESHOLD > 1:
+        return None
+    db = get_db()
+    match = find_similar(
+        db, signature, kind,
+        user_id=None if DEDUP_SCOPE == "global" else user_id,
+        threshold=DEDUP_THRESHOLD,
     )
-    
-    def clean_markdown(text):
-        """Remove markdown formatting and convert to plain text with reportlab formatting"""
-        # Escape XML special characters first
-        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        
-        # Convert **bold** to <b>bold</b>
-        text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
-        
-        # Convert *italic* to <i>italic</i>
-        text = re.sub(r'\*(.+?)\*', r'<i>\1</i>', text)
-        
-        # Convert `code` to monospace
-        text = re.sub(r'`(.+?)`', r'<font name="Courier">\1</font>', text)
-        
-        return text
-    
-    # Add title
-    elements.append(Paragraph(title, title_style))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Process content line by line
-    lines = content.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            elements.append(Spacer(1, 0.1*inch))
-            continue
-        
-        # Detect main headings (## or single #)
-        if line.startswith('###'):
-            text = line.replace('###', '').strip()
-            text = clean_markdown(text)
-            elements.append(Paragraph(text, subheading_style))
-        elif line.startswith('##'):
-            text = line.replace('##', '').strip()
-            text = clean_markdown(text)
-            elements.append(Paragraph(text, heading_style))
-        elif line.startswith('#'):
-            text = line.replace('#', '').strip()
-            text = clean_markdown(text)
-            elements.append(Paragraph(text, heading_style))
-        # Detect standalone bold headings at start of line (• **Text:** or **Text:**)
-        elif re.match(r'^[•\-\*]\s*\*\*[^*]+\*\*:?\s*$', line):
-            # This is a bullet point that's entirely bold - treat as subheading
-            text = re.sub(r'^[•\-\*]\s*\*\*([^*]+)\*\*:?\s*$', r'\1', line)
-            text = clean_markdown(text)
-            elements.append(Paragraph(f"• {text}", subheading_style))
-        # Detect all-caps lines (likely headings)
-        elif line.isupper() and len(line) > 3 and len(line) < 100 and not line.startswith(('•', '-', '*')):
-            text = clean_markdown(line)
-            elements.append(Paragraph(text, subheading_style))
-        # Detect bullet points
-        elif line.startswith('- ') or line.startswith('• ') or line.startswith('* '):
-            text = line[2:].strip()
-            text = clean_markdown(text)
-            elements.append(Paragraph(f"• {text}", bullet_style))
-        # Detect numbered lists
-        elif len(line) > 2 and line[0].isdigit() and line[1] in ['.', ')']:
-            text = clean_markdown(line)
-            elements.append(Paragraph(text, bullet_style))
-        # Regular paragraph
+    if match is None:
+        return None
+    title, key_in = db.execute("SELECT title,s3_input_key FROM jobs WHERE id=?", (match[0],)).fetchone()
+    return match[0], title, key_in, match[1]
+
+
+def find_previous_job(user_id, key_in, kind):
+    """The user's latest job of this kind for the same input file, as (id, s3_output_key)"""
+    return get_db().execute(
+        "SELECT id,s3_output_key FROM jobs WHERE user_id=? AND s3_input_key=? AND kind=? ORDER BY id DESC LIMIT 1",
+        (user_id, key_in, kind),
+    ).fetchone()
+
+
+def replace_job_output(job_id, old_key, new_key):
+    """Point a revised job at its new output; the old one is deleted unless another job (a reuse) shares it"""
+    if old_key == new_key:
+        return
+    db = get_db()
+    db.execute("UPDATE jobs SET s3_output_key=? WHERE id=?", (new_key, job_id))
+    db.commit()
+    if not db.execute("SELECT 1 FROM jobs WHERE s3_output_key=?", (old_key,)).fetchone():
+        storage.delete(old_key)
+
+
+def load_job_chunks(job_id):
+    return load_chunk_outputs(get_db(), job_id)
+
+
+def store_job_chunks(job_id, outputs):
+    save_chunk_outputs(get_db(), job_id, outputs)
+
+
+def window_chunks(text):
+    """Chunks of the prompt window: the same input a single call would get"""
+    return split_chunks(select_window(text))
+
+
+def chunk_prompts(kind, chunks):
+    """(chunk hashes, prompts) for generating kind chunk by chunk"""
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    prompt_fn, total = CHUNK_PROMPTS[kind]
+    if len(chunks) == 1:
+        # A single chunk is the whole document: use the regular prompt
+        prompts = [GENERATORS[kind][0](chunks[0])]
+    elif total:
+        # Each chunk asks for its share, so the document gets as many items as in one shot
+        prompts = [prompt_fn(chunk, count=count) for chunk, count in zip(chunks, item_counts(chunks, total))]
+    else:
+        prompts = [prompt_fn(chunk) for chunk in chunks]
+    return hashes, prompts
+
+
+async def generate_chunked(kind, chunks, previous_id=None, route=None):
+    """
+    Generate kind chunk by chunk, reusing the outputs stored for the previous version
+    of the document. Returns (merged result, {chunk hash: output}, chunks regenerated).
+    Hashing, prompt building and merging run on the I/O pool, off the event loop.
+    """
+    cached = await run_io(load_job_chunks, previous_id) if previous_id else {}
+    hashes, prompts = await run_io(chunk_prompts, kind, chunks)
+    todo = {h: prompt for h, prompt in zip(hashes, prompts) if h not in cached}
+
+    fresh = await asyncio.gather(*(generate_text_async(prompt, route, kind) for prompt in todo.values()))
+    validate, merge = MERGERS[kind]
+    if validate:
+        for output in fresh:
+            validate(output)
+
+    outputs = {h: cached[h] for h in hashes if h in cached}
+    outputs.update(zip(todo, fresh))
+    return await run_io(merge, [outputs[h] for h in hashes]), outputs, len(todo)
+
+
+async def generate_job(
+    user_id, kind, filename, text, key_in, signature=None, input_hash=None, input_stored=None, notify=flash
+):
+    """
+    Generate the output for kind, store it and record the job; reports through notify
+    (flash by default) and returns None on failure. A re-upload of the same file updates its earlier job in place,
+    regenerating only the changed chunks. input_stored, if given, is the task storing
+    the input blob, awaited before the job is recorded and discarded if none is.
+    """
+    job_id = None
+    try:
+        prompt_fn, title = GENERATORS[kind]
+        previous = None
+        chunks = []
+        if kind in CHUNK_PROMPTS:
+            previous = await run_io(find_previous_job, user_id, key_in, kind)
+            # Windowing and splitting long documents is CPU work: keep it off the event loop
+            chunks = await run_io(window_chunks, text)
+        outputs = None
+        route, arm = model_router.choose(kind, len(text), input_hash or key_in)
+        started = time.perf_counter()
+        try:
+            if chunks:
+                result, outputs, regenerated = await generate_chunked(
+                    kind, chunks, previous[0] if previous else None, route
+                )
+            else:
+                result = await generate_text_async(await run_io(prompt_fn, text), route, kind)
+        except Exception as e:
+            notify(f"AI generation failed: {str(e)}")
+            return None
+        seconds = time.perf_counter() - started
+        model_router.observe(route, seconds)
+
+        if kind in ["summarize", "notes"]:
+            # Generate PDF in the render pool
+            try:
+                body = await render_pool.run_async(RENDER_MARKDOWN_PDF, result, title)
+            except RenderError:
+                notify("The server is busy rendering documents, please try again in a moment.")
+                return None
         else:
-            text = clean_markdown(line)
-            elements.append(Paragraph(text, body_style))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+            body = result.encode("utf-8")
+        out_key, content_type = output_location(user_id, title, filename, kind, (await run_io(blob_hash, body))[:16])
+        if input_stored is not None:
+            # The input upload ran alongside generation; no job without its input
+            try:
+                await input_stored
+            except Exception as e:
+                app.logger.exception("Storing input %s failed", key_in)
+                notify(f"Could not store the uploaded file: {str(e)}")
+                return None
+        await run_io(put_artifact, storage, out_key, body, content_type)
+
+        # Record job (or keep the revised one) and index it for near-duplicate lookups
+        if previous:
+            job_id = previous[0]
+            await run_io(replace_job_output, job_id, previous[1], out_key)
+        else:
+            job_id = await run_io(record_job, user_id, title, key_in, out_key, kind)
+        await run_io(index_document, job_id, signature)
+        await run_io(record_job_route, job_id, kind, route, arm, len(text), seconds)
+        if input_hash:
+            await run_io(blobs.link_job, job_id, input_hash)
+        if outputs is not None or previous:
+            await run_io(store_job_chunks, job_id, outputs or {})
+
+        if previous and outputs is not None:
+            notify(f"{title} updated: regenerated {regenerated} of {len(chunks)} sections.")
+        else:
+            notify(f"{title} ready!")
+    finally:
+        if input_stored is not None and job_id is None:
+            # Failed or raised before the job was recorded: wait for the input upload and drop its blob
+            await discard_input(input_stored, input_hash)
+    return job_id
 
 
 @app.route("/upload", methods=["POST"])
 @login_required
-def upload():
+async def upload():
     f = request.files.get("file")
     kind = request.form.get("kind")  # summarize | mcq | notes | flashcards | mindmap
-    if not f or kind not in {"summarize", "mcq", "notes", "flashcards", "mindmap"}:
+    # The name goes into storage keys: no directories (or "..") from the client
+    filename = safe_filename(f.filename) if f else ""
+    if not filename or kind not in GENERATORS:
         flash("Please choose a file and a tool.")
         return redirect(url_for("dashboard"))
 
+    user_id = session["user_id"]
+
     # Read file data once into memory
     f.stream.seek(0)
     data = f.read()
     
-    # Save input to S3 using BytesIO from the data
-    key_in = f"inputs/{session['user_id']}/{f.filename}"
-    s3_put_fileobj(io.BytesIO(data), key_in, f.mimetype)
+    # Inputs are stored by content (identical files once); key_in is the name for this user
+    key_in = f"inputs/{user_id}/{filename}"
+    digest = await run_io(blob_hash, data)
 
-    # Extract text from the same data
-    ext = (f.filename.rsplit(".", 1)[-1] or "").lower()
-    text = ""
-    
-    if ext == "pdf":
-        text = extract_text_from_pdf(io.BytesIO(data))
-    elif ext in {"ppt", "pptx"}:
-        text = extract_text_from_pptx(io.BytesIO(data))
-    elif ext in {"doc", "docx"}:
-        text = extract_text_from_docx(io.BytesIO(data))
-    else:
-        # Fallback: treat as text
-        try:
-            text = data.decode('utf-8')
-        except Exception:
-            text = ""
+    # Double clicks and retries of this upload wait for the first submission and report
+    # its outcome instead of generating again (see idempotency.py)
+    idem_key = idempotency_key(user_id, kind, digest)
+    earlier = await upload_requests.acquire(idem_key, user_id)
+    if earlier is not None:
+        replay_upload(*earlier)
+        return redirect(url_for("dashboard"))
+
+    messages = []
 
-    if not text.strip():
-        flash("Could not extract text from file. Please try a different file.")
+    def notify(message):
+        messages.append(message)
+        flash(message)
+
+    job_id = None
+    try:
+        # Only the request that generates takes an admission slot: duplicates above replay
+        # without spending the user's quota (a rejection releases the key in finally)
+        ticket = await admit(user_id, request.form)
+        if not ticket.granted:
+            return over_quota(ticket)
+        async with admission.held(ticket):
+            # Extract and normalize text before storing anything (off the event loop, reusing
+            # the text cached for a file seen before), so unusable files cost no PUT
+            text = await run_io(blobs.get_text, digest)
+            text_cached = text is not None
+            if text is None:
+                try:
+                    text = await run_io(prepare_text, filename, data)
+                except SandboxBusy:
+                    # Server load, not a bad file: nothing is recorded, so a retry starts afresh
+                    return "The server is busy, please try again shortly", 503, {"Retry-After": "5"}
+                except SandboxError as e:
+                    app.logger.warning("Extraction of %s stopped: %s", filename, e)
+                    notify(f"Could not extract text from {filename} ({e}). Please try a different file.")
+                    return redirect(url_for("dashboard"))
+
+            if not text.strip():
+                notify("Could not extract text from file. Please try a different file.")
+                return redirect(url_for("dashboard"))
+
+            def store_input():
+                """Store the input blob (a pending use, ended by link_job() or discard()) and its text"""
+                blobs.store(digest, data, f.mimetype)
+                if not text_cached:
+                    blobs.put_text(digest, text)
+
+            # A near-duplicate of an earlier document: let the user reuse or fork that output
+            # (a new revision of a file already processed is regenerated incrementally instead)
+            signature = await run_io(minhash, text)
+            match = None
+            if kind not in CHUNK_PROMPTS or not await run_io(find_previous_job, user_id, key_in, kind):
+                match = await run_io(find_duplicate, user_id, kind, signature)
+            if match is not None:
+                await run_io(store_input)
+                match_id, match_title, match_input, score = match
+                session["pending_upload"] = {
+                    "key_in": key_in,
+                    "input_hash": digest,
+                    "filename": filename,
+                    "kind": kind,
+                    "match_id": match_id,
+                    "match_title": match_title,
+                    "match_filename": match_input.split("/")[-1] if match_input else "",
+                    "similarity": round(score * 100),
+                }
+                return redirect(url_for("dashboard"))
+
+            # Store the input while Gemini works; generate_job waits for it before recording the job
+            stored = asyncio.ensure_future(run_io(store_input))
+            job_id = await generate_job(
+                user_id, kind, filename, text, key_in, signature,
+                input_hash=digest, input_stored=stored, notify=notify,
+            )
+            return redirect(url_for("dashboard"))
+    finally:
+        # Duplicates get this outcome (a parked or crashed upload just releases the key)
+        await run_io(upload_requests.finish, idem_key, job_id, " ".join(messages))
+
+
+@app.route("/upload/resolve", methods=["POST"])
+@login_required
+async def resolve_upload():
+    """Reuse, fork or regenerate after a near-duplicate upload"""
+    pending = session.pop("pending_upload", None)
+    action = request.form.get("action")
+    if not pending or action not in ("reuse", "fork", "regenerate"):
         return redirect(url_for("dashboard"))
 
-    # Call Gemini
+    user_id = session["user_id"]
+    kind, filename, key_in = pending["kind"], pending["filename"], pending["key_in"]
+    match_id = pending["match_id"]
+    digest = pending.get("input_hash")
+
+    def load_match():
+        db = get_db()
+        sql = "SELECT title,s3_output_key,kind FROM jobs WHERE id=?"
+        params = [match_id]
+        if DEDUP_SCOPE != "global":
+            sql += " AND user_id=?"
+            params.append(user_id)
+        return db.execute(sql, params).fetchone()
+
+    row = await run_io(load_match)
+    if action != "regenerate" and (row is None or row[2] != kind):
+        flash("The earlier output is no longer available; generating a new one.")
+        action = "regenerate"
+
+    if action == "regenerate":
+        # Reusing or forking copies an earlier output; only regenerating needs an admission slot
+        ticket = await admit(user_id, request.form)
+        if not ticket.granted:
+            session["pending_upload"] = pending
+            return over_quota(ticket)
+        async with admission.held(ticket):
+            if digest is None:
+                # Parked before inputs were content-addressed
+                digest = await run_io(blobs.put, await run_io(storage.get, key_in))
+            text = await run_io(input_text, digest, filename)
+            signature = await run_io(minhash, text)
+            if not await generate_job(user_id, kind, filename, text, key_in, signature, input_hash=digest):
+                # End the pending use held since the upload was parked (or since blobs.put above)
+                await run_io(blobs.discard, digest)
+        return redirect(url_for("dashboard"))
+
+    title, match_out_key, _ = row
+    if action == "reuse":
+        # Share the earlier output object (outputs are never overwritten, see output_location)
+        out_key = match_out_key
+    else:
+        # Fork: the user's own copy, stored under their outputs
+        out_key, _ = output_location(user_id, title, filename, kind, blob_hash(match_out_key.encode())[:16])
+        if out_key != match_out_key:
+            await run_io(storage.copy, match_out_key, out_key)
+
+    def record_reuse():
+        job_id = record_job(user_id, title, key_in, out_key, kind)
+        db = get_db()
+        signature = get_signature(db, match_id)
+        if signature is not None:
+            add_signature(db, job_id, signature)
+        # Unchanged chunks of a later revision can reuse the earlier chunk outputs
+        save_chunk_outputs(db, job_id, load_chunk_outputs(db, match_id))
+        if digest:
+            blobs.link_job(job_id, digest)
+        return job_id
+
+    await run_io(record_reuse)
+    flash(f"{title} ready! (reused from {pending['match_filename'] or 'an earlier upload'})")
+    return redirect(url_for("dashboard"))
+
+def queue_direct_upload(user_id, kind, filename, key_in):
+    return queue_upload(get_db(), user_id, kind, filename, key_in)
+
+
+def find_direct_upload(key_in):
+    return find_upload(get_db(), key_in)
+
+
+def claim_direct_upload(upload_id):
+    return claim_upload(get_db(), upload_id, DIRECT_UPLOAD_LEASE)
+
+
+def finish_direct_upload(upload_id, status, message, job_id=None):
+    finish_upload(get_db(), upload_id, status, message, job_id)
+
+
+async def process_direct_upload(upload_id, priority=INTERACTIVE):
+    """Generate the output of a queued direct upload (runs on background_loop, outside any request)"""
+    row = await run_io(claim_direct_upload, upload_id)
+    if row is None:
+        return
+    user_id, kind, filename, upload_key_in = row
+    key_in = f"inputs/{user_id}/{filename}"
+    messages = []
+    job_id = None
+    digest = None
+    linked = False
     try:
-        if kind == "summarize":
-            result = summarize_text(text)
-            title = "Summary"
-        elif kind == "mcq":
-            result = generate_mcqs(text)
-            title = "MCQ Quiz"
-        elif kind == "flashcards":
-            result = generate_flashcards(text)
-            title = "Flash Cards"
-        elif kind == "mindmap":
-            result = generate_mindmap(text)
-            title = "Mind Map"
+        # Move the uploaded object into the content-addressed store (a pending use of the blob)
+        digest = await run_io(blobs.adopt, upload_key_in)
+        # A file already sent (through the form or directly) reports that upload's outcome (see idempotency.py)
+        idem_key = idempotency_key(user_id, kind, digest)
+        earlier = await upload_requests.acquire(idem_key, user_id)
+        if earlier is not None:
+            replay_upload(*earlier, notify=messages.append)
+            job_id = earlier[1]
         else:
-            result = make_notes(text)
-            title = "Notes"
+            try:
+                # Same admission control as form uploads; here the request can simply wait its turn
+                ticket = await admission.acquire_async(user_id, priority)
+                while not ticket.granted:
+                    await asyncio.sleep(ticket.retry_after)
+                    ticket = await admission.acquire_async(user_id, priority)
+                async with admission.held(ticket):
+                    text = await run_io(input_text, digest, filename)
+                    if not text.strip():
+                        messages.append(f"Could not extract text from {filename}. Please try a different file.")
+                    else:
+                        signature = await run_io(minhash, text)
+                        job_id = await generate_job(
+                            user_id, kind, filename, text, key_in, signature, input_hash=digest,
+                            notify=messages.append,
+                        )
+                        linked = job_id is not None
+            finally:
+                await run_io(upload_requests.finish, idem_key, job_id, " ".join(messages))
     except Exception as e:
-        flash(f"AI generation failed: {str(e)}")
-        return redirect(url_for("dashboard"))
+        app.logger.exception("Direct upload %s failed", upload_id)
+        messages.append(f"Processing {filename} failed: {e}")
+    if digest is not None and not linked:
+        # A replayed or failed upload ends its pending use of the blob (see blob_store.py)
+        await run_io(blobs.discard, digest)
+    if not job_id:
+        # blobs.adopt() moves the staging object on success; a failed upload's would stay behind
+        await run_io(delete_staging, upload_key_in)
+    await run_io(finish_direct_upload, upload_id, "done" if job_id else "failed", " ".join(messages), job_id)
+
+
+def delete_staging(key):
+    try:
+        storage.delete(key)
+    except Exception:
+        app.logger.exception("Deleting staging object %s failed", key)
 
-    # Save output to S3 - PDF for summarize/notes, JSON for mindmap/mcq, TXT for flashcards
-    if kind in ["summarize", "notes"]:
-        # Generate PDF
-        pdf_buffer = create_pdf_document(result, title, kind)
-        out_key = f"outputs/{session['user_id']}/{title}-{f.filename}.pdf"
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=out_key,
-            Body=pdf_buffer.getvalue(),
-            ContentType="application/pdf",
-        )
-    elif kind in ["mindmap", "mcq"]:
-        # Save as JSON for mindmap and mcq
-        out_key = f"outputs/{session['user_id']}/{title}-{f.filename}.json"
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=out_key,
-            Body=result.encode("utf-8"),
-            ContentType="application/json",
-        )
-    else:
-        # Save as TXT for Flashcards
-        out_key = f"outputs/{session['user_id']}/{title}-{f.filename}.txt"
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=out_key,
-            Body=result.encode("utf-8"),
-            ContentType="text/plain",
-        )
 
-    # Record job
+def recover_direct_uploads(user_id):
+    """Queue the user's uploads lost with a restarted worker again; fail the ones interrupted too often"""
     db = get_db()
-    db.execute(
-        "INSERT INTO jobs(user_id,title,s3_input_key,s3_output_key,kind) VALUES(?,?,?,?,?)",
-        (session["user_id"], title, key_in, out_key, kind),
+    for upload_id, filename, staging_key, attempts in stale_uploads(db, user_id, DIRECT_UPLOAD_LEASE):
+        if attempts < MAX_ATTEMPTS:
+            background_loop.submit(process_direct_upload(upload_id))
+        elif fail_upload(db, upload_id, f"Processing {filename} was interrupted. Please upload it again."):
+            delete_staging(staging_key)
+
+
+@app.route("/upload/presign", methods=["POST"])
+@login_required
+def presign_upload():
+    """Presigned POST for sending a file straight to the bucket, plus the token for /upload/complete"""
+    if not DIRECT_UPLOADS:
+        return jsonify(error="Direct uploads are not enabled"), 404
+    body = request.get_json(silent=True) or {}
+    filename = safe_filename(body.get("filename"))
+    kind = body.get("kind")
+    if not filename or kind not in GENERATORS:
+        return jsonify(error="Please choose a file and a tool."), 400
+
+    key_in = upload_key(session["user_id"], filename)
+    content_type = body.get("content_type") or "application/octet-stream"
+    post = storage.presigned_post(key_in, content_type, MAX_UPLOAD_BYTES, UPLOAD_URL_TTL)
+    token = upload_tokens.dumps(
+        {"user_id": session["user_id"], "key": key_in, "kind": kind, "filename": filename}
     )
-    db.commit()
+    return jsonify(url=post["url"], fields=post["fields"], token=token)
+
+
+@app.route("/upload/complete", methods=["POST"])
+@login_required
+async def complete_upload():
+    """Completion callback of a direct upload: queue it for background processing"""
+    body = request.get_json(silent=True) or request.form
+    try:
+        claim = upload_tokens.loads(body.get("token", ""), max_age=UPLOAD_URL_TTL + 300)
+    except BadSignature:
+        claim = None
+    if not claim or claim["user_id"] != session["user_id"]:
+        return jsonify(error="Invalid or expired upload token"), 400
+
+    # A repeated completion call (retry, replayed token) reports the upload it already queued
+    existing = await run_io(find_direct_upload, claim["key"])
+    if existing is not None:
+        return jsonify(id=existing[0], status=existing[1], job_id=existing[2]), 200
+
+    storage.invalidate(claim["key"])
+    if await run_io(storage.head, claim["key"]) is None:
+        return jsonify(error="The file has not been uploaded"), 409
+
+    upload_id, created = await run_io(
+        queue_direct_upload, session["user_id"], claim["kind"], claim["filename"], claim["key"]
+    )
+    if not created:
+        return jsonify(id=upload_id, status="queued"), 200
+    priority = PRIORITIES.get(request.headers.get("X-Priority") or body.get("priority", ""), INTERACTIVE)
+    background_loop.submit(process_direct_upload(upload_id, priority))
+    return jsonify(id=upload_id, status="queued"), 202
 
-    flash(f"{title} ready!")
-    return redirect(url_for("dashboard"))
+
+@app.route("/upload/status")
+@login_required
+def upload_status():
+    """The user's direct uploads still queued or processing"""
+    recover_direct_uploads(session["user_id"])
+    return jsonify(uploads=in_progress(get_db(), session["user_id"]))
 
 @app.route("/download/<int:job_id>")
 @login_required
-def download(job_id):
-    db = get_db()
-    row = db.execute(
-        "SELECT s3_output_key,kind FROM jobs WHERE id=? AND user_id=?",
-        (job_id, session["user_id"]),
-    ).fetchone()
+async def download(job_id):
+    row = await run_io(fetch_job, job_id, session["user_id"], "s3_output_key,kind")
     if not row:
         return "Not found", 404
     
     key = row[0]
-    kind = row[1]
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
+    # Compressed text artifacts are passed through as-is to clients that accept gzip
+    accept_gzip = "gzip" in request.accept_encodings
+    body, encoding = await run_io(get_artifact, storage, key, accept_gzip)
     
     # Determine mimetype based on file extension
     if key.endswith('.pdf'):
@@ -600,28 +1211,27 @@ def download(job_id):
     else:
         mimetype = 'text/plain'
     
-    return send_file(
-        io.BytesIO(obj["Body"].read()),
+    response = send_file(
+        io.BytesIO(body),
         as_attachment=True,
         download_name=os.path.basename(key),
         mimetype=mimetype,
     )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 @app.route("/view/<int:job_id>")
 @login_required
-def view_pdf(job_id):
+async def view_pdf(job_id):
     """View PDF in browser for summarize and notes"""
-    db = get_db()
-    row = db.execute(
-        "SELECT s3_output_key,kind,title FROM jobs WHERE id=? AND user_id=?",
-        (job_id, session["user_id"]),
-    ).fetchone()
+    row = await run_io(fetch_job, job_id, session["user_id"], "s3_output_key,kind,title")
     
     if not row:
         return "Not found", 404
     
-    key = row[0]
     kind = row[1]
     title = row[2]
     
@@ -629,85 +1239,153 @@ def view_pdf(job_id):
     if kind not in ['summarize', 'notes']:
         return "This content type cannot be viewed in browser", 400
     
-    # Get PDF from S3
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    pdf_data = obj["Body"].read()
-    
+    # The viewer embeds /view/<id>/pdf, so the PDF itself is not fetched here
     return render_template("pdf_viewer.html", 
                          job_id=job_id, 
-                         title=title,
-                         pdf_data=pdf_data)
+                         title=title)
 
 
 @app.route("/view/<int:job_id>/pdf")
 @login_required
-def serve_pdf(job_id):
+async def serve_pdf(job_id):
     """Serve the actual PDF file for embedding"""
-    db = get_db()
-    row = db.execute(
-        "SELECT s3_output_key FROM jobs WHERE id=? AND user_id=?",
-        (job_id, session["user_id"]),
-    ).fetchone()
+    row = await run_io(fetch_job, job_id, session["user_id"], "s3_output_key")
     
     if not row:
         return "Not found", 404
     
+    # PDF viewers fetch large files in ranges; serve those without reading the whole object
     key = row[0]
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
+    if request.range is not None:
+        info = await run_io(storage.head, key)
+        span = request.range.range_for_length(info.size) if info else None
+        if span is not None:
+            start, stop = span
+            body = await run_io(storage.get_range, key, start, stop - 1)
+            return Response(
+                body,
+                status=206,
+                mimetype='application/pdf',
+                headers={
+                    'Content-Disposition': 'inline',
+                    'Accept-Ranges': 'bytes',
+                    'Content-Range': f'bytes {start}-{stop - 1}/{info.size}',
+                }
+            )
+    
+    body = await run_io(storage.get, key)
     
     return Response(
-        obj["Body"].read(),
+        body,
         mimetype='application/pdf',
-        headers={'Content-Disposition': 'inline'}
+        headers={'Content-Disposition': 'inline', 'Accept-Ranges': 'bytes'}
     )
 
 
+def _load_mindmap_index(job_id, user_id):
+    """Return (title, MindmapIndex) for the user's mindmap job, or None"""
+    row = fetch_job(job_id, user_id, "title, s3_output_key, kind")
+
+    if not row or row[2] != 'mindmap':
+        return None
+
+    return row[0], mindmap_indexes.get((job_id, row[1]), lambda: read_artifact(storage, row[1]))
+
+
 @app.route("/mindmap/<int:job_id>")
 @login_required
-def view_mindmap(job_id):
-    """View interactive mindmap"""
-    db = get_db()
-    row = db.execute(
-        "SELECT title, s3_output_key, kind FROM jobs WHERE id=? AND user_id=?",
-        (job_id, session["user_id"]),
-    ).fetchone()
-    
-    if not row or row[2] != 'mindmap':
+async def view_mindmap(job_id):
+    """View interactive mindmap (only the top levels are inlined, the rest loads on demand)"""
+    try:
+        found = await run_io(_load_mindmap_index, job_id, session["user_id"])
+    except ValueError:
+        return "Mind map data is not valid JSON", 422
+    if not found:
         return "Not found or not a mindmap", 404
-    
-    # Get mindmap data from S3
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=row[1])
-    mindmap_json = obj["Body"].read().decode("utf-8")
-    
-    # Clean JSON if it has markdown code blocks
-    mindmap_json = re.sub(r'```json\s*', '', mindmap_json)
-    mindmap_json = re.sub(r'```\s*$', '', mindmap_json)
-    mindmap_json = mindmap_json.strip()
-    
+
+    title, index = found
     return render_template(
         "mindmap_viewer.html",
         job_id=job_id,
-        title=row[0],
-        mindmap_data=mindmap_json
+        title=title,
+        mindmap_data=json.dumps(index.subtree("", MINDMAP_INITIAL_DEPTH))
     )
 
 
-@app.route("/quiz/<int:job_id>")
+@app.route("/mindmap/<int:job_id>/data")
 @login_required
-def view_quiz(job_id):
-    """View interactive quiz with Test and Practice modes"""
+async def mindmap_data(job_id):
+    """Return a mindmap subtree by node path, down to the requested depth"""
+    try:
+        found = await run_io(_load_mindmap_index, job_id, session["user_id"])
+    except ValueError:
+        return jsonify(error="Mind map data is not valid JSON"), 422
+    if not found:
+        return jsonify(error="Not found or not a mindmap"), 404
+
+    path = request.args.get("path", "")
+    depth = min(max(request.args.get("depth", MINDMAP_INITIAL_DEPTH, type=int), 0), MINDMAP_MAX_DEPTH)
+    try:
+        node = found[1].subtree(path, depth)
+    except KeyError:
+        return jsonify(error="Unknown node path"), 404
+    return jsonify(node)
+
+
+def _export_mindmap(job_id, fmt, mimetype):
+    """Render a mindmap export on the server (cached per job)"""
     db = get_db()
     row = db.execute(
         "SELECT title, s3_output_key, kind FROM jobs WHERE id=? AND user_id=?",
         (job_id, session["user_id"]),
     ).fetchone()
+
+    if not row or row[2] != 'mindmap':
+        return "Not found or not a mindmap", 404
+
+    def load_source():
+        return read_artifact(storage, row[1])
+
+    try:
+        data = mindmap_exporter.export((job_id, row[1]), fmt, load_source, title=row[0])
+    except ValueError:
+        return "Mind map data is not valid JSON", 422
+    except (RenderError, FutureTimeout):
+        return "Export is busy, please try again shortly", 503, {"Retry-After": "5"}
+
+    return send_file(
+        io.BytesIO(data),
+        as_attachment=True,
+        download_name=f"{row[0]}_mindmap.{fmt}",
+        mimetype=mimetype,
+    )
+
+
+@app.route("/mindmap/<int:job_id>/export/png")
+@login_required
+def export_mindmap_png(job_id):
+    """Export mindmap as PNG"""
+    return _export_mindmap(job_id, "png", "image/png")
+
+
+@app.route("/mindmap/<int:job_id>/export/pdf")
+@login_required
+def export_mindmap_pdf(job_id):
+    """Export mindmap as PDF"""
+    return _export_mindmap(job_id, "pdf", "application/pdf")
+
+
+@app.route("/quiz/<int:job_id>")
+@login_required
+async def view_quiz(job_id):
+    """View interactive quiz with Test and Practice modes"""
+    row = await run_io(fetch_job, job_id, session["user_id"], "title, s3_output_key, kind")
     
     if not row or row[2] != 'mcq':
         return "Not found or not a quiz", 404
     
-    # Get quiz data from S3
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=row[1])
-    quiz_json = obj["Body"].read().decode("utf-8")
+    # Get quiz data from storage
+    quiz_json = (await run_io(read_artifact, storage, row[1])).decode("utf-8")
     
     # Clean JSON if it has markdown code blocks
     quiz_json = re.sub(r'```json\s*', '', quiz_json)
@@ -772,20 +1450,15 @@ def parse_flashcards_from_text(text):
 
 @app.route("/flashcards/<int:job_id>")
 @login_required
-def view_flashcards(job_id):
+async def view_flashcards(job_id):
     """View and practice flashcards interactively"""
-    db = get_db()
-    row = db.execute(
-        "SELECT title, s3_output_key, kind FROM jobs WHERE id=? AND user_id=?",
-        (job_id, session["user_id"]),
-    ).fetchone()
+    row = await run_io(fetch_job, job_id, session["user_id"], "title, s3_output_key, kind")
     
     if not row or row[2] != 'flashcards':
         return "Not found or not a flashcard set", 404
     
-    # Get flashcards from S3
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=row[1])
-    content = obj["Body"].read().decode("utf-8")
+    # Get flashcards from storage
+    content = (await run_io(read_artifact, storage, row[1])).decode("utf-8")
     
     # Parse flashcards
     cards = parse_flashcards_from_text(content)
@@ -803,64 +1476,7 @@ def create_flashcards_pptx(cards, title):
     Create a PowerPoint presentation from flashcards.
     Each card gets 2 slides: question and answer.
     """
-    prs = Presentation()
-    
-    for i, card in enumerate(cards, start=1):
-        # -------- Question Slide --------
-        slide_q = prs.slides.add_slide(prs.slide_layouts[5])  # Blank layout
-        
-        # Add question text box
-        tx_q = slide_q.shapes.add_textbox(
-            Inches(0.5), Inches(2), Inches(9), Inches(3)
-        )
-        tf_q = tx_q.text_frame
-        tf_q.word_wrap = True
-        
-        p_q = tf_q.paragraphs[0]
-        p_q.text = card.get('question', '')
-        p_q.font.size = Pt(32)
-        p_q.font.bold = True
-        p_q.alignment = PP_ALIGN.CENTER
-        
-        # Add footer
-        footer_q = slide_q.shapes.add_textbox(
-            Inches(0.5), Inches(6.5), Inches(9), Inches(0.5)
-        )
-        footer_q.text = f"{title} - Card {i} (Question)"
-        footer_q.text_frame.paragraphs[0].font.size = Pt(12)
-        
-        # -------- Answer Slide --------
-        slide_a = prs.slides.add_slide(prs.slide_layouts[5])
-        
-        # Add answer text box
-        tx_a = slide_a.shapes.add_textbox(
-            Inches(0.5), Inches(1.5), Inches(9), Inches(4)
-        )
-        tf_a = tx_a.text_frame
-        tf_a.word_wrap = True
-        
-        # Add answer content (handle bullet points)
-        answer_lines = card.get('answer', '').replace('\\n', '\n').split('\n')
-        for idx, line in enumerate(answer_lines):
-            if line.strip():
-                p = tf_a.add_paragraph() if idx > 0 else tf_a.paragraphs[0]
-                p.text = line.strip()
-                p.level = 0
-                p.font.size = Pt(22)
-                p.font.color.rgb = RGBColor(0, 0, 0)
-        
-        # Add footer
-        footer_a = slide_a.shapes.add_textbox(
-            Inches(0.5), Inches(6.5), Inches(9), Inches(0.5)
-        )
-        footer_a.text = f"{title} - Card {i} (Answer)"
-        footer_a.text_frame.paragraphs[0].font.size = Pt(12)
-    
-    # Save to BytesIO
-    bio = io.BytesIO()
-    prs.save(bio)
-    bio.seek(0)
-    return bio
+    return io.BytesIO(render_pool.run(RENDER_FLASHCARDS_PPTX, cards, title))
 
 
 @app.route("/flashcards/<int:job_id>/export/pptx")
@@ -876,15 +1492,17 @@ def export_flashcards_pptx(job_id):
     if not row or row[2] != 'flashcards':
         return "Not found or not a flashcard set", 404
     
-    # Get flashcards from S3
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=row[1])
-    content = obj["Body"].read().decode("utf-8")
+    # Get flashcards from storage
+    content = read_artifact(storage, row[1]).decode("utf-8")
     
     # Parse flashcards
     cards = parse_flashcards_from_text(content)
     
     # Create PPTX
-    bio = create_flashcards_pptx(cards, row[0])
+    try:
+        bio = create_flashcards_pptx(cards, row[0])
+    except RenderError:
+        return "Export is busy, please try again shortly", 503, {"Retry-After": "5"}
     
     return send_file(
         bio,
@@ -895,5 +1513,66 @@ def export_flashcards_pptx(job_id):
 
 
 
+# Operators allowed to read the /metrics routes: comma-separated emails, nobody by default.
+# The counters are global (every user's uploads), so they are not for any signed-in user.
+METRICS_OPERATORS = {
+    e.strip().lower() for e in os.environ.get("METRICS_OPERATORS", "").split(",") if e.strip()
+}
+
+def operator_required(f):
+    """Only METRICS_OPERATORS may use the view; everyone else gets 404"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if session.get("email", "").lower() not in METRICS_OPERATORS:
+            abort(404)
+        return f(*args, **kwargs)
+    return decorated
+
+
+@app.route("/metrics/render")
+@login_required
+@operator_required
+def render_metrics():
+    """Render pool counters (queue depth, timeouts, render times)"""
+    return jsonify(render_pool.metrics())
+
+
+@app.route("/metrics/admission")
+@login_required
+@operator_required
+def admission_metrics():
+    """Uploads in flight and queued, by priority, across all workers"""
+    return jsonify(admission.snapshot())
+
+
+@app.route("/metrics/models")
+@login_required
+@operator_required
+def model_metrics():
+    """Generation latency per model route and A/B arm (?kind= to filter), and this worker's routing state"""
+    return jsonify({
+        "routes": route_stats(get_db(), request.args.get("kind")),
+        "router": model_router.snapshot(),
+    })
+
+
+@app.route("/metrics/extractors")
+@login_required
+@operator_required
+def extractor_metrics():
+    """This worker's extraction backends per content type (in the order tried, with their benchmark) and sandbox"""
+    return jsonify({"backends": extractors.ranking(), "sandbox": extract_sandbox.metrics()})
+
+
+@app.route("/metrics/startup")
+@login_required
+@operator_required
+def startup_metrics():
+    """Module load time and first-use import times for this worker"""
+    return jsonify(startup.report())
+
+
+startup.mark_ready(__name__, _module_started)
+
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,55 @@
+# asgi.py
+"""
+ASGI entry point for the async serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:app
+
+Flask is still WSGI underneath: each request is parsed and answered on a
+thread from a pool, but the coroutine views it dispatches to (upload, view,
+download) are scheduled onto the server's single event loop. Their Gemini,
+S3, SQLite and render awaits therefore overlap, so one process can keep
+hundreds of generations in flight while the threads just wait.
+
+STUDYMATE_APP picks the application module (app or app_cognito).
+"""
+import importlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import asgiref
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+# asgiref has no public way to pick the executor WSGI calls run on, so _PooledInstance
+# rewraps WsgiToAsgiInstance.run_wsgi_app. That is an internal of the asgiref pinned in
+# requirements.txt (3.12.1); fail at startup rather than serve wrongly if it changes.
+_run_wsgi_app = WsgiToAsgiInstance.__dict__.get("run_wsgi_app")
+if not isinstance(_run_wsgi_app, SyncToAsync):
+    raise ImportError(f"asgi.py needs asgiref 3.12 (WsgiToAsgiInstance internals differ in {asgiref.__version__})")
+
+_request_threads = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ASGI_REQUEST_THREADS", "256")),
+    thread_name_prefix="asgi-request",
+)
+
+
+class _PooledInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread (thread_sensitive=True),
+    # which would serialise all requests; use a thread pool instead
+    run_wsgi_app = SyncToAsync(
+        _run_wsgi_app.func,
+        thread_sensitive=False,
+        executor=_request_threads,
+    )
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that serves requests from a thread pool"""
+
+    async def __call__(self, scope, receive, send):
+        await _PooledInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+flask_app = importlib.import_module(os.environ.get("STUDYMATE_APP", "app")).app
+app = PooledWsgiToAsgi(flask_app)
@@ -0,0 +1,78 @@
+# benchmarks/bench_extractors.py
+"""
+Benchmark the text extraction backends and show which one each format uses.
+
+Usage:
+    python benchmarks/bench_extractors.py [FILE ...] [--docs 5]
+
+Runs the apps' extractor registry calibration (see extractors.py) on the
+given files, grouped by sniffed content type, and prints each backend's
+median time and text quality (its share of the letters and digits the best
+backend found) together with the resulting order. Without files it
+benchmarks synthetic PDF (if PyMuPDF is installed, to write them), DOCX and
+PPTX documents.
+"""
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractors
+from bench_ooxml_extract import PARAGRAPH, make_deck, make_document
+
+
+def make_pdf(pages):
+    import pymupdf
+
+    doc = pymupdf.open()
+    for i in range(pages):
+        page = doc.new_page()
+        for line in range(40):
+            page.insert_text((50, 40 + line * 19), PARAGRAPH.format(n=i * 40 + line)[:90], fontsize=9)
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def samples(docs):
+    found = {}
+    for i in range(docs):
+        found.setdefault(extractors.DOCX, []).append(make_document(500 + 200 * i))
+        found.setdefault(extractors.PPTX, []).append(make_deck(30 + 10 * i))
+        try:
+            found.setdefault(extractors.PDF, []).append(make_pdf(10 + 5 * i))
+        except ImportError:
+            pass
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--docs", type=int, default=5, help="synthetic documents per format")
+    args = parser.parse_args()
+
+    if args.files:
+        found = {}
+        for path in args.files:
+            with open(path, "rb") as f:
+                data = f.read()
+            found.setdefault(extractors.sniff(data, path), []).append(data)
+    else:
+        found = {ct: docs for ct, docs in samples(args.docs).items() if docs}
+
+    registry = extractors.default_registry()
+    for content_type, documents in found.items():
+        registry.calibrate(content_type, documents)
+    for content_type, report in registry.ranking().items():
+        if content_type not in found:
+            continue
+        print(f"{content_type} ({len(found[content_type])} documents): {' > '.join(report['order'])}")
+        for name, stats in report["backends"].items():
+            print(f"  {name:12s} median {stats['median_ms']:8.1f} ms, quality {stats['quality']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_ooxml_extract.py
+"""
+Text extraction from large DOCX and PPTX files: object model vs streaming XML.
+
+Usage:
+    python benchmarks/bench_ooxml_extract.py [--slides 300] [--paragraphs 5000] [--repeat 3]
+
+Builds a synthetic deck (text boxes, grouped shapes, a table and speaker
+notes on every slide) and document (paragraphs with a table every few
+pages), then extracts their text with the python-pptx/python-docx
+functions and with ooxml_text. Each extraction runs in a fresh process so
+its peak memory (sampled RSS growth) can be reported; time is the median
+over --repeat runs.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+PARAGRAPH = (
+    "Paragraph {n}: photosynthesis converts light energy into chemical energy stored in glucose, "
+    "releasing oxygen; the light reactions happen in the thylakoid membranes."
+)
+
+
+def make_deck(slides):
+    prs = Presentation()
+    layout = prs.slide_layouts[5]  # title only
+    for i in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {i + 1}: Cellular respiration"
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(4), Inches(2))
+        for j in range(4):
+            box.text_frame.add_paragraph().text = f"Bullet {j + 1} on slide {i + 1}"
+        group = slide.shapes.add_group_shape()
+        for j in range(3):
+            group.shapes.add_textbox(Inches(5), Inches(1.5 + j), Inches(3), Inches(1)).text = f"Grouped label {j + 1}"
+        table = slide.shapes.add_table(3, 3, Inches(0.5), Inches(4.5), Inches(8), Inches(1.5)).table
+        for r in range(3):
+            for c in range(3):
+                table.cell(r, c).text = f"cell {r}.{c}"
+        slide.notes_slide.notes_text_frame.text = f"Speaker notes for slide {i + 1}: explain the ATP yield."
+    out = io.BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def make_document(paragraphs):
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(PARAGRAPH.format(n=i + 1))
+        if i % 100 == 99:
+            table = doc.add_table(rows=4, cols=3)
+            for r in range(4):
+                for c in range(3):
+                    table.cell(r, c).text = f"row {r} col {c}"
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def _rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _measure(engine, fmt, data, queue):
+    import extractors
+    import ooxml_text
+    from startup import load
+
+    # Libraries are imported on first use by the apps; do that outside the measurement
+    load("pptx")
+    load("docx")
+    fn = {
+        ("object model", "pptx"): extractors.extract_text_from_pptx,
+        ("object model", "docx"): extractors.extract_text_from_docx,
+        ("streaming", "pptx"): ooxml_text.pptx_text,
+        ("streaming", "docx"): ooxml_text.docx_text,
+    }[(engine, fmt)]
+    before = _rss_kb()
+    peak = [before]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], _rss_kb())
+            time.sleep(0.001)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    start = time.perf_counter()
+    text = fn(io.BytesIO(data))
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    queue.put((elapsed, (max(peak[0], _rss_kb()) - before) / 1024, len(text)))
+
+
+def run(engine, fmt, data, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for _ in range(repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_measure, args=(engine, fmt, data, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+    return (
+        statistics.median(r[0] for r in results),
+        max(r[1] for r in results),
+        results[0][2],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--slides", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = {"pptx": make_deck(args.slides), "docx": make_document(args.paragraphs)}
+    for fmt, data in files.items():
+        print(f"{fmt}: {len(data):,} bytes")
+        for engine in ("object model", "streaming"):
+            elapsed, peak_mb, chars = run(engine, fmt, data, args.repeat)
+            print(f"  {engine:13s} median {elapsed * 1000:8.1f} ms, peak +{peak_mb:6.1f} MB, {chars:,} chars")
+
+
+if __name__ == "__main__":
+    main()
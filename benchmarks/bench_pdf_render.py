@@ -0,0 +1,84 @@
+# benchmarks/bench_pdf_render.py
+"""
+Render time for long markdown notes.
+
+Usage:
+    python benchmarks/bench_pdf_render.py [--pages 50] [--repeat 5]
+
+Generates synthetic study notes (headings, nested lists, tables, code blocks)
+sized to roughly the requested page count and reports render time per run.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+from markdown_pdf import render_markdown_pdf
+
+SECTION = """## Section {n}: Cellular Respiration
+
+Cellular respiration converts **glucose** into *ATP* through a series of `redox` reactions.
+Each stage happens in a different part of the cell and depends on the previous one.
+
+### Key stages
+- Glycolysis in the cytoplasm
+  - Net gain of **2 ATP** per glucose
+  - Produces 2 pyruvate and 2 NADH
+- Krebs cycle in the mitochondrial matrix
+  - Releases CO2 as a by-product
+    - Two turns per glucose molecule
+- Electron transport chain
+1. Oxidative phosphorylation
+2. Chemiosmosis through ATP synthase
+
+| Stage | Location | ATP yield |
+|:------|:--------:|----------:|
+| Glycolysis | Cytoplasm | 2 |
+| Krebs cycle | Matrix | 2 |
+| ETC | Inner membrane | ~34 |
+
+```
+C6H12O6 + 6 O2 -> 6 CO2 + 6 H2O + energy
+```
+
+> Remember: oxygen is the final electron acceptor.
+
+"""
+
+
+def make_notes(pages):
+    # One section fills a little under a page
+    return "\n".join(SECTION.format(n=i + 1) for i in range(int(pages * 1.25)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    content = make_notes(args.pages)
+    # Warm-up builds the cached styles, as a long-lived worker would have
+    pdf = render_markdown_pdf(content, "Benchmark Notes")
+    page_count = len(PdfReader(io.BytesIO(pdf)).pages)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        render_markdown_pdf(content, "Benchmark Notes")
+        timings.append(time.perf_counter() - start)
+
+    print(f"content: {len(content):,} chars -> {page_count} pages, {len(pdf):,} bytes")
+    print(f"render:  median {statistics.median(timings) * 1000:.1f} ms, "
+          f"min {min(timings) * 1000:.1f} ms over {args.repeat} runs "
+          f"({statistics.median(timings) / page_count * 1000:.2f} ms/page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# blob_store.py
+"""
+Content-addressed storage for uploaded inputs.
+
+Inputs used to be stored at inputs/<user>/<filename>: the same textbook
+uploaded by 300 students was stored 300 times, and re-uploading a file with
+the same name overwrote the input that earlier jobs still pointed at. Inputs
+are now immutable blobs keyed by the SHA-256 of their bytes:
+
+- blobs/<xx>/<sha256>      the uploaded file, stored once however often it is uploaded
+- blobs/<xx>/<sha256>.txt  its extracted (normalized) text, so it is extracted once
+
+jobs.s3_input_key keeps the user-facing name (inputs/<user>/<filename>); the
+job_inputs table maps each job to the blob it was generated from, and
+input_blobs counts those references (refs) and the uploads still working
+with the blob (pending): store() and adopt() raise pending, and the upload
+lowers it again when it links its job (link_job()) or gives up (discard()).
+A failed upload drops the blob right away only if it has neither references
+nor other pending uploads, so an upload of the same bytes that is still
+running keeps it. Blobs without references (uploads that never became a job,
+inputs of revised jobs, parked uploads nobody resolved) are deleted by sweep()
+once they have not been used for `grace` seconds; pending uses that old are
+taken to be lost with their worker.
+
+The tables are created in the apps' get_db().
+"""
+import hashlib
+import time
+
+from storage import put_artifact, read_artifact
+
+# How often (at most) one process sweeps unreferenced blobs
+SWEEP_INTERVAL = 3600
+
+
+def blob_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_key(digest):
+    return f"blobs/{digest[:2]}/{digest}"
+
+
+def text_key(digest):
+    return blob_key(digest) + ".txt"
+
+
+class BlobStore:
+    def __init__(self, storage, connect, grace=86400):
+        self.storage = storage
+        self._connect = connect
+        self.grace = grace
+        self._last_sweep = time.monotonic()
+
+    def _touch(self, digest, size, content_type):
+        """Record a pending use of the blob; True if it was already known"""
+        conn = self._connect()
+        try:
+            known = conn.execute("SELECT 1 FROM input_blobs WHERE sha256=?", (digest,)).fetchone()
+            conn.execute(
+                "INSERT INTO input_blobs(sha256, size, content_type, refs, pending, last_used) VALUES(?,?,?,0,1,?) "
+                "ON CONFLICT(sha256) DO UPDATE SET pending=pending+1, last_used=excluded.last_used",
+                (digest, size, content_type, time.time()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return known is not None
+
+    def store(self, digest, data, content_type=None):
+        """
+        Store an input under its (precomputed) hash unless it is already stored. The
+        caller then holds a pending use: it must call link_job() or discard() when done.
+        """
+        known = self._touch(digest, len(data), content_type)
+        if not known or self.storage.head(blob_key(digest)) is None:
+            self.storage.put(blob_key(digest), data, content_type)
+        self._maybe_sweep()
+
+    def put(self, data, content_type=None):
+        """store() an input hashed here; returns its hash"""
+        digest = blob_hash(data)
+        self.store(digest, data, content_type)
+        return digest
+
+    def adopt(self, key, content_type=None):
+        """Turn an object uploaded elsewhere (a direct upload) into a blob and delete the original"""
+        data = self.storage.get(key)
+        digest = blob_hash(data)
+        known = self._touch(digest, len(data), content_type)
+        if not known or self.storage.head(blob_key(digest)) is None:
+            self.storage.copy(key, blob_key(digest))
+        self.storage.delete(key)
+        self._maybe_sweep()
+        return digest
+
+    def get(self, digest):
+        return self.storage.get(blob_key(digest))
+
+    def get_text(self, digest):
+        """Cached extracted text of a blob, or None"""
+        try:
+            return read_artifact(self.storage, text_key(digest)).decode("utf-8")
+        except KeyError:
+            return None
+
+    def put_text(self, digest, text):
+        put_artifact(self.storage, text_key(digest), text.encode("utf-8"), "text/plain")
+
+    def link_job(self, job_id, digest):
+        """
+        Point a job at the blob it was generated from (moving the reference for a revised
+        job), turning the upload's pending use into a reference
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            old = conn.execute("SELECT sha256 FROM job_inputs WHERE job_id=?", (job_id,)).fetchone()
+            if old and old[0] == digest:
+                conn.execute("UPDATE input_blobs SET pending=MAX(pending-1, 0) WHERE sha256=?", (digest,))
+                conn.commit()
+                return
+            if old:
+                conn.execute("UPDATE input_blobs SET refs=refs-1, last_used=? WHERE sha256=?", (now, old[0]))
+                conn.execute("UPDATE job_inputs SET sha256=? WHERE job_id=?", (digest, job_id))
+            else:
+                conn.execute("INSERT INTO job_inputs(job_id, sha256) VALUES(?,?)", (job_id, digest))
+            conn.execute(
+                "UPDATE input_blobs SET refs=refs+1, pending=MAX(pending-1, 0), last_used=? WHERE sha256=?",
+                (now, digest),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def discard(self, digest):
+        """
+        End the pending use of an upload that failed; deletes the blob unless a job
+        references it or another upload is still working with it
+        """
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE input_blobs SET pending=MAX(pending-1, 0) WHERE sha256=?", (digest,))
+            deleted = conn.execute(
+                "DELETE FROM input_blobs WHERE sha256=? AND refs<=0 AND pending<=0", (digest,)
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if deleted:
+            self.storage.delete_many([blob_key(digest), text_key(digest)])
+
+    def job_blob(self, job_id):
+        """Hash of the blob a job was generated from, or None (jobs from before content addressing)"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT sha256 FROM job_inputs WHERE job_id=?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def sweep(self, now=None):
+        """Delete blobs (and their text) that no job references and nobody used for `grace` seconds"""
+        cutoff = (time.time() if now is None else now) - self.grace
+        conn = self._connect()
+        try:
+            candidates = [row[0] for row in conn.execute(
+                "SELECT sha256 FROM input_blobs WHERE refs<=0 AND last_used<?", (cutoff,)
+            )]
+            # Drop the rows first (re-checking, in case a blob was used meanwhile), then the objects
+            digests = [
+                d for d in candidates
+                if conn.execute(
+                    "DELETE FROM input_blobs WHERE sha256=? AND refs<=0 AND last_used<?", (d, cutoff)
+                ).rowcount
+            ]
+            conn.commit()
+        finally:
+            conn.close()
+        if digests:
+            self.storage.delete_many([key for d in digests for key in (blob_key(d), text_key(d))])
+        return len(digests)
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = time.monotonic()
+        self.sweep()
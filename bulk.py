@@ -0,0 +1,254 @@
+# bulk.py
+"""
+Offline bulk processing: generate outputs for a whole course folder.
+
+Usage:
+    python bulk.py --user 5 --kind summarize --kind mcq COURSE_DIR [MORE ...]
+    python bulk.py --user teacher@example.com --kind notes --manifest week1.txt
+
+Sources are directories (searched recursively for PDF, PPTX, DOCX, TXT and MD
+files) or single files; a manifest lists one path per line (relative to the
+manifest, "#" starts a comment). Run it from the app directory, with the same
+environment as the app: it imports the app module (STUDYMATE_APP or --app)
+and goes through the same pipeline as an upload, so the resulting jobs show
+up on the user's dashboard.
+
+- extraction runs in the app's extraction sandbox (worker processes with
+  per-document limits, see sandbox.py), skipping files whose text is
+  already cached in the content-addressed input store
+- at most --concurrency documents are in progress at once, from reading
+  the file to the last of its jobs, so a large folder's extracted text does
+  not pile up in memory while earlier documents generate; each job asks
+  admission control for a slot at bulk priority, so a running web app keeps
+  serving interactive uploads first; the per-user quotas do not apply
+- the run is resumable: a (file, kind) that already has a job for the same
+  content is skipped, so an interrupted run just continues
+- --storage/--storage-dir override STORAGE_BACKEND/STORAGE_DIR (e.g. write
+  to local disk for a dry run)
+
+Exits with status 1 if any document failed.
+"""
+import argparse
+import asyncio
+import importlib
+import mimetypes
+import os
+import sys
+
+from admission import BULK
+from aio import run_io
+from blob_store import blob_hash
+
+EXTENSIONS = {"pdf", "ppt", "pptx", "doc", "docx", "txt", "md"}
+KINDS = ["summarize", "mcq", "notes", "flashcards", "mindmap"]
+
+
+def _is_document(name):
+    return "." in name and name.rsplit(".", 1)[-1].lower() in EXTENSIONS
+
+
+def find_documents(sources, manifest=None):
+    """[(path, name)] of the documents to process; name is the path relative to its source"""
+    found = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if _is_document(name):
+                        path = os.path.join(root, name)
+                        found.append((path, os.path.relpath(path, source)))
+        else:
+            found.append((source, os.path.basename(source)))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    found.append((os.path.join(base, line), os.path.normpath(line)))
+
+    seen = set()
+    documents = []
+    for path, name in found:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            # Flattened, so documents with the same name in different folders stay apart
+            documents.append((path, name.replace(os.sep, "_")))
+    return documents
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class BulkRun:
+    def __init__(self, mod, user_id, kinds, concurrency=4):
+        # mod: the imported app module (app or app_cognito); its extract_sandbox does the parsing
+        self.mod = mod
+        self.user_id = user_id
+        self.kinds = kinds
+        self.concurrency = concurrency
+        self.done = 0
+        self.total = 0
+        self.failed = 0
+
+    def report(self, name, kind, message):
+        self.done += 1
+        print(f"[{self.done}/{self.total}] {name} {kind}: {message}", flush=True)
+
+    def completed_job(self, key_in, kind, digest):
+        """Id of the user's job of this kind already generated from this exact input, or None"""
+        row = self.mod.get_db().execute(
+            "SELECT j.id FROM jobs j JOIN job_inputs i ON i.job_id=j.id "
+            "WHERE j.user_id=? AND j.s3_input_key=? AND j.kind=? AND i.sha256=? ORDER BY j.id DESC LIMIT 1",
+            (self.user_id, key_in, kind, digest),
+        ).fetchone()
+        return row[0] if row else None
+
+    async def run(self, documents):
+        self.total = len(documents) * len(self.kinds)
+        # One document per sandbox worker, so none waits for a worker long enough to time out
+        self.extract_slots = asyncio.Semaphore(self.mod.extract_sandbox.max_workers)
+        self.document_slots = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self.process(path, name) for path, name in documents))
+        finally:
+            self.mod.extract_sandbox.shutdown()
+            self.mod.render_pool.shutdown()
+        return self.failed
+
+    async def process(self, path, name):
+        # A document holds its slot through extraction and generation, so at most
+        # `concurrency` documents' data and text are in memory at once
+        async with self.document_slots:
+            await self._process(path, name)
+
+    async def _process(self, path, name):
+        mod = self.mod
+        key_in = f"inputs/{self.user_id}/{name}"
+        async with self.extract_slots:
+            try:
+                data = await run_io(read_file, path)
+            except OSError as e:
+                self.fail(name, self.kinds, f"could not read: {e}")
+                return
+            digest = await run_io(blob_hash, data)
+            todo = []
+            for kind in self.kinds:
+                job_id = await run_io(self.completed_job, key_in, kind, digest)
+                if job_id:
+                    self.report(name, kind, f"job {job_id} (already done)")
+                else:
+                    todo.append(kind)
+            if not todo:
+                return
+
+            text = await run_io(mod.blobs.get_text, digest)
+            text_cached = text is not None
+            if text is None:
+                try:
+                    text = await run_io(mod.prepare_text, name, data)
+                except Exception as e:
+                    self.fail(name, todo, f"extraction failed: {e}")
+                    return
+            if not text.strip():
+                self.fail(name, todo, "no text could be extracted")
+                return
+
+            def store_input():
+                # One pending use of the blob per job to generate, each ended by link_job() or discard()
+                for _ in todo:
+                    mod.blobs.store(digest, data, mimetypes.guess_type(name)[0])
+                if not text_cached:
+                    mod.blobs.put_text(digest, text)
+
+            await run_io(store_input)
+            signature = await run_io(mod.minhash, text)
+        del data
+
+        jobs = await asyncio.gather(*(
+            self.generate(name, kind, text, key_in, signature, digest) for kind in todo
+        ))
+        for job_id in jobs:
+            if not job_id:
+                await run_io(mod.blobs.discard, digest)
+
+    async def generate(self, name, kind, text, key_in, signature, digest):
+        mod = self.mod
+        messages = []
+        ticket = await mod.admission.acquire_async(self.user_id, BULK, user_quotas=False)
+        while not ticket.granted:
+            await asyncio.sleep(ticket.retry_after)
+            ticket = await mod.admission.acquire_async(self.user_id, BULK, user_quotas=False)
+        try:
+            async with mod.admission.held(ticket):
+                job_id = await mod.generate_job(
+                    self.user_id, kind, name, text, key_in, signature, input_hash=digest, notify=messages.append
+                )
+        except Exception as e:
+            mod.app.logger.exception("Bulk generation of %s (%s) failed", name, kind)
+            job_id = None
+            messages.append(str(e))
+        if job_id:
+            self.report(name, kind, f"job {job_id}")
+        else:
+            self.failed += 1
+            self.report(name, kind, "FAILED " + " ".join(messages))
+        return job_id
+
+    def fail(self, name, kinds, message):
+        for kind in kinds:
+            self.failed += 1
+            self.report(name, kind, "FAILED " + message)
+
+
+def resolve_user(mod, user):
+    """Local user id for a numeric id or an email address, or None"""
+    db = mod.get_db()
+    if user.isdigit():
+        row = db.execute("SELECT id FROM users WHERE id=?", (int(user),)).fetchone()
+    else:
+        row = db.execute("SELECT id FROM users WHERE email=?", (user,)).fetchone()
+    return row[0] if row else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate study materials for a folder of documents")
+    parser.add_argument("sources", nargs="*", help="directories or files to process")
+    parser.add_argument("--manifest", help="file listing documents, one path per line")
+    parser.add_argument("--user", required=True, help="user id or email the jobs are recorded for")
+    parser.add_argument("--kind", action="append", choices=KINDS, required=True, help="output to generate (repeatable)")
+    parser.add_argument("--app", default=os.environ.get("STUDYMATE_APP", "app"), help="app module (app or app_cognito)")
+    parser.add_argument("--storage", choices=["s3", "local", "tiered"], help="override STORAGE_BACKEND")
+    parser.add_argument("--storage-dir", help="override STORAGE_DIR")
+    parser.add_argument("--extract-workers", type=int, default=0, help="extraction processes (default: one per core)")
+    parser.add_argument("--extract-timeout", type=float, default=120, help="seconds allowed per document to parse")
+    parser.add_argument("--concurrency", type=int, default=4, help="documents generating at once")
+    args = parser.parse_args(argv)
+    if not args.sources and not args.manifest:
+        parser.error("give at least one directory, file or --manifest")
+
+    # Read by the app module at import time
+    if args.storage:
+        os.environ["STORAGE_BACKEND"] = args.storage
+    if args.storage_dir:
+        os.environ["STORAGE_DIR"] = args.storage_dir
+    os.environ["EXTRACT_WORKERS"] = str(args.extract_workers or os.cpu_count() or 1)
+    os.environ["EXTRACT_TIMEOUT"] = str(args.extract_timeout)
+
+    mod = importlib.import_module(args.app)
+    user_id = resolve_user(mod, args.user)
+    if user_id is None:
+        parser.error(f"no such user: {args.user}")
+    documents = find_documents(args.sources, args.manifest)
+    run = BulkRun(mod, user_id, list(dict.fromkeys(args.kind)), concurrency=args.concurrency)
+    print(f"{len(documents)} documents x {len(run.kinds)} kinds for user {user_id}", flush=True)
+    failed = asyncio.run(run.run(documents))
+    print(f"done: {run.total - failed} ok, {failed} failed", flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
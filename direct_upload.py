@@ -0,0 +1,139 @@
+# direct_upload.py
+"""
+Direct-to-S3 browser uploads.
+
+Instead of streaming the file through a Flask worker, the browser asks for a
+presigned POST (/upload/presign), sends the file straight to the bucket under
+a staging key (incoming/<user>/<id>/<file>), then calls /upload/complete. The
+completion call only queues the upload; a background loop in the worker moves
+the object into the content-addressed input store, generates the output, and
+the dashboard reports the result.
+
+The presign response carries a signed upload token naming the user, key and
+tool, so a completion call can only queue an upload that was presigned for
+that user. A token is redeemed once: the staging key is unique in
+direct_uploads, and repeated completion calls get the upload already queued
+for it (and its job, once done) instead of starting another. Queued uploads live in the direct_uploads table (created in the
+apps' get_db()).
+
+The background loop lives in one worker process, so a restart loses what it
+was doing. A claim is therefore a lease: `updated` records when an upload
+was queued or claimed, and stale_uploads() finds the ones whose worker went
+away (still queued after QUEUED_GRACE, or processing past the lease) so the
+apps can queue them again. An upload interrupted MAX_ATTEMPTS times is failed
+instead, and a failed upload's staging object is deleted.
+"""
+import os
+import time
+import uuid
+
+# Presigned POSTs are valid this long
+UPLOAD_URL_TTL = 600
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+# A processing claim older than this belongs to a worker that died (generation
+# is bounded by the Gemini and render timeouts, well within it)
+PROCESSING_LEASE = 1800
+# Queued uploads are claimed right away; one still queued after this was lost
+QUEUED_GRACE = 60
+MAX_ATTEMPTS = 2
+
+
+def upload_serializer(secret_key):
+    from itsdangerous import URLSafeTimedSerializer
+
+    return URLSafeTimedSerializer(secret_key, salt="direct-upload")
+
+
+def upload_key(user_id, filename):
+    """Staging key a direct upload is sent to (unique per upload)"""
+    return f"incoming/{user_id}/{uuid.uuid4().hex}/{os.path.basename(filename)}"
+
+
+def queue_upload(conn, user_id, kind, filename, key_in):
+    """(id, True) of a newly queued upload, or (id, False) of the one already queued for key_in"""
+    cur = conn.execute(
+        "INSERT INTO direct_uploads(user_id, kind, filename, s3_input_key, updated) VALUES(?,?,?,?,?) "
+        "ON CONFLICT(s3_input_key) DO NOTHING",
+        (user_id, kind, filename, key_in, time.time()),
+    )
+    conn.commit()
+    if cur.rowcount:
+        return cur.lastrowid, True
+    return find_upload(conn, key_in)[0], False
+
+
+def find_upload(conn, key_in):
+    """(id, status, job_id) of the upload queued for staging key key_in, or None"""
+    return conn.execute(
+        "SELECT id, status, job_id FROM direct_uploads WHERE s3_input_key=?", (key_in,)
+    ).fetchone()
+
+
+def claim_upload(conn, upload_id, lease=PROCESSING_LEASE):
+    """
+    (user_id, kind, filename, s3_input_key) of a queued upload (or one whose claim
+    expired), marking it processing; None if taken or out of attempts
+    """
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE direct_uploads SET status='processing', updated=?, attempts=attempts+1 "
+        "WHERE id=? AND attempts<? AND (status='queued' OR (status='processing' AND updated<?))",
+        (now, upload_id, MAX_ATTEMPTS, now - lease),
+    )
+    conn.commit()
+    if cur.rowcount == 0:
+        return None
+    return conn.execute(
+        "SELECT user_id, kind, filename, s3_input_key FROM direct_uploads WHERE id=?", (upload_id,)
+    ).fetchone()
+
+
+def finish_upload(conn, upload_id, status, message, job_id=None):
+    conn.execute(
+        "UPDATE direct_uploads SET status=?, message=?, job_id=? WHERE id=?",
+        (status, message, job_id, upload_id),
+    )
+    conn.commit()
+
+
+def stale_uploads(conn, user_id, lease=PROCESSING_LEASE):
+    """(id, filename, s3_input_key, attempts) of the user's uploads whose worker went away"""
+    now = time.time()
+    return conn.execute(
+        "SELECT id, filename, s3_input_key, attempts FROM direct_uploads WHERE user_id=? "
+        "AND ((status='queued' AND updated<?) OR (status='processing' AND updated<?)) ORDER BY id",
+        (user_id, now - QUEUED_GRACE, now - lease),
+    ).fetchall()
+
+
+def fail_upload(conn, upload_id, message):
+    """Fail an upload nobody is processing any more; False if it finished meanwhile"""
+    cur = conn.execute(
+        "UPDATE direct_uploads SET status='failed', message=? WHERE id=? AND status IN ('queued', 'processing')",
+        (message, upload_id),
+    )
+    conn.commit()
+    return cur.rowcount > 0
+
+
+def in_progress(conn, user_id):
+    """The user's queued and processing uploads, oldest first"""
+    rows = conn.execute(
+        "SELECT id, kind, filename, status FROM direct_uploads "
+        "WHERE user_id=? AND status IN ('queued', 'processing') ORDER BY id",
+        (user_id,),
+    ).fetchall()
+    return [{"id": r[0], "kind": r[1], "filename": r[2], "status": r[3]} for r in rows]
+
+
+def take_finished(conn, user_id):
+    """(status, message) of the user's finished uploads not reported yet, marking them reported"""
+    rows = conn.execute(
+        "SELECT id, status, message FROM direct_uploads "
+        "WHERE user_id=? AND status IN ('done', 'failed') AND notified=0 ORDER BY id",
+        (user_id,),
+    ).fetchall()
+    if rows:
+        conn.executemany("UPDATE direct_uploads SET notified=1 WHERE id=?", [(r[0],) for r in rows])
+        conn.commit()
+    return [(r[1], r[2]) for r in rows]
@@ -0,0 +1,291 @@
+# extractors.py
+"""
+Text extraction backends, chosen per sniffed content type.
+
+Extraction used to be an if/elif on the file extension with one library per
+format, so a mislabelled file went to the wrong parser (or was decoded as
+text) and a backend that came back empty meant the user had to re-upload.
+ExtractorRegistry instead:
+
+- sniffs the content type from the bytes (PDF header, the parts inside an
+  OOXML zip), using the filename only to tell legacy OLE formats apart
+- holds several backends per content type (PDF: PyPDF2, and PyMuPDF when it
+  is installed; DOCX/PPTX: the streaming extractor of ooxml_text and the
+  python-docx/python-pptx object model; text: UTF-8 with a cp1252 fallback)
+- benchmarks them on the first `calibration_docs` documents of each type
+  (running every backend and timing it), then uses the fastest backend
+  whose text is good, i.e. has at least `quality_ratio` of the letters and
+  digits the best backend found on the same documents
+- falls back down the chain, per document, when a backend raises or returns
+  no text
+- runs the backends through `run` if given (the apps pass Sandbox.run, so
+  parsing happens in worker processes with time and memory limits); errors
+  of the types in `abort_on` fail the document instead of falling back, so
+  a file that exhausts its limits is not parsed again by every backend
+
+ranking() shows the benchmark, and benchmarks/bench_extractors.py runs it
+on sample files.
+"""
+import importlib.util
+import io
+import statistics
+import threading
+import time
+import zipfile
+
+from ooxml_text import docx_text, pptx_text
+from startup import load
+from text_normalize import PAGE_BREAK
+
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PPTX = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+DOC = "application/msword"
+PPT = "application/vnd.ms-powerpoint"
+TEXT = "text/plain"
+BINARY = "application/octet-stream"
+
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# Bytes looked at to tell text from binary data
+SNIFF_BYTES = 8192
+
+
+def sniff(data, filename=""):
+    """Content type of an uploaded file, from its bytes"""
+    if b"%PDF-" in data[:1024]:
+        return PDF
+    if data.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                names = set(zf.namelist())
+        except zipfile.BadZipFile:
+            return BINARY
+        if "word/document.xml" in names:
+            return DOCX
+        if "ppt/presentation.xml" in names:
+            return PPTX
+        return "application/zip"
+    if data.startswith(OLE_MAGIC):
+        # Legacy Office files all share the OLE container; the name is the best hint
+        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+        return {"doc": DOC, "ppt": PPT}.get(ext, "application/x-ole-storage")
+    if b"\x00" in data[:SNIFF_BYTES]:
+        return BINARY
+    return TEXT
+
+
+def text_score(text):
+    """How much real text an extraction produced: its letters and digits"""
+    return sum(1 for c in text if c.isalnum())
+
+
+def extract_text_from_pdf(file_stream):
+    file_stream.seek(0)
+    reader = load("PyPDF2").PdfReader(file_stream)
+    texts = []
+    for p in reader.pages:
+        texts.append(p.extract_text() or "")
+    # Keep page boundaries so normalize_text can spot running headers/footers
+    return PAGE_BREAK.join(texts)
+
+
+def extract_text_from_pdf_mupdf(file_stream):
+    file_stream.seek(0)
+    with load("pymupdf").open(stream=file_stream.read(), filetype="pdf") as doc:
+        return PAGE_BREAK.join(page.get_text() for page in doc)
+
+
+def extract_text_from_pptx(file_stream):
+    file_stream.seek(0)
+    prs = load("pptx").Presentation(file_stream)
+    slides = []
+    for slide in prs.slides:
+        out = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                out.append(shape.text)
+        slides.append("\n".join(out))
+    return PAGE_BREAK.join(slides)
+
+
+def extract_text_from_docx(file_stream):
+    file_stream.seek(0)
+    doc = load("docx").Document(file_stream)
+    return "\n".join(p.text for p in doc.paragraphs)
+
+
+def run_backend(fn, data):
+    """Text of data (bytes) from backend fn; runs wherever the registry's `run` puts it"""
+    return fn(io.BytesIO(data)) or ""
+
+
+def decode_utf8(file_stream):
+    file_stream.seek(0)
+    return file_stream.read().decode("utf-8-sig")
+
+
+def decode_cp1252(file_stream):
+    file_stream.seek(0)
+    return file_stream.read().decode("cp1252", errors="replace")
+
+
+class ExtractorRegistry:
+    def __init__(self, calibration_docs=5, quality_ratio=0.9, run=None, abort_on=()):
+        self.calibration_docs = calibration_docs
+        self.quality_ratio = quality_ratio
+        self.run = run
+        self.abort_on = abort_on
+        self._backends = {}  # content type -> [(name, fn, fallback_only)] in registration order
+        self._samples = {}  # content type -> {name: [(seconds, share of the best score)]}
+        self._calibrated = {}  # content type -> documents benchmarked so far
+        self._order = {}  # content type -> backend names, best first, once calibrated
+        self._lock = threading.Lock()
+
+    def register(self, content_type, name, fn, fallback_only=False):
+        """
+        Add backend fn(file_stream) -> text for content_type. Backends are tried in
+        registration order until calibrated; fallback_only ones are never benchmarked
+        and only tried after all the others (e.g. a lossy decoder).
+        """
+        with self._lock:
+            self._backends.setdefault(content_type, []).append((name, fn, fallback_only))
+            self._order.pop(content_type, None)
+
+    def backends(self, content_type):
+        """Backend names for content_type in the order they are tried"""
+        entries = self._backends.get(content_type, [])
+        with self._lock:
+            ranked = self._order.get(content_type)
+        if ranked is None:
+            ranked = [name for name, _, fallback_only in entries if not fallback_only]
+        return ranked + [name for name, _, fallback_only in entries if fallback_only]
+
+    def _needs_calibration(self, content_type):
+        candidates = [e for e in self._backends.get(content_type, []) if not e[2]]
+        with self._lock:
+            return len(candidates) > 1 and self._calibrated.get(content_type, 0) < self.calibration_docs
+
+    def _run(self, fn, data):
+        if self.run is None:
+            return run_backend(fn, data)
+        return self.run(run_backend, fn, data)
+
+    def extract(self, data, filename="", log=None):
+        """
+        (text, backend name or None, content type) of a document. log(message, exc) is
+        told about every backend that raised; abort_on errors are raised to the caller.
+        """
+        content_type = sniff(data, filename)
+        fns = {name: fn for name, fn, _ in self._backends.get(content_type, [])}
+        tried = set()
+        if self._needs_calibration(content_type):
+            text, backend, tried = self._benchmark(content_type, data, filename, log)
+            if text.strip():
+                return text, backend, content_type
+        for name in self.backends(content_type):
+            if name in tried:
+                continue
+            try:
+                text = self._run(fns[name], data)
+            except self.abort_on:
+                raise
+            except Exception as e:
+                if log:
+                    log(f"{name} could not extract {filename or 'the document'}", e)
+                continue
+            if text.strip():
+                return text, name, content_type
+        return "", None, content_type
+
+    def _benchmark(self, content_type, data, filename, log):
+        """
+        Run every (non-fallback) backend on data and record how fast and how good each
+        was. Returns (best text, its backend, the backends run).
+        """
+        results = {}
+        for name, fn, fallback_only in self._backends[content_type]:
+            if fallback_only:
+                continue
+            started = time.perf_counter()
+            try:
+                text = self._run(fn, data)
+            except self.abort_on:
+                raise
+            except Exception as e:
+                if log:
+                    log(f"{name} could not extract {filename or 'the document'}", e)
+                text = ""
+            results[name] = (text, time.perf_counter() - started, text_score(text))
+        best = max(score for _, _, score in results.values())
+        if not best:
+            # Nothing to compare (a scanned PDF, say); does not count towards the benchmark
+            return "", None, set(results)
+        self.record(content_type, {name: (seconds, score / best) for name, (_, seconds, score) in results.items()})
+        winner = max(results, key=lambda name: results[name][2])
+        return results[winner][0], winner, set(results)
+
+    def record(self, content_type, measurements):
+        """Add one document's {backend: (seconds, share of the best score)} to the benchmark"""
+        with self._lock:
+            samples = self._samples.setdefault(content_type, {})
+            for name, measurement in measurements.items():
+                samples.setdefault(name, []).append(measurement)
+            self._calibrated[content_type] = self._calibrated.get(content_type, 0) + 1
+            if self._calibrated[content_type] >= self.calibration_docs:
+                self._order[content_type] = self._rank(samples)
+
+    def _rank(self, samples):
+        # Good backends (median quality within quality_ratio of the best) by median time, then the rest by quality
+        medians = {
+            name: (statistics.median(s for s, _ in runs), statistics.median(q for _, q in runs))
+            for name, runs in samples.items()
+        }
+        good = sorted((n for n, (_, q) in medians.items() if q >= self.quality_ratio), key=lambda n: medians[n][0])
+        rest = sorted((n for n in medians if n not in good), key=lambda n: -medians[n][1])
+        return good + rest
+
+    def calibrate(self, content_type, documents):
+        """Benchmark the backends of content_type on sample documents (bytes) right away"""
+        for data in documents:
+            self._benchmark(content_type, data, "", None)
+        with self._lock:
+            samples = self._samples.get(content_type)
+            if samples:
+                self._order[content_type] = self._rank(samples)
+        return self.backends(content_type)
+
+    def ranking(self):
+        """Per content type: backends in the order tried and their median time and quality"""
+        with self._lock:
+            samples = {ct: {n: list(runs) for n, runs in s.items()} for ct, s in self._samples.items()}
+            calibrated = dict(self._calibrated)
+        report = {}
+        for content_type in self._backends:
+            runs = samples.get(content_type, {})
+            report[content_type] = {
+                "order": self.backends(content_type),
+                "documents": calibrated.get(content_type, 0),
+                "backends": {
+                    name: {
+                        "median_ms": round(statistics.median(s for s, _ in r) * 1000, 1),
+                        "quality": round(statistics.median(q for _, q in r), 3),
+                    }
+                    for name, r in runs.items()
+                },
+            }
+        return report
+
+
+def default_registry(calibration_docs=5, quality_ratio=0.9, run=None, abort_on=()):
+    """The apps' backends; PyMuPDF only if it is installed (it is an optional dependency)"""
+    registry = ExtractorRegistry(calibration_docs, quality_ratio, run, abort_on)
+    registry.register(PDF, "pypdf2", extract_text_from_pdf)
+    if importlib.util.find_spec("pymupdf") is not None:
+        registry.register(PDF, "pymupdf", extract_text_from_pdf_mupdf)
+    registry.register(DOCX, "streaming", docx_text)
+    registry.register(DOCX, "python-docx", extract_text_from_docx)
+    registry.register(PPTX, "streaming", pptx_text)
+    registry.register(PPTX, "python-pptx", extract_text_from_pptx)
+    registry.register(TEXT, "utf-8", decode_utf8)
+    registry.register(TEXT, "cp1252", decode_cp1252, fallback_only=True)
+    return registry
@@ -0,0 +1,75 @@
+# flashcards_pptx.py
+"""
+PowerPoint export for flashcard sets.
+Kept free of app state so it can run inside the render process pool.
+"""
+import io
+
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from pptx.enum.text import PP_ALIGN
+from pptx.dml.color import RGBColor
+
+
+def render_flashcards_pptx(cards, title):
+    """
+    Create a PowerPoint presentation from flashcards.
+    Each card gets 2 slides: question and answer.
+    """
+    prs = Presentation()
+    
+    for i, card in enumerate(cards, start=1):
+        # -------- Question Slide --------
+        slide_q = prs.slides.add_slide(prs.slide_layouts[5])  # Blank layout
+        
+        # Add question text box
+        tx_q = slide_q.shapes.add_textbox(
+            Inches(0.5), Inches(2), Inches(9), Inches(3)
+        )
+        tf_q = tx_q.text_frame
+        tf_q.word_wrap = True
+        
+        p_q = tf_q.paragraphs[0]
+        p_q.text = card.get('question', '')
+        p_q.font.size = Pt(32)
+        p_q.font.bold = True
+        p_q.alignment = PP_ALIGN.CENTER
+        
+        # Add footer
+        footer_q = slide_q.shapes.add_textbox(
+            Inches(0.5), Inches(6.5), Inches(9), Inches(0.5)
+        )
+        footer_q.text = f"{title} - Card {i} (Question)"
+        footer_q.text_frame.paragraphs[0].font.size = Pt(12)
+        
+        # -------- Answer Slide --------
+        slide_a = prs.slides.add_slide(prs.slide_layouts[5])
+        
+        # Add answer text box
+        tx_a = slide_a.shapes.add_textbox(
+            Inches(0.5), Inches(1.5), Inches(9), Inches(4)
+        )
+        tf_a = tx_a.text_frame
+        tf_a.word_wrap = True
+        
+        # Add answer content (handle bullet points)
+        answer_lines = card.get('answer', '').replace('\\n', '\n').split('\n')
+        for idx, line in enumerate(answer_lines):
+            if line.strip():
+                p = tf_a.add_paragraph() if idx > 0 else tf_a.paragraphs[0]
+                p.text = line.strip()
+                p.level = 0
+                p.font.size = Pt(22)
+                p.font.color.rgb = RGBColor(0, 0, 0)
+        
+        # Add footer
+        footer_a = slide_a.shapes.add_textbox(
+            Inches(0.5), Inches(6.5), Inches(9), Inches(0.5)
+        )
+        footer_a.text = f"{title} - Card {i} (Answer)"
+        footer_a.text_frame.paragraphs[0].font.size = Pt(12)
+    
+    # Save to bytes
+    bio = io.BytesIO()
+    prs.save(bio)
+    return bio.getvalue()
@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings picked up automatically from the project directory:
+
+    gunicorn app:app
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+The app and its heavy libraries are imported once in the master
+(preload_app + startup.preload()), so workers are forked with everything
+already loaded and share those pages copy-on-write. Clients are still built
+lazily inside each worker, since boto3 and httpx clients are not fork-safe.
+Each worker logs how long it took to boot, which is also the respawn cost
+after max_requests recycling or a crash.
+"""
+import os
+import time
+
+import startup
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "3"))
+preload_app = True
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    started = time.perf_counter()
+    startup.preload()
+    server.log.info("Preloaded heavy modules in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+def pre_fork(server, worker):
+    # The worker object is copied into the child, so the timestamp travels with it
+    worker.fork_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    elapsed = (time.perf_counter() - worker.fork_started) * 1000
+    worker.log.info("Worker %s booted in %.0f ms", worker.pid, elapsed)
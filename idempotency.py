@@ -0,0 +1,101 @@
+# idempotency.py
+"""
+Single-flight uploads: duplicate submissions share one generation.
+
+A double click, a browser retry or a proxy retry of a slow /upload used to
+start a second Gemini generation and record a second job. Every upload now
+claims an idempotency key first, derived from the user, the kind and the
+content hash, so the same file is caught however it is sent: form uploads
+claim it before extracting text, direct-to-S3 uploads once the staged object
+has been hashed.
+
+The first request to claim a key does the work. Duplicates that arrive while
+it runs wait for it and then report its outcome (the job it produced, or its
+error) without calling Gemini. They wait at most `wait` seconds (about a
+request timeout), since each holds a request; after that they report that
+the upload is still running. Only the owner asks admission control for a
+slot, so duplicates spend none of the user's quota. Duplicates that arrive
+after it finished get the same outcome for `ttl` seconds. A failed upload can be retried: the next
+fresh claim of its key takes it over. Claims are leases, so a key held by a
+crashed worker is taken over once `lease` seconds have passed.
+
+State lives in the upload_requests table (created in the apps' get_db()),
+so duplicates are caught across worker processes.
+"""
+import asyncio
+import hashlib
+import time
+
+from aio import run_io
+
+
+def idempotency_key(user_id, kind, digest):
+    """Key of an upload: user + kind + content"""
+    return hashlib.sha256(f"{user_id}:content:{kind}:{digest}".encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, connect, ttl=600, lease=900, wait=60, poll=0.25):
+        self._connect = connect
+        self.ttl = ttl
+        self.lease = lease
+        self.wait = wait
+        self.poll = poll
+
+    def _claim(self, key, user_id, take_failed):
+        """None if this request now owns key, else the (status, job_id, message) of its owner"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM upload_requests WHERE (status<>'running' AND updated<?) OR (status='running' AND updated<?)",
+                (now - self.ttl, now - self.lease),
+            )
+            # Take over a failed attempt only when this is a fresh submission, not a waiting duplicate
+            takeover = "upload_requests.status='failed'" if take_failed else "0"
+            claimed = conn.execute(
+                "INSERT INTO upload_requests(key, user_id, status, updated) VALUES(?,?,'running',?) "
+                "ON CONFLICT(key) DO UPDATE SET status='running', job_id=NULL, message=NULL, "
+                f"updated=excluded.updated WHERE {takeover}",
+                (key, user_id, now),
+            ).rowcount
+            conn.commit()
+            if claimed:
+                return None
+            return conn.execute(
+                "SELECT status, job_id, message FROM upload_requests WHERE key=?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+    async def acquire(self, key, user_id):
+        """
+        None if this request owns key (it must then call finish()); otherwise the
+        (status, job_id, message) of the request that owns it: "done", "failed", or
+        "running" if that one did not finish within `wait` seconds.
+        """
+        deadline = time.monotonic() + min(self.wait, self.lease)
+        earlier = await run_io(self._claim, key, user_id, True)
+        while earlier is not None and earlier[0] == "running" and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll)
+            earlier = await run_io(self._claim, key, user_id, False)
+        return earlier
+
+    def finish(self, key, job_id=None, message=""):
+        """
+        Record the owner's outcome: done if it produced job_id, failed if it only has
+        a message; with neither (the upload was parked or crashed) the key is released
+        and duplicates run on their own.
+        """
+        conn = self._connect()
+        try:
+            if job_id is None and not message:
+                conn.execute("DELETE FROM upload_requests WHERE key=?", (key,))
+            else:
+                conn.execute(
+                    "UPDATE upload_requests SET status=?, job_id=?, message=?, updated=? WHERE key=?",
+                    ("done" if job_id else "failed", job_id, message, time.time(), key),
+                )
+            conn.commit()
+        finally:
+            conn.close()
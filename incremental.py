@@ -0,0 +1,135 @@
+# incremental.py
+"""
+Chunk-level generation for notes, flashcards and quizzes, so a re-uploaded
+revision of a document only pays for the parts that changed.
+
+The apps cut the prompt window of the normalized text (select_window(), the
+same input a one-shot generation sees) into chunks at paragraph boundaries.
+Boundaries are content-defined (a paragraph ends a chunk when its hash says
+so, once the chunk is big enough), so an edit early in the document does not
+shift every later chunk. Each chunk is generated on its own, asking for its
+share of the document's item count (item_counts()), and its output is stored
+per job under the chunk's hash; when the same file is uploaded again, only
+chunks with new hashes go to Gemini and the outputs are merged back in
+document order.
+
+The chunk_outputs table is created in the apps' get_db().
+"""
+import hashlib
+import json
+import math
+import re
+import zlib
+
+# Chunks are cut at the first "boundary" paragraph after CHUNK_MIN_CHARS,
+# and never grow beyond CHUNK_MAX_CHARS
+CHUNK_MIN_CHARS = 6000
+CHUNK_MAX_CHARS = 18000
+BOUNDARY_MODULUS = 4
+
+
+def _line_pieces(line):
+    # A line longer than a chunk (text without line breaks) is cut at spaces, or hard if it has none
+    while len(line) > CHUNK_MAX_CHARS:
+        cut = line.rfind(" ", CHUNK_MIN_CHARS, CHUNK_MAX_CHARS)
+        if cut <= 0:
+            cut = CHUNK_MAX_CHARS
+        yield line[:cut].strip(), " "
+        line = line[cut:].strip()
+    if line:
+        yield line, "\n"
+
+
+def _units(text):
+    # Paragraphs, with oversized ones (e.g. Word documents without blank lines) cut into lines
+    for para in re.split(r"\n{2,}", text):
+        para = para.strip()
+        if len(para) <= CHUNK_MIN_CHARS:
+            if para:
+                yield para, "\n\n"
+            continue
+        for line in para.splitlines():
+            yield from _line_pieces(line.strip())
+
+
+def split_chunks(text):
+    """Split text into chunks with content-defined boundaries, in document order"""
+    chunks, current, size = [], [], 0
+    for unit, sep in _units(text):
+        if current and size + len(unit) > CHUNK_MAX_CHARS:
+            chunks.append("".join(current).strip())
+            current, size = [], 0
+        current.append(unit + sep)
+        size += len(unit) + len(sep)
+        boundary = zlib.crc32(unit.encode()) % BOUNDARY_MODULUS == 0
+        if size >= CHUNK_MAX_CHARS or (size >= CHUNK_MIN_CHARS and boundary):
+            chunks.append("".join(current).strip())
+            current, size = [], 0
+    if current:
+        chunks.append("".join(current).strip())
+    return chunks
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk.encode()).hexdigest()
+
+
+def item_counts(chunks, total):
+    """Split a per-document item count (e.g. 15 questions) over chunks by their share of the text"""
+    sizes = [len(chunk) for chunk in chunks]
+    exact = [total * size / (sum(sizes) or 1) for size in sizes]
+    counts = [max(1, math.floor(share)) for share in exact]
+    # What rounding down left over goes to the chunks that lost the most
+    for i in sorted(range(len(counts)), key=lambda i: counts[i] - exact[i]):
+        if sum(counts) >= total:
+            break
+        counts[i] += 1
+    return counts
+
+
+def _strip_fences(raw):
+    raw = re.sub(r"```(?:json)?\s*", "", raw)
+    return raw.strip()
+
+
+def parse_quiz_chunk(output):
+    """Questions of one chunk's quiz output (raises ValueError if it is not valid quiz JSON)"""
+    data = json.loads(_strip_fences(output))
+    questions = data.get("questions") if isinstance(data, dict) else data
+    if not isinstance(questions, list):
+        raise ValueError("quiz output has no questions list")
+    return questions
+
+
+def merge_text(outputs):
+    return "\n\n".join(output.strip() for output in outputs)
+
+
+def merge_quiz(outputs):
+    questions = []
+    for output in outputs:
+        questions.extend(parse_quiz_chunk(output))
+    return json.dumps({"questions": questions}, ensure_ascii=False)
+
+
+# kind -> (chunk output validator or None, merger)
+MERGERS = {
+    "notes": (None, merge_text),
+    "flashcards": (None, merge_text),
+    "mcq": (parse_quiz_chunk, merge_quiz),
+}
+
+
+def load_chunk_outputs(conn, job_id):
+    """{chunk hash: output} stored for a job"""
+    return dict(conn.execute("SELECT chunk_hash, output FROM chunk_outputs WHERE job_id=?", (job_id,)))
+
+
+def save_chunk_outputs(conn, job_id, outputs):
+    """Replace a job's stored chunk outputs (dropping chunks the new version no longer has)"""
+    conn.execute("DELETE FROM chunk_outputs WHERE job_id=?", (job_id,))
+    conn.executemany(
+        "INSERT INTO chunk_outputs(job_id, chunk_hash, output) VALUES(?,?,?)",
+        [(job_id, h, output) for h, output in outputs.items()],
+    )
+    conn.commit()
@@ -0,0 +1,139 @@
+# jwt_verify.py
+"""
+Local verification of Cognito ID and access tokens.
+
+Instead of asking Cognito about every token (get_user), tokens are checked
+in-process: the RS256 signature against the user pool's JSON Web Key Set,
+plus issuer, audience/client, token_use and expiry. The JWKS is fetched once
+and cached; an unknown key id (Cognito rotated its keys) triggers a refetch,
+at most once per JWKS_MIN_REFETCH seconds.
+
+Everything network-facing is injectable, so the verifier can be exercised
+with keys generated locally (rsa.newkeys) and a static JWKS.
+"""
+import base64
+import json
+import threading
+import time
+import urllib.request
+
+JWKS_TTL = 24 * 3600
+JWKS_MIN_REFETCH = 300
+# Allowed clock skew when checking exp/iat
+LEEWAY = 60
+
+
+class TokenError(Exception):
+    """Raised when a token is malformed, badly signed, expired or not for this app"""
+
+
+def b64url_decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _public_key(jwk):
+    import rsa
+
+    n = int.from_bytes(b64url_decode(jwk["n"]), "big")
+    e = int.from_bytes(b64url_decode(jwk["e"]), "big")
+    return rsa.PublicKey(n, e)
+
+
+def jwk_from_public_key(public_key, kid):
+    """JWK dict for an rsa.PublicKey (for building a local JWKS)"""
+    def encode(value):
+        return b64url_encode(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+    return {"kty": "RSA", "alg": "RS256", "use": "sig", "kid": kid, "n": encode(public_key.n), "e": encode(public_key.e)}
+
+
+def _fetch_url(url):
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+class JWKSCache:
+    """Signing keys of a user pool by key id, fetched lazily and cached"""
+
+    def __init__(self, url, fetch=None, ttl=JWKS_TTL, min_refetch=JWKS_MIN_REFETCH):
+        self.url = url
+        self._fetch = fetch or _fetch_url
+        self.ttl = ttl
+        self.min_refetch = min_refetch
+        self._keys = {}
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        jwks = self._fetch(self.url)
+        self._keys = {jwk["kid"]: _public_key(jwk) for jwk in jwks.get("keys", []) if jwk.get("kty") == "RSA"}
+        self._fetched = time.monotonic()
+
+    def get(self, kid):
+        key = self._keys.get(kid)
+        age = time.monotonic() - self._fetched
+        if key is not None and age < self.ttl:
+            return key
+        with self._lock:
+            age = time.monotonic() - self._fetched
+            # Refetch when stale, or for an unknown kid unless we just did
+            if self._fetched == 0 or age >= self.ttl or (kid not in self._keys and age >= self.min_refetch):
+                try:
+                    self._refresh()
+                except Exception as e:
+                    if not self._keys:
+                        raise TokenError(f"Could not fetch signing keys: {e}")
+            key = self._keys.get(kid)
+        if key is None:
+            raise TokenError("Token signed with an unknown key")
+        return key
+
+
+class TokenVerifier:
+    """Verifies tokens issued by one Cognito user pool for one app client"""
+
+    def __init__(self, region, user_pool_id, client_id, jwks=None, leeway=LEEWAY):
+        self.issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+        self.client_id = client_id
+        self.jwks = jwks or JWKSCache(self.issuer + "/.well-known/jwks.json")
+        self.leeway = leeway
+
+    def verify(self, token, token_use="id", now=None):
+        """Return the token's claims, or raise TokenError"""
+        import rsa
+
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(b64url_decode(header_b64))
+            claims = json.loads(b64url_decode(payload_b64))
+            signature = b64url_decode(signature_b64)
+        except (ValueError, AttributeError) as e:
+            raise TokenError(f"Malformed token: {e}")
+
+        if header.get("alg") != "RS256":
+            raise TokenError(f"Unsupported token algorithm: {header.get('alg')}")
+        key = self.jwks.get(header.get("kid"))
+        try:
+            method = rsa.verify(f"{header_b64}.{payload_b64}".encode(), signature, key)
+        except rsa.VerificationError:
+            raise TokenError("Invalid token signature")
+        if method != "SHA-256":
+            raise TokenError("Invalid token signature")
+
+        now = time.time() if now is None else now
+        if claims.get("iss") != self.issuer:
+            raise TokenError("Token issued by another user pool")
+        if claims.get("token_use") != token_use:
+            raise TokenError(f"Expected an {token_use} token")
+        # ID tokens name the app client in aud, access tokens in client_id
+        audience = claims.get("aud") if token_use == "id" else claims.get("client_id")
+        if audience != self.client_id:
+            raise TokenError("Token issued for another app client")
+        if not isinstance(claims.get("exp"), (int, float)) or claims["exp"] + self.leeway < now:
+            raise TokenError("Token expired")
+        if isinstance(claims.get("iat"), (int, float)) and claims["iat"] - self.leeway > now:
+            raise TokenError("Token issued in the future")
+        return claims
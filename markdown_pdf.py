@@ -0,0 +1,382 @@
+# markdown_pdf.py
+"""
+Markdown to PDF rendering for summaries and notes.
+
+Styles and regular expressions are built once per process. Content is
+tokenized in a single pass over its lines into block tokens (headings,
+paragraphs, nested lists, fenced code, pipe tables, quotes, rules) which are
+then turned into reportlab flowables.
+"""
+import io
+import re
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Preformatted, SimpleDocTemplate, Spacer, Table, TableStyle
+from reportlab.platypus.flowables import HRFlowable
+
+PAGE_SIZE = letter
+MARGIN = 72
+FRAME_WIDTH = PAGE_SIZE[0] - 2 * MARGIN
+
+PRIMARY = colors.HexColor('#4f46e5')
+SECONDARY = colors.HexColor('#6366f1')
+TEXT = colors.HexColor('#0f172a')
+MUTED = colors.HexColor('#475569')
+RULE = colors.HexColor('#cbd5e1')
+CODE_BG = colors.HexColor('#f1f5f9')
+HEADER_BG = colors.HexColor('#eef2ff')
+
+# Longest code line before Preformatted wraps it
+CODE_LINE_LENGTH = 88
+# Helvetica only covers WinAnsi, so nested bullets stick to glyphs it has
+BULLETS = ('•', '–', '·')
+
+# Block-level patterns
+_HEADING = re.compile(r'^(#{1,6})\s*(.*?)\s*#*\s*$')
+_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w+-]*)\s*$')
+_BULLET = re.compile(r'^(\s*)(?:[-*+•])\s+(.*)$')
+_ORDERED = re.compile(r'^(\s*)(\d{1,3})[.)]\s+(.*)$')
+_BOLD_BULLET = re.compile(r'^[•\-\*]\s*\*\*([^*]+)\*\*:?\s*$')
+_RULE = re.compile(r'^\s*(?:-{3,}|\*{3,}|_{3,})\s*$')
+_QUOTE = re.compile(r'^\s*>\s?(.*)$')
+_TABLE_ROW = re.compile(r'^\s*\|.*\|\s*$')
+_TABLE_SEP = re.compile(r'^\s*\|?\s*:?-{2,}:?\s*(?:\|\s*:?-{2,}:?\s*)*\|?\s*$')
+_CELL_SPLIT = re.compile(r'(?<!\\)\|')
+
+# Inline patterns
+_CODE_SPAN = re.compile(r'`([^`]+)`')
+_BOLD_ITALIC = re.compile(r'\*\*\*(.+?)\*\*\*')
+# __x__ only between word boundaries, and never a lowercase identifier (__init__ stays a dunder name)
+_BOLD = re.compile(r'\*\*(.+?)\*\*|(?<![\w.])__(?![a-z_][a-z0-9_]*__(?!\w))(?=\S)(.+?)(?<=\S)__(?![\w(])')
+_ITALIC = re.compile(r'\*(.+?)\*')
+_LINK = re.compile(r'\[([^\]]+)\]\((https?://[^)\s]+)\)')
+_CODE_MARK = re.compile('\x00(\\d+)\x00')
+_TAG = re.compile(r'<(/?)(b|i|link)\b[^>]*>')
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """Paragraph and table styles, built once per process"""
+    base = getSampleStyleSheet()
+    styles = {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=base['Heading1'],
+            fontSize=24,
+            textColor=PRIMARY,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=base['Heading2'],
+            fontSize=16,
+            textColor=PRIMARY,
+            spaceAfter=12,
+            spaceBefore=12,
+            fontName='Helvetica-Bold'
+        ),
+        'subheading': ParagraphStyle(
+            'CustomSubHeading',
+            parent=base['Heading3'],
+            fontSize=13,
+            textColor=SECONDARY,
+            spaceAfter=8,
+            spaceBefore=8,
+            fontName='Helvetica-Bold'
+        ),
+        'body': ParagraphStyle(
+            'CustomBody',
+            parent=base['BodyText'],
+            fontSize=11,
+            textColor=TEXT,
+            spaceAfter=8,
+            alignment=TA_JUSTIFY,
+            leading=16
+        ),
+        'quote': ParagraphStyle(
+            'CustomQuote',
+            parent=base['BodyText'],
+            fontSize=11,
+            textColor=MUTED,
+            fontName='Helvetica-Oblique',
+            leftIndent=18,
+            borderPadding=(0, 0, 0, 8),
+            spaceAfter=8,
+            leading=15
+        ),
+        'code': ParagraphStyle(
+            'CustomCode',
+            parent=base['Code'],
+            fontName='Courier',
+            fontSize=9,
+            leading=12,
+            textColor=TEXT,
+            backColor=CODE_BG,
+            borderPadding=6,
+            leftIndent=6,
+            rightIndent=6,
+            spaceBefore=6,
+            spaceAfter=10
+        ),
+        'table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG),
+            ('GRID', (0, 0), (-1, -1), 0.5, RULE),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]),
+    }
+    for level in range(len(BULLETS) + 1):
+        styles[f'list{level}'] = ParagraphStyle(
+            f'CustomBullet{level}',
+            parent=base['BodyText'],
+            fontSize=11,
+            textColor=TEXT,
+            spaceAfter=6,
+            leftIndent=20 + 18 * level,
+            bulletIndent=10 + 18 * level,
+            leading=14
+        )
+    for name, align in (('left', TA_LEFT), ('center', TA_CENTER), ('right', TA_RIGHT)):
+        styles[f'cell_{name}'] = ParagraphStyle(
+            f'CustomCell_{name}',
+            parent=base['BodyText'],
+            fontSize=10,
+            textColor=TEXT,
+            leading=13,
+            alignment=align
+        )
+        styles[f'head_{name}'] = ParagraphStyle(
+            f'CustomHeadCell_{name}',
+            parent=styles[f'cell_{name}'],
+            fontName='Helvetica-Bold'
+        )
+    return styles
+
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _well_nested(markup):
+    """True if the b/i/link tags in markup close in the order they were opened"""
+    open_tags = []
+    for m in _TAG.finditer(markup):
+        if not m.group(1):
+            open_tags.append(m.group(2))
+        elif not open_tags or open_tags.pop() != m.group(2):
+            return False
+    return not open_tags
+
+
+def inline_markup(text):
+    """Convert inline markdown (bold, italic, code, links) to reportlab paragraph markup"""
+    text = escape(text)
+
+    # Pull code spans and link targets out first so their contents are left untouched
+    spans = []
+
+    def stash(value):
+        spans.append(value)
+        return f'\x00{len(spans) - 1}\x00'
+
+    def link(m):
+        href = stash(m.group(2).replace('"', '%22'))
+        return f'<link href="{href}" color="#4f46e5">{m.group(1)}</link>'
+
+    text = _CODE_SPAN.sub(lambda m: stash(f'<font name="Courier">{m.group(1)}</font>'), text)
+    text = _LINK.sub(link, text)
+    marked = _BOLD_ITALIC.sub(r'<b><i>\1</i></b>', text)
+    marked = _BOLD.sub(lambda m: f'<b>{m.group(1) or m.group(2)}</b>', marked)
+    marked = _ITALIC.sub(r'<i>\1</i>', marked)
+    # Overlapping emphasis (**a *b** c*) is rejected by reportlab's parser: keep the markers as text instead
+    if _well_nested(marked):
+        text = marked
+    if spans:
+        text = _CODE_MARK.sub(lambda m: spans[int(m.group(1))], text)
+    return text
+
+
+def _indent_width(prefix):
+    return len(prefix.expandtabs(4))
+
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip().replace('\\|', '|') for cell in _CELL_SPLIT.split(line)]
+
+
+def _alignments(sep_line):
+    aligns = []
+    for cell in _split_row(sep_line):
+        if cell.startswith(':') and cell.endswith(':'):
+            aligns.append('center')
+        elif cell.endswith(':'):
+            aligns.append('right')
+        else:
+            aligns.append('left')
+    return aligns
+
+
+def tokenize(content):
+    """
+    Split markdown into block tokens in one pass over the lines.
+    Tokens are tuples whose first element is the token type.
+    """
+    lines = content.split('\n')
+    n = len(lines)
+    i = 0
+    list_indents = []  # indentation stack of the list currently being read
+
+    while i < n:
+        raw = lines[i].rstrip()
+        line = raw.strip()
+
+        fence = _FENCE.match(raw)
+        if fence:
+            marker, lang = fence.groups()
+            body = []
+            i += 1
+            while i < n and not lines[i].strip().startswith(marker):
+                body.append(lines[i].rstrip())
+                i += 1
+            i += 1  # closing fence (or end of input)
+            list_indents.clear()
+            yield ('code', lang, '\n'.join(body))
+            continue
+
+        if not line:
+            list_indents.clear()
+            yield ('blank',)
+            i += 1
+            continue
+
+        # Pipe table: a row followed by a separator row
+        if _TABLE_ROW.match(raw) and i + 1 < n and _TABLE_SEP.match(lines[i + 1]):
+            header = _split_row(raw)
+            aligns = _alignments(lines[i + 1])
+            rows = []
+            i += 2
+            while i < n and _TABLE_ROW.match(lines[i]):
+                rows.append(_split_row(lines[i]))
+                i += 1
+            list_indents.clear()
+            yield ('table', header, aligns, rows)
+            continue
+
+        i += 1
+
+        heading = _HEADING.match(line)
+        if heading:
+            list_indents.clear()
+            yield ('heading', len(heading.group(1)), heading.group(2))
+            continue
+
+        if _RULE.match(line):
+            list_indents.clear()
+            yield ('rule',)
+            continue
+
+        # A bullet that is entirely bold reads as a subheading
+        bold_bullet = _BOLD_BULLET.match(line)
+        if bold_bullet:
+            list_indents.clear()
+            yield ('heading', 3, '• ' + bold_bullet.group(1))
+            continue
+
+        item = _BULLET.match(raw) or _ORDERED.match(raw)
+        if item:
+            indent = _indent_width(item.group(1))
+            while list_indents and indent < list_indents[-1]:
+                list_indents.pop()
+            if not list_indents or indent > list_indents[-1]:
+                list_indents.append(indent)
+            level = min(len(list_indents) - 1, len(BULLETS))
+            if item.re is _ORDERED:
+                yield ('item', level, item.group(2) + '.', item.group(3))
+            else:
+                yield ('item', level, BULLETS[min(level, len(BULLETS) - 1)], item.group(2))
+            continue
+
+        quote = _QUOTE.match(raw)
+        if quote:
+            list_indents.clear()
+            yield ('quote', quote.group(1))
+            continue
+
+        # Short all-caps lines are headings in most generated notes
+        if line.isupper() and 3 < len(line) < 100:
+            list_indents.clear()
+            yield ('heading', 3, line)
+            continue
+
+        list_indents.clear()
+        yield ('paragraph', line)
+
+
+def _table_flowable(header, aligns, rows, styles):
+    cols = max([len(header)] + [len(r) for r in rows])
+    aligns = (aligns + ['left'] * cols)[:cols]
+
+    def cells(values, prefix):
+        values = (values + [''] * cols)[:cols]
+        return [Paragraph(inline_markup(v), styles[f'{prefix}_{a}']) for v, a in zip(values, aligns)]
+
+    data = [cells(header, 'head')] + [cells(r, 'cell') for r in rows]
+    table = Table(data, colWidths=[FRAME_WIDTH / cols] * cols, repeatRows=1, hAlign='LEFT')
+    table.setStyle(styles['table'])
+    return table
+
+
+def markdown_flowables(content, title=None):
+    """Turn markdown content into a list of reportlab flowables"""
+    styles = get_styles()
+    elements = []
+    if title:
+        elements.append(Paragraph(escape(title), styles['title']))
+        elements.append(Spacer(1, 0.3 * inch))
+
+    for token in tokenize(content):
+        kind = token[0]
+        if kind == 'blank':
+            elements.append(Spacer(1, 0.1 * inch))
+        elif kind == 'heading':
+            style = styles['heading'] if token[1] <= 2 else styles['subheading']
+            elements.append(Paragraph(inline_markup(token[2]), style))
+        elif kind == 'item':
+            _, level, bullet, text = token
+            elements.append(Paragraph(inline_markup(text), styles[f'list{level}'], bulletText=bullet))
+        elif kind == 'code':
+            elements.append(Preformatted(token[2] or ' ', styles['code'], maxLineLength=CODE_LINE_LENGTH))
+        elif kind == 'table':
+            elements.append(_table_flowable(token[1], token[2], token[3], styles))
+            elements.append(Spacer(1, 0.1 * inch))
+        elif kind == 'quote':
+            elements.append(Paragraph(inline_markup(token[1]), styles['quote']))
+        elif kind == 'rule':
+            elements.append(HRFlowable(width='100%', thickness=0.7, color=RULE, spaceBefore=6, spaceAfter=6))
+        else:
+            elements.append(Paragraph(inline_markup(token[1]), styles['body']))
+    return elements
+
+
+def render_markdown_pdf(content, title):
+    """Render markdown content to PDF bytes"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=PAGE_SIZE,
+                            rightMargin=MARGIN, leftMargin=MARGIN,
+                            topMargin=MARGIN, bottomMargin=MARGIN,
+                            title=title)
+    doc.build(markdown_flowables(content, title))
+    return buffer.getvalue()
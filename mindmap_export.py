@@ -0,0 +1,373 @@
+# mindmap_export.py
+"""
+Server-side rendering of mind maps to PDF and PNG.
+
+The mind map JSON generated for mindmap jobs is laid out once in Python
+(a left-to-right tidy tree, the same shape the D3 viewer draws) and then
+painted either with reportlab (PDF) or Pillow (PNG). Renders are scheduled
+from a small thread pool (the drawing itself can be handed to a process pool
+via the `run` hook) and cached per job, so repeated exports are instant and
+concurrent clicks on the same export share a single render.
+"""
+import io
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Colours mirror templates/mindmap_viewer.html so exports look like the viewer
+BACKGROUND = "#0f1419"
+ROOT_FILL = "#8b5cf6"
+ROOT_STROKE = "#a78bfa"
+BRANCH_FILL = "#6366f1"
+BRANCH_STROKE = "#818cf8"
+LEAF_FILL = "#334155"
+LEAF_STROKE = "#64748b"
+LINK_COLOR = "#475569"
+LABEL_BG = "#334155"
+ROOT_LABEL_BG = "#1e293b"
+TEXT_COLOR = "#f1f5f9"
+TITLE_COLOR = "#e2e8f0"
+
+# Layout metrics, in points
+FONT_SIZE = 11
+ROOT_FONT_SIZE = 15
+ROW_HEIGHT = 26
+NODE_RADIUS = 6
+ROOT_RADIUS = 9
+LABEL_PAD_X = 8
+LABEL_PAD_Y = 5
+COLUMN_GAP = 60
+MARGIN = 40
+TITLE_HEIGHT = 36
+MAX_LABEL_CHARS = 60
+
+# PDF viewers refuse pages larger than 200 inches
+MAX_PDF_SIDE = 14400
+# Keep PNG exports within a sane memory budget
+MAX_PNG_SIDE = 12000
+MAX_PNG_PIXELS = 60_000_000
+
+_FENCE_OPEN = re.compile(r'```json\s*')
+_FENCE_CLOSE = re.compile(r'```\s*$')
+
+
+def parse_mindmap_json(raw):
+    """Parse stored mind map JSON, tolerating markdown code fences"""
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    raw = _FENCE_OPEN.sub('', raw)
+    raw = _FENCE_CLOSE.sub('', raw)
+    return json.loads(raw.strip())
+
+
+class LayoutNode:
+    """A positioned mind map node (coordinates are top-left based)"""
+    __slots__ = ("label", "depth", "x", "y", "width", "height", "children", "has_children")
+
+    def __init__(self, label, depth):
+        self.label = label
+        self.depth = depth
+        self.x = 0.0
+        self.y = 0.0
+        self.width = 0.0
+        self.height = 0.0
+        self.children = []
+        self.has_children = False
+
+    @property
+    def radius(self):
+        return ROOT_RADIUS if self.depth == 0 else NODE_RADIUS
+
+    @property
+    def font_size(self):
+        return ROOT_FONT_SIZE if self.depth == 0 else FONT_SIZE
+
+
+class MindmapLayout:
+    """Result of layout_mindmap(): positioned nodes plus the canvas size"""
+
+    def __init__(self, root, nodes, width, height):
+        self.root = root
+        self.nodes = nodes
+        self.width = width
+        self.height = height
+
+    def links(self):
+        for node in self.nodes:
+            for child in node.children:
+                yield node, child
+
+
+def _label(data):
+    name = str(data.get("name", "")) if isinstance(data, dict) else str(data)
+    name = " ".join(name.split())
+    if len(name) > MAX_LABEL_CHARS:
+        name = name[:MAX_LABEL_CHARS - 1] + "…"
+    return name
+
+
+def layout_mindmap(tree, title=None):
+    """
+    Compute a left-to-right tree layout.
+    Depth maps to columns sized to the widest label at that depth; leaves are
+    stacked in rows and every parent is centred on the span of its children.
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    nodes = []
+    column_widths = []
+
+    # Build the node tree iteratively so deep maps never hit the recursion limit
+    root = LayoutNode(_label(tree), 0)
+    stack = [(tree, root)]
+    while stack:
+        data, node = stack.pop()
+        nodes.append(node)
+        font = "Helvetica-Bold" if node.depth == 0 else "Helvetica"
+        node.width = stringWidth(node.label, font, node.font_size) + 2 * LABEL_PAD_X
+        node.height = node.font_size + 2 * LABEL_PAD_Y
+        while len(column_widths) <= node.depth:
+            column_widths.append(0.0)
+        column_widths[node.depth] = max(column_widths[node.depth], node.width + 2 * node.radius)
+
+        children = data.get("children") if isinstance(data, dict) else None
+        if isinstance(children, list) and children:
+            node.has_children = True
+            for child_data in children:
+                child = LayoutNode(_label(child_data), node.depth + 1)
+                node.children.append(child)
+            stack.extend(zip(reversed(children), reversed(node.children)))
+
+    top = MARGIN + (TITLE_HEIGHT if title else 0)
+    column_x = [MARGIN]
+    for w in column_widths[:-1]:
+        column_x.append(column_x[-1] + w + COLUMN_GAP)
+
+    # Post-order walk: leaves take the next row, parents centre on children
+    next_row = 0
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        node.x = column_x[node.depth] + node.radius
+        if not node.children:
+            node.y = top + next_row * ROW_HEIGHT + ROW_HEIGHT / 2
+            next_row += 1
+        elif visited:
+            node.y = (node.children[0].y + node.children[-1].y) / 2
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+
+    width = column_x[-1] + column_widths[-1] + MARGIN
+    if title:
+        width = max(width, stringWidth(title, "Helvetica-Bold", 18) + 2 * MARGIN)
+    height = top + max(next_row, 1) * ROW_HEIGHT + MARGIN
+    return MindmapLayout(root, nodes, width, height)
+
+
+def _node_colors(node):
+    if node.depth == 0:
+        return ROOT_FILL, ROOT_STROKE, ROOT_LABEL_BG
+    if node.has_children:
+        return BRANCH_FILL, BRANCH_STROKE, LABEL_BG
+    return LEAF_FILL, LEAF_STROKE, LABEL_BG
+
+
+def _link_points(parent, child):
+    """Start at the right edge of the parent's label, end at the child's circle"""
+    x0 = parent.x + parent.radius + 4 + parent.width
+    return x0, parent.y, child.x - child.radius, child.y
+
+
+def render_mindmap_pdf(tree, title=None):
+    """Render a mind map tree to PDF bytes on a single page sized to fit"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+
+    layout = layout_mindmap(tree, title)
+    scale = min(1.0, MAX_PDF_SIDE / layout.width, MAX_PDF_SIDE / layout.height)
+    page_w, page_h = layout.width * scale, layout.height * scale
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(page_w, page_h), pageCompression=1)
+    c.setTitle(title or "Mind Map")
+    c.setFillColor(colors.HexColor(BACKGROUND))
+    c.rect(0, 0, page_w, page_h, stroke=0, fill=1)
+
+    # Flip into the layout's top-left coordinate system
+    c.translate(0, page_h)
+    c.scale(scale, -scale)
+
+    if title:
+        c.saveState()
+        c.translate(MARGIN, MARGIN + 18)
+        c.scale(1, -1)
+        c.setFillColor(colors.HexColor(TITLE_COLOR))
+        c.setFont("Helvetica-Bold", 18)
+        c.drawString(0, 0, title)
+        c.restoreState()
+
+    c.setStrokeColor(colors.HexColor(LINK_COLOR))
+    c.setLineWidth(1.5)
+    for parent, child in layout.links():
+        x0, y0, x1, y1 = _link_points(parent, child)
+        mx = (x0 + x1) / 2
+        c.bezier(x0, y0, mx, y0, mx, y1, x1, y1)
+
+    for node in layout.nodes:
+        fill, stroke, label_bg = _node_colors(node)
+        c.setFillColor(colors.HexColor(fill))
+        c.setStrokeColor(colors.HexColor(stroke))
+        c.setLineWidth(2)
+        c.circle(node.x, node.y, node.radius, stroke=1, fill=1)
+
+        lx = node.x + node.radius + 4
+        c.setFillColor(colors.HexColor(label_bg))
+        c.roundRect(lx, node.y - node.height / 2, node.width, node.height, 5, stroke=0, fill=1)
+
+        # Text must be drawn un-flipped
+        c.saveState()
+        c.translate(lx + LABEL_PAD_X, node.y + node.font_size * 0.35)
+        c.scale(1, -1)
+        c.setFillColor(colors.HexColor(TEXT_COLOR))
+        c.setFont("Helvetica-Bold" if node.depth == 0 else "Helvetica", node.font_size)
+        c.drawString(0, 0, node.label)
+        c.restoreState()
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def _bezier_points(x0, y0, x1, y1, steps=16):
+    mx = (x0 + x1) / 2
+    points = []
+    for i in range(steps + 1):
+        t = i / steps
+        u = 1 - t
+        x = u ** 3 * x0 + 3 * u * u * t * mx + 3 * u * t * t * mx + t ** 3 * x1
+        y = u ** 3 * y0 + 3 * u * u * t * y0 + 3 * u * t * t * y1 + t ** 3 * y1
+        points.append((x, y))
+    return points
+
+
+def render_mindmap_png(tree, title=None, scale=2.0):
+    """Render a mind map tree to PNG bytes (scale 2 gives crisp output on HiDPI screens)"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    layout = layout_mindmap(tree, title)
+    scale = min(
+        scale,
+        MAX_PNG_SIDE / layout.width,
+        MAX_PNG_SIDE / layout.height,
+        (MAX_PNG_PIXELS / (layout.width * layout.height)) ** 0.5,
+    )
+    size = (max(1, int(layout.width * scale)), max(1, int(layout.height * scale)))
+    img = Image.new("RGB", size, BACKGROUND)
+    draw = ImageDraw.Draw(img)
+
+    fonts = {}
+
+    def font(px):
+        px = max(6, int(round(px)))
+        if px not in fonts:
+            try:
+                fonts[px] = ImageFont.load_default(size=px)
+            except TypeError:
+                # Pillow < 10.1 has no scalable default font
+                fonts[px] = ImageFont.load_default()
+        return fonts[px]
+
+    def s(v):
+        return v * scale
+
+    if title:
+        draw.text((s(MARGIN), s(MARGIN)), title, fill=TITLE_COLOR, font=font(s(18)))
+
+    link_width = max(1, int(round(s(1.5))))
+    for parent, child in layout.links():
+        points = [(s(x), s(y)) for x, y in _bezier_points(*_link_points(parent, child))]
+        draw.line(points, fill=LINK_COLOR, width=link_width)
+
+    for node in layout.nodes:
+        fill, stroke, label_bg = _node_colors(node)
+        r = node.radius
+        draw.ellipse(
+            [s(node.x - r), s(node.y - r), s(node.x + r), s(node.y + r)],
+            fill=fill, outline=stroke, width=max(1, int(round(s(2)))),
+        )
+        lx = node.x + r + 4
+        box = [s(lx), s(node.y - node.height / 2), s(lx + node.width), s(node.y + node.height / 2)]
+        draw.rounded_rectangle(box, radius=s(5), fill=label_bg)
+        draw.text(
+            (s(lx + LABEL_PAD_X), s(node.y)), node.label,
+            fill=TEXT_COLOR, font=font(s(node.font_size)), anchor="lm",
+        )
+
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+
+RENDERERS = {
+    "pdf": render_mindmap_pdf,
+    "png": render_mindmap_png,
+}
+
+
+class MindmapExporter:
+    """
+    Renders mind map exports off the request thread and caches them per job output.
+    Concurrent requests for the same export wait on the same render.
+    """
+
+    def __init__(self, max_workers=2, cache_size=64, run=None, timeout=60):
+        # run(fn, *args) executes the actual render, e.g. RenderPool.run; timeout bounds
+        # the whole export (loading the source and the render), so it must cover run's own
+        self._run = run or (lambda fn, *args: fn(*args))
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mindmap-export")
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _render(self, key, fmt, load_source, title):
+        try:
+            tree = parse_mindmap_json(load_source())
+            data = self._run(RENDERERS[fmt], tree, title)
+            with self._lock:
+                self._cache[key] = data
+                self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            return data
+        finally:
+            # Done either way: the next request gets the cached export or renders again,
+            # even if every waiter gave up before a failed render finished
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def export(self, cache_key, fmt, load_source, title=None, timeout=None):
+        """
+        Return the rendered export for cache_key (e.g. the job id and output key). Cached
+        exports are never invalidated, so cache_key must change whenever the source does:
+        outputs are stored under content-hashed keys, and a revised job gets a new one.
+        load_source is only called on a cache miss and must return the mind map JSON.
+        Raises concurrent.futures.TimeoutError if it takes longer than timeout.
+        """
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unsupported mind map export format: {fmt}")
+        key = (cache_key, fmt)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._render, key, fmt, load_source, title)
+                self._inflight[key] = future
+        return future.result(timeout=timeout or self.timeout)
+
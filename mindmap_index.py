@@ -0,0 +1,82 @@
+# mindmap_index.py
+"""
+Server-side index over a stored mind map so the viewer can load it lazily.
+
+Every node is addressed by its path: the dot-separated child indices from the
+root ("" is the root, "0.2" is the third child of the first branch). The index
+is built once per job and cached, after which any subtree can be sliced to a
+requested depth without re-parsing the JSON.
+"""
+import threading
+from collections import OrderedDict
+
+from mindmap_export import parse_mindmap_json
+
+
+class MindmapIndex:
+    """Flat path -> node lookup over a parsed mind map tree"""
+
+    def __init__(self, tree):
+        self._nodes = {}
+        # Iterative walk so deep or very wide maps never hit the recursion limit
+        stack = [("", tree)]
+        while stack:
+            path, node = stack.pop()
+            if not isinstance(node, dict):
+                node = {"name": str(node)}
+            children = node.get("children")
+            if not isinstance(children, list):
+                children = []
+            self._nodes[path] = (str(node.get("name", "")), children)
+            for i, child in enumerate(children):
+                stack.append((f"{path}.{i}" if path else str(i), child))
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def subtree(self, path="", depth=2):
+        """
+        Return the node at path with its descendants down to `depth` levels.
+        Nodes cut off at the depth limit keep their `child_count` so the client
+        knows they can be expanded with another request.
+        """
+        if path not in self._nodes:
+            raise KeyError(path)
+
+        def build(p, remaining):
+            name, children = self._nodes[p]
+            out = {"name": name, "path": p, "child_count": len(children)}
+            if children and remaining > 0:
+                out["children"] = [
+                    build(f"{p}.{i}" if p else str(i), remaining - 1)
+                    for i in range(len(children))
+                ]
+            return out
+
+        return build(path, max(0, depth))
+
+
+class MindmapIndexCache:
+    """LRU cache of MindmapIndex objects, built once per job"""
+
+    def __init__(self, max_entries=128):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, cache_key, load_source):
+        """Return the index for cache_key, calling load_source() only on a miss"""
+        with self._lock:
+            index = self._entries.get(cache_key)
+            if index is not None:
+                self._entries.move_to_end(cache_key)
+                return index
+
+        index = MindmapIndex(parse_mindmap_json(load_source()))
+
+        with self._lock:
+            self._entries[cache_key] = index
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return index
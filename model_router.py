@@ -0,0 +1,193 @@
+# model_router.py
+"""
+Model routing: which Gemini model and settings generate a job.
+
+Every job used to go to one hard-coded model with default settings, whether
+the input was a one-page handout or a 20k-character chapter. ModelRouter
+picks a Route (model, output token budget, temperature, JSON mode) from the
+kind and the input length. With the default rules:
+
+- short inputs go to the fast model
+- long mind maps go to the "mindmap" route: low temperature, which keeps
+  large JSON trees consistent, and a model and output budget of its own
+  (by default the standard model and its 8192 tokens, the most
+  gemini-2.0-flash returns; a deployment can point it at a model that
+  completes bigger trees)
+- everything else goes to the standard model
+
+A rule lists candidate routes in order of preference and the SLO picks among
+them. "latency" takes the first candidate whose recent p90 generation time is
+within latency_slo seconds (or the fastest one if none is). "cost" takes the
+cheapest candidate. Without an SLO the first candidate wins.
+
+A/B comparisons: an experiment (a, b, fraction) sends that fraction of the
+jobs that would use route a to route b instead. The arm is picked from a
+hash of the job's subject (the input hash), so reruns of a document stay in
+their arm. Each generation's route, arm, input size and time is recorded in
+job_routes (created in the apps' get_db()), and route_stats() compares
+latencies per route and arm.
+"""
+import hashlib
+import threading
+from collections import deque
+
+# Kinds whose output is JSON (generated in JSON response mode)
+JSON_KINDS = {"mcq", "mindmap"}
+# Inputs up to this many characters count as short
+SHORT_CHARS = 4000
+# Mind maps from inputs at least this long use the "mindmap" route
+HEAVY_MINDMAP_CHARS = 12000
+
+
+class Route:
+    def __init__(self, name, model, max_output_tokens=None, temperature=None, json_mode=True, cost=1.0):
+        self.name = name
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.json_mode = json_mode
+        # Relative price, compared under the "cost" SLO
+        self.cost = cost
+
+    def config(self, kind):
+        """Generation config for google-genai's generate_content(config=...)"""
+        settings = {}
+        if self.max_output_tokens:
+            settings["max_output_tokens"] = self.max_output_tokens
+        if self.temperature is not None:
+            settings["temperature"] = self.temperature
+        if self.json_mode and kind in JSON_KINDS:
+            settings["response_mime_type"] = "application/json"
+        return settings
+
+
+def default_routes(standard_model, fast_model, mindmap_model=None, mindmap_tokens=8192):
+    """(routes by name, rules) used unless the router is given its own"""
+    routes = {
+        "fast": Route("fast", fast_model, max_output_tokens=4096, cost=0.75),
+        "standard": Route("standard", standard_model, max_output_tokens=8192),
+        "mindmap": Route("mindmap", mindmap_model or standard_model, max_output_tokens=mindmap_tokens, temperature=0.2),
+    }
+    # (kinds or None for all, min chars, max chars or None, candidate routes); first match wins
+    rules = [
+        (None, 0, SHORT_CHARS, ["fast", "standard"]),
+        ({"mindmap"}, HEAVY_MINDMAP_CHARS, None, ["mindmap"]),
+        (None, 0, None, ["standard", "fast"]),
+    ]
+    return routes, rules
+
+
+def parse_experiment(spec):
+    """"a:b:fraction" (e.g. "standard:fast:0.1") -> (a, b, fraction); "" -> None"""
+    if not spec:
+        return None
+    a, b, fraction = spec.split(":")
+    return a, b, float(fraction)
+
+
+class ModelRouter:
+    def __init__(self, routes, rules, slo=None, latency_slo=30.0, experiment=None, window=50):
+        if slo not in (None, "latency", "cost"):
+            raise ValueError(f"Unknown model SLO: {slo!r}")
+        if experiment and not (experiment[0] in routes and experiment[1] in routes):
+            raise ValueError(f"Unknown route in experiment: {experiment!r}")
+        self.routes = routes
+        self.rules = rules
+        self.slo = slo
+        self.latency_slo = latency_slo
+        self.experiment = experiment
+        self.window = window
+        self._latencies = {}  # route name -> recent generation times (seconds)
+        self._lock = threading.Lock()
+
+    def _p90(self, name):
+        with self._lock:
+            recent = sorted(self._latencies.get(name, ()))
+        if not recent:
+            return None
+        return recent[int(0.9 * (len(recent) - 1))]
+
+    def _pick(self, candidates):
+        if self.slo == "cost":
+            return min(candidates, key=lambda route: route.cost)
+        if self.slo == "latency":
+            observed = [(self._p90(route.name), route) for route in candidates]
+            for p90, route in observed:
+                # Routes without samples yet get the benefit of the doubt
+                if p90 is None or p90 <= self.latency_slo:
+                    return route
+            return min(observed, key=lambda item: item[0])[1]
+        return candidates[0]
+
+    def choose(self, kind, chars, subject=""):
+        """(Route, A/B arm or None) for a job of kind with chars characters of input"""
+        for kinds, min_chars, max_chars, names in self.rules:
+            if (kinds is None or kind in kinds) and chars >= min_chars and (max_chars is None or chars <= max_chars):
+                break
+        route = self._pick([self.routes[name] for name in names])
+
+        arm = None
+        if self.experiment and route.name == self.experiment[0]:
+            _, b, fraction = self.experiment
+            bucket = int(hashlib.sha256(f"{subject}:{kind}".encode()).hexdigest()[:8], 16) / 0x100000000
+            arm = "B" if bucket < fraction else "A"
+            if arm == "B":
+                route = self.routes[b]
+        return route, arm
+
+    def observe(self, route, seconds):
+        """Record how long a generation on route took (feeds the latency SLO)"""
+        with self._lock:
+            recent = self._latencies.get(route.name)
+            if recent is None:
+                recent = self._latencies[route.name] = deque(maxlen=self.window)
+            recent.append(seconds)
+
+    def snapshot(self):
+        """Recent p90 per route in this process, plus the configuration"""
+        return {
+            "slo": self.slo,
+            "latency_slo": self.latency_slo,
+            "experiment": list(self.experiment) if self.experiment else None,
+            "routes": {
+                name: {
+                    "model": route.model,
+                    "recent": len(self._latencies.get(name, ())),
+                    "p90_s": None if self._p90(name) is None else round(self._p90(name), 3),
+                }
+                for name, route in self.routes.items()
+            },
+        }
+
+
+def record_route(conn, job_id, kind, route, arm, chars, seconds):
+    conn.execute(
+        "INSERT INTO job_routes(job_id, kind, route, model, arm, chars, seconds) VALUES(?,?,?,?,?,?,?)",
+        (job_id, kind, route.name, route.model, arm, chars, seconds),
+    )
+    conn.commit()
+
+
+def route_stats(conn, kind=None):
+    """Generation latency per (route, model, arm) over the recorded jobs, for A/B comparisons"""
+    sql = "SELECT route, model, arm, seconds FROM job_routes"
+    params = ()
+    if kind:
+        sql += " WHERE kind=?"
+        params = (kind,)
+    groups = {}
+    for route, model, arm, seconds in conn.execute(sql, params):
+        groups.setdefault((route, model, arm), []).append(seconds)
+    stats = []
+    for (route, model, arm), times in sorted(groups.items(), key=lambda item: tuple(str(v) for v in item[0])):
+        times.sort()
+        stats.append({
+            "route": route,
+            "model": model,
+            "arm": arm,
+            "count": len(times),
+            "avg_s": round(sum(times) / len(times), 3),
+            "p50_s": round(times[(len(times) - 1) // 2], 3),
+            "p90_s": round(times[int(0.9 * (len(times) - 1))], 3),
+        })
+    return stats
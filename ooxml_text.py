@@ -0,0 +1,207 @@
+# ooxml_text.py
+"""
+Streaming text extraction for DOCX and PPTX files.
+
+python-docx and python-pptx build the whole object model of a document just
+to read its text, which is slow and memory-hungry on big files, and the
+apps' use of them missed text: tables and grouped shapes on slides (shapes
+without a .text attribute), tables in documents, and speaker notes.
+
+These functions read only the XML parts that hold text, straight out of the
+zip, with lxml's iterparse, and clear every element once its text has been
+taken, so memory stays flat however large the document is:
+
+- docx_text(): word/document.xml in reading order; table rows become one
+  line each, cells separated by " | "
+- pptx_text(): every slide in presentation order (shapes at any depth, so
+  grouped shapes too, and tables row by row), followed by its speaker
+  notes; slides are separated by PAGE_BREAK like the other extractors
+
+Both take a binary file object (or path) and raise zipfile.BadZipFile,
+KeyError or lxml.etree.XMLSyntaxError for files that are not valid OOXML.
+lxml is loaded on first use (see startup.py), not when the apps start.
+"""
+import posixpath
+import zipfile
+
+from startup import load
+from text_normalize import PAGE_BREAK
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+NOTES_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+CELL_SEPARATOR = " | "
+
+
+def _release(elem, siblings=True):
+    # Free the element and (unless it is still inside an open table) the processed siblings before it
+    elem.clear()
+    parent = elem.getparent()
+    if siblings and parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+class _Blocks:
+    """Collects paragraphs, folding those inside table cells into "a | b" row lines"""
+
+    def __init__(self):
+        self.lines = []
+        self._rows = []  # open table rows (lists of cell texts), innermost last
+        self._cells = []  # open cells (lists of paragraphs), innermost last
+
+    @property
+    def in_table(self):
+        return bool(self._rows)
+
+    def start_row(self):
+        self._rows.append([])
+
+    def start_cell(self):
+        self._cells.append([])
+
+    def paragraph(self, text):
+        if self._cells:
+            self._cells[-1].append(text)
+        else:
+            self.lines.append(text)
+
+    def end_cell(self):
+        if self._cells and self._rows:
+            self._rows[-1].append(" ".join(t for t in self._cells.pop() if t))
+
+    def end_row(self):
+        if not self._rows:
+            return
+        line = CELL_SEPARATOR.join(self._rows.pop()).strip(" |")
+        if line:
+            # (a nested table's row becomes part of the enclosing cell)
+            self.paragraph(line)
+
+
+def _in_fallback(elem):
+    # Text boxes and the like are stored twice (mc:Choice and a legacy mc:Fallback)
+    return any(True for _ in elem.iterancestors(MC + "Fallback"))
+
+
+def _docx_paragraph(p):
+    parts = []
+    for node in p.iter(W + "t", W + "tab", W + "br", W + "cr"):
+        if node.tag == W + "t":
+            parts.append(node.text or "")
+        elif node.tag == W + "tab":
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts)
+
+
+def docx_text(fileobj):
+    with zipfile.ZipFile(fileobj) as zf, zf.open("word/document.xml") as part:
+        blocks = _Blocks()
+        for event, elem in load("lxml.etree").iterparse(
+            part, events=("start", "end"), tag=(W + "p", W + "tr", W + "tc", W + "tbl"), huge_tree=True
+        ):
+            tag = elem.tag
+            if event == "start":
+                if tag == W + "tr":
+                    blocks.start_row()
+                elif tag == W + "tc":
+                    blocks.start_cell()
+                continue
+            if tag == W + "p":
+                if not _in_fallback(elem):
+                    blocks.paragraph(_docx_paragraph(elem))
+                # Cleared even inside tables, so an enclosing paragraph does not repeat its text
+                _release(elem, siblings=not blocks.in_table)
+            elif tag == W + "tc":
+                blocks.end_cell()
+            elif tag == W + "tr":
+                blocks.end_row()
+            elif tag == W + "tbl" and not blocks.in_table:
+                _release(elem)
+        return "\n".join(blocks.lines)
+
+
+def _drawing_paragraph(p):
+    parts = []
+    for node in p.iter(A + "t", A + "br"):
+        parts.append(node.text or "" if node.tag == A + "t" else "\n")
+    return "".join(parts)
+
+
+def _drawing_text(stream, body_only=False):
+    """
+    Text of a slide (or notes slide) part. body_only keeps just the body placeholder,
+    which holds the notes on a notes slide (not the slide number, header or date).
+    """
+    blocks = _Blocks()
+    placeholder = None
+    tags = (A + "p", A + "tr", A + "tc", P + "sp", P + "graphicFrame", P + "ph")
+    for event, elem in load("lxml.etree").iterparse(stream, events=("start", "end"), tag=tags, huge_tree=True):
+        tag = elem.tag
+        if event == "start":
+            if tag == A + "tr":
+                blocks.start_row()
+            elif tag == A + "tc":
+                blocks.start_cell()
+            elif tag in (P + "sp", P + "graphicFrame"):
+                placeholder = None
+            elif tag == P + "ph":
+                placeholder = elem.get("type", "body")
+            continue
+        if tag == A + "p":
+            if (not body_only or placeholder == "body") and not _in_fallback(elem):
+                blocks.paragraph(_drawing_paragraph(elem))
+            _release(elem, siblings=not blocks.in_table)
+        elif tag == A + "tc":
+            blocks.end_cell()
+        elif tag == A + "tr":
+            blocks.end_row()
+        elif tag in (P + "sp", P + "graphicFrame") and not blocks.in_table:
+            _release(elem)
+    return "\n".join(line for line in blocks.lines if line.strip())
+
+
+def _rels(zf, part):
+    """{relationship id: (type, target part name)} of a part"""
+    folder, name = posixpath.split(part)
+    try:
+        with zf.open(posixpath.join(folder, "_rels", name + ".rels")) as f:
+            root = load("lxml.etree").parse(f).getroot()
+    except KeyError:
+        return {}
+    return {
+        rel.get("Id"): (rel.get("Type"), posixpath.normpath(posixpath.join(folder, rel.get("Target"))))
+        for rel in root.iter(REL + "Relationship")
+        if rel.get("TargetMode") != "External"
+    }
+
+
+def _slide_parts(zf):
+    """Slide part names in presentation order"""
+    rels = _rels(zf, "ppt/presentation.xml")
+    with zf.open("ppt/presentation.xml") as f:
+        root = load("lxml.etree").parse(f).getroot()
+    return [rels[sld.get(R + "id")][1] for sld in root.iter(P + "sldId") if sld.get(R + "id") in rels]
+
+
+def pptx_text(fileobj):
+    with zipfile.ZipFile(fileobj) as zf:
+        slides = []
+        for part in _slide_parts(zf):
+            with zf.open(part) as f:
+                text = _drawing_text(f)
+            for rel_type, target in _rels(zf, part).values():
+                if rel_type == NOTES_REL:
+                    with zf.open(target) as f:
+                        notes = _drawing_text(f, body_only=True)
+                    if notes:
+                        text = f"{text}\n{notes}" if text else notes
+            slides.append(text)
+        return PAGE_BREAK.join(slides)
@@ -0,0 +1,134 @@
+# prompt_window.py
+"""
+Content-aware selection of the text sent to Gemini.
+
+The prompts used to take the first 20,000 characters of a document, which on
+slide decks is mostly title pages, agendas and section dividers. Instead the
+whole document is split into spans (paragraphs, or runs of short lines on
+slides), each span is scored with TF-IDF against the document as a whole, and
+the most informative spans that fit the character budget are kept, in
+document order. Documents that already fit are passed through untouched.
+
+Scoring is vectorised with NumPy over a sparse (span, term, weight) layout,
+so memory stays linear in the document size.
+"""
+import re
+
+PROMPT_CHAR_BUDGET = 20000
+
+# Span sizing: short lines are merged up to SPAN_TARGET_CHARS, long paragraphs
+# are cut at sentence boundaries around SPAN_MAX_CHARS
+SPAN_TARGET_CHARS = 400
+SPAN_MAX_CHARS = 1200
+# Spans shorter than this are scored down proportionally (titles, "Agenda", ...)
+SPAN_INFORMATIVE_CHARS = 200
+SEPARATOR = "\n\n"
+
+_TOKEN = re.compile(r"[^\W\d_]{2,}|\d+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _split_long(block):
+    if len(block) <= SPAN_MAX_CHARS:
+        return [block]
+    spans, current = [], ""
+    for sentence in _SENTENCE_END.split(block):
+        while len(sentence) > SPAN_MAX_CHARS:
+            # No sentence breaks at all: hard cut
+            if current:
+                spans.append(current)
+                current = ""
+            spans.append(sentence[:SPAN_MAX_CHARS])
+            sentence = sentence[SPAN_MAX_CHARS:]
+        if current and len(current) + 1 + len(sentence) > SPAN_MAX_CHARS:
+            spans.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        spans.append(current)
+    return spans
+
+
+def split_spans(text):
+    """Split text into scoring spans in document order"""
+    spans, lines = [], []
+    size = 0
+
+    def flush():
+        nonlocal size
+        if lines:
+            spans.extend(_split_long("\n".join(lines)))
+            lines.clear()
+            size = 0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            flush()
+            continue
+        lines.append(line)
+        size += len(line) + 1
+        if size >= SPAN_TARGET_CHARS:
+            flush()
+    flush()
+    return spans
+
+
+def score_spans(spans):
+    """TF-IDF score of each span against the whole document (higher is more informative)"""
+    import numpy as np
+
+    vocab = {}
+    rows, cols = [], []
+    for i, span in enumerate(spans):
+        for token in _TOKEN.findall(span.lower()):
+            rows.append(i)
+            cols.append(vocab.setdefault(token, len(vocab)))
+    n = len(spans)
+    if not vocab:
+        return np.zeros(n)
+
+    # Collapse (span, term) pairs into counts
+    pairs = np.asarray(rows, dtype=np.int64) * len(vocab) + np.asarray(cols, dtype=np.int64)
+    pairs, counts = np.unique(pairs, return_counts=True)
+    rows, cols = pairs // len(vocab), pairs % len(vocab)
+
+    # Terms found in every span carry no information (idf 0)
+    df = np.bincount(cols, minlength=len(vocab))
+    idf = np.log((1 + n) / (1 + df))
+    weights = (1 + np.log(counts)) * idf[cols]
+
+    # L2-normalise each span, then measure its cosine to the document centroid
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n))
+    weights = weights / np.where(norms > 0, norms, 1)[rows]
+    centroid = np.bincount(cols, weights=weights, minlength=len(vocab)) / n
+    scores = np.bincount(rows, weights=weights * centroid[cols], minlength=n)
+
+    lengths = np.fromiter((len(s) for s in spans), dtype=float, count=n)
+    return scores * np.minimum(1.0, lengths / SPAN_INFORMATIVE_CHARS)
+
+
+def select_window(text, budget=PROMPT_CHAR_BUDGET):
+    """Return the most informative spans of text that fit in budget characters, in order"""
+    if len(text) <= budget:
+        return text
+    spans = split_spans(text)
+    scores = score_spans(spans)
+
+    chosen, seen = [], set()
+    remaining = budget
+    for i in scores.argsort(kind="stable")[::-1]:
+        span = spans[i]
+        cost = len(span) + len(SEPARATOR)
+        # Skip spans repeated verbatim (template text on every slide)
+        if cost > remaining or span in seen:
+            continue
+        chosen.append(i)
+        seen.add(span)
+        remaining -= cost
+        if remaining < len(SEPARATOR) + 40:
+            break
+    if not chosen:
+        return text[:budget]
+    return SEPARATOR.join(spans[i] for i in sorted(chosen))
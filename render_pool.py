@@ -0,0 +1,196 @@
+# render_pool.py
+"""
+Shared process pool for CPU-bound rendering (PDF, PPTX, mind map exports).
+
+reportlab, python-pptx and Pillow hold the GIL while they work, so running
+them on the request thread stalls the whole web worker. Every render call
+goes through RenderPool.run(), which ships the work to a pool of processes
+sized to the machine's cores; the request thread only waits on a future.
+Functions can be passed as "module:function" strings so the web process
+never has to import reportlab or python-pptx itself.
+The pool enforces a queue-depth limit and a per-call timeout and keeps
+simple counters that can be exposed as metrics. A render that is still
+running when its caller times out would otherwise keep its worker (and its
+queue slot) until it finished on its own, so new work moves to a fresh pool
+and the old pool's processes are killed once its other renders are done.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Modules imported once in the fork server so children (render workers and the
+# extraction sandbox's workers, see sandbox.py) start warm
+PRELOAD_MODULES = ["markdown_pdf", "mindmap_export", "flashcards_pptx", "extractors", "PyPDF2", "docx"]
+
+
+class RenderError(Exception):
+    """Base class for render pool failures"""
+
+
+class RenderQueueFull(RenderError):
+    """Raised when too many renders are already queued or running"""
+
+
+class RenderTimeout(RenderError):
+    """Raised when a render does not finish within its timeout"""
+
+
+def _call_target(target, args, kwargs):
+    # Resolves a "module:function" target inside the worker process
+    module, name = target.split(":")
+    return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+
+def _target_name(fn):
+    if isinstance(fn, str):
+        return fn.split(":")[-1]
+    return getattr(fn, "__name__", repr(fn))
+
+
+class RenderPool:
+    """Process pool with a queue-depth limit, timeouts and metrics"""
+
+    def __init__(self, max_workers=None, max_queue=None, timeout=60, start_method=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue or self.max_workers * 4
+        self.timeout = timeout
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._owners = {}  # in-flight future -> the executor running it
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "recycled": 0,
+            "max_inflight": 0,
+        }
+        self._durations = {}
+
+    def _get_executor(self):
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        if self._executor is None:
+            method = self.start_method
+            if method is None:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            ctx = multiprocessing.get_context(method)
+            if method == "forkserver":
+                ctx.set_forkserver_preload(PRELOAD_MODULES)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        return self._executor
+
+    def _finished(self, name, started, future):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._inflight -= 1
+            self._owners.pop(future, None)
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self._stats["completed"] += 1
+                count, total, worst = self._durations.get(name, (0, 0.0, 0.0))
+                self._durations[name] = (count + 1, total + elapsed, max(worst, elapsed))
+            else:
+                self._stats["failed"] += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) on the pool and return its future (fn may be a "module:function" string)"""
+        name = _target_name(fn)
+        if isinstance(fn, str):
+            fn, args, kwargs = _call_target, (fn, args, kwargs), {}
+        with self._lock:
+            if self._inflight >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise RenderQueueFull(f"Render queue is full ({self._inflight} in flight)")
+            try:
+                future = self._get_executor().submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool
+                self._executor = None
+                future = self._get_executor().submit(fn, *args, **kwargs)
+            self._owners[future] = self._executor
+            self._inflight += 1
+            self._stats["submitted"] += 1
+            self._stats["max_inflight"] = max(self._stats["max_inflight"], self._inflight)
+        started = time.perf_counter()
+        future.add_done_callback(lambda f: self._finished(name, started, f))
+        return future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Run fn in the pool and wait for its result"""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            if not future.cancel():
+                self._recycle(future)
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise RenderTimeout(f"{_target_name(fn)} did not finish in {timeout or self.timeout}s")
+
+    async def run_async(self, fn, *args, timeout=None, **kwargs):
+        """Coroutine version of run(): awaits the pool without blocking the event loop"""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # wait_for cancelled the wrapper, which cancels the future unless it is already running
+            if not future.cancelled():
+                self._recycle(future)
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise RenderTimeout(f"{_target_name(fn)} did not finish in {timeout or self.timeout}s")
+
+    def _recycle(self, future):
+        """Stop a render that outlived its timeout: new work goes to a fresh pool, the old one is killed"""
+        with self._lock:
+            executor = self._owners.get(future)
+            if executor is None:
+                return
+            if executor is self._executor:
+                self._executor = None
+                self._stats["recycled"] += 1
+            others = [f for f, owner in self._owners.items() if owner is executor and f is not future]
+
+        def reap():
+            # Let the old pool's other renders finish (within the timeout), then kill its processes;
+            # the stuck render's future fails with BrokenProcessPool, which frees its queue slot
+            wait(others, timeout=self.timeout)
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.kill()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        threading.Thread(target=reap, daemon=True).start()
+
+    def metrics(self):
+        """Snapshot of pool counters and per-function render times"""
+        with self._lock:
+            renders = {
+                name: {
+                    "count": count,
+                    "avg_ms": round(total / count * 1000, 1),
+                    "max_ms": round(worst * 1000, 1),
+                }
+                for name, (count, total, worst) in self._durations.items()
+            }
+            return dict(
+                self._stats,
+                workers=self.max_workers,
+                max_queue=self.max_queue,
+                inflight=self._inflight,
+                renders=renders,
+            )
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
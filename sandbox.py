@@ -0,0 +1,305 @@
+# sandbox.py
+"""
+Sandboxed document parsing: per-document CPU time, memory and time limits.
+
+A malformed or hostile PDF can make PyPDF2 spin for minutes or grow to
+gigabytes, and parsing used to run inside the web worker, where nothing
+stopped it. Sandbox.run() sends each call to a worker process of its own
+small pool (one document at a time per process) and enforces per call:
+
+- CPU time: RLIMIT_CPU is set to the worker's usage so far plus
+  cpu_seconds, and the SIGXCPU it raises aborts the parse in the worker
+- memory: the caller samples the worker's RSS while it waits and kills it
+  above memory_mb; RLIMIT_AS stops a runaway allocation in between samples
+- wall-clock time: a worker that has not answered within `timeout` seconds
+  (e.g. stuck in C code, where SIGXCPU is only seen on return) is killed
+
+A call over a limit raises SandboxTimeout or SandboxMemoryError
+(SandboxCrashed if the worker died on its own) and its worker is replaced,
+so only that document fails. Exceptions raised by the function itself are
+re-raised as they are. Workers are recycled after max_tasks calls, and after
+any call that leaves their RSS above half of memory_mb, to contain leaks in
+the parsing libraries. The rlimits need the resource module (Unix) and the
+RSS limit reads /proc (Linux); elsewhere only the wall-clock limit applies.
+"""
+import importlib
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from render_pool import PRELOAD_MODULES
+
+# How often the caller checks the worker's memory and the deadline
+POLL_SECONDS = 0.05
+MB = 1 << 20
+
+
+class SandboxError(Exception):
+    """Base class for sandboxed calls that were stopped or could not run"""
+
+
+class SandboxBusy(SandboxError):
+    """Raised when no worker became free in time"""
+
+
+class SandboxTimeout(SandboxError):
+    """Raised when a call used up its CPU time or wall-clock time"""
+
+
+class SandboxMemoryError(SandboxError):
+    """Raised when a call went over its memory limit"""
+
+
+class SandboxCrashed(SandboxError):
+    """Raised when the worker died during a call"""
+
+
+class _CPUExceeded(BaseException):
+    # A BaseException so libraries' "except Exception" clauses cannot swallow it
+    pass
+
+
+def _cpu_exceeded(signum, frame):
+    raise _CPUExceeded()
+
+
+def _statm(pid="self"):
+    """(virtual size, RSS) of a process in bytes, or None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            size, rss = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    page = os.sysconf("SC_PAGE_SIZE")
+    return int(size) * page, int(rss) * page
+
+
+def _set_limit(which, soft):
+    _, hard = resource.getrlimit(which)
+    if soft is None or hard != resource.RLIM_INFINITY:
+        soft = hard if soft is None else min(soft, hard)
+    resource.setrlimit(which, (soft, hard))
+
+
+def _limit(cpu_seconds, memory_mb):
+    # Limits are per call: relative to what the worker has used so far
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _set_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1)
+    sizes = _statm()
+    if sizes is not None:
+        # Address space is far larger than RSS (mapped libraries, thread stacks), hence the headroom
+        _set_limit(resource.RLIMIT_AS, sizes[0] + 2 * memory_mb * MB)
+
+
+def _unlimit():
+    if resource is not None:
+        _set_limit(resource.RLIMIT_CPU, None)
+        _set_limit(resource.RLIMIT_AS, None)
+
+
+def _serve(conn, cpu_seconds, memory_mb, max_tasks):
+    """Worker loop: run calls one at a time, replying (status, value, retiring)"""
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _cpu_exceeded)
+    for done in range(1, max_tasks + 1):
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            if isinstance(fn, str):
+                module, name = fn.split(":")
+                fn = getattr(importlib.import_module(module), name)
+            _limit(cpu_seconds, memory_mb)
+            reply = ("ok", fn(*args))
+        except _CPUExceeded:
+            reply = ("cpu", None)
+        except MemoryError:
+            reply = ("memory", None)
+        except Exception as e:
+            reply = ("error", e)
+        finally:
+            _unlimit()
+        # After a limit was hit the library may be left in any state; start afresh
+        sizes = _statm()
+        retiring = (
+            reply[0] in ("cpu", "memory")
+            or done == max_tasks
+            or (sizes is not None and sizes[1] > memory_mb * MB / 2)
+        )
+        try:
+            conn.send(reply + (retiring,))
+        except Exception as e:
+            # The result or the exception could not be pickled
+            conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}"), retiring))
+        if retiring:
+            return
+
+
+class _Worker:
+    def __init__(self, ctx, cpu_seconds, memory_mb, max_tasks):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child, cpu_seconds, memory_mb, max_tasks), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        self.conn.close()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class Sandbox:
+    """Pool of single-call worker processes with per-call CPU, memory and time limits"""
+
+    def __init__(self, max_workers=2, timeout=60, cpu_seconds=30, memory_mb=1024, max_tasks=50, start_method=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_tasks = max_tasks
+        self.start_method = start_method
+        self._idle = []
+        self._workers = 0  # started (idle or busy)
+        self._cond = threading.Condition()
+        self._stats = {
+            "calls": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "memory_kills": 0,
+            "crashes": 0,
+            "busy": 0,
+            "started": 0,
+            "recycled": 0,
+        }
+
+    def _context(self):
+        method = self.start_method
+        if method is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(method)
+        if method == "forkserver":
+            # Shared with the render pool: whichever starts the fork server first sets its preloads
+            ctx.set_forkserver_preload(PRELOAD_MODULES)
+        return ctx
+
+    def _checkout(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and self._workers >= self.max_workers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["busy"] += 1
+                    raise SandboxBusy(f"all {self.max_workers} parsing workers are busy")
+                self._cond.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            # Started outside the lock, so other callers are not held up
+            self._workers += 1
+            self._stats["started"] += 1
+        try:
+            return _Worker(self._context(), self.cpu_seconds, self.memory_mb, self.max_tasks)
+        except Exception:
+            self._checkin(None, False)
+            raise
+
+    def _checkin(self, worker, keep, kill=False):
+        # Return a worker to the pool, or stop it and free its slot
+        if worker is not None and not keep:
+            worker.stop(kill)
+        with self._cond:
+            if worker is not None and keep:
+                self._idle.append(worker)
+            else:
+                self._workers -= 1
+            self._cond.notify()
+
+    def _wait(self, worker, timeout):
+        """Reply (status, value, retiring) of the worker's call; kills it over a limit"""
+        deadline = time.monotonic() + timeout
+        while not worker.conn.poll(POLL_SECONDS):
+            sizes = _statm(worker.process.pid)
+            if sizes is not None and sizes[1] > self.memory_mb * MB:
+                raise SandboxMemoryError(f"parsing needed more than {self.memory_mb} MB of memory")
+            if time.monotonic() > deadline:
+                raise SandboxTimeout(f"parsing took more than {timeout:g}s")
+            if not worker.process.is_alive() and not worker.conn.poll():
+                break
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(1)
+            raise SandboxCrashed(f"parsing crashed (exit code {worker.process.exitcode})")
+
+    def run(self, fn, *args, timeout=None):
+        """Run fn(*args) (fn may be a "module:function" string) in a worker and return its result"""
+        timeout = timeout or self.timeout
+        self._count("calls")
+        worker = self._checkout(timeout)
+        try:
+            try:
+                worker.conn.send((fn, args))
+            except OSError:
+                raise SandboxCrashed(f"parsing worker exited (exit code {worker.process.exitcode})")
+            status, value, retiring = self._wait(worker, timeout)
+        except BaseException as e:
+            self._count({SandboxTimeout: "timeouts", SandboxMemoryError: "memory_kills"}.get(type(e), "crashes"))
+            self._checkin(worker, keep=False, kill=True)
+            raise
+        if retiring:
+            self._count("recycled")
+        self._checkin(worker, keep=not retiring)
+
+        if status == "cpu":
+            self._count("timeouts")
+            raise SandboxTimeout(f"parsing took more than {self.cpu_seconds:g}s of CPU time")
+        if status == "memory":
+            self._count("memory_kills")
+            raise SandboxMemoryError(f"parsing needed more than {self.memory_mb} MB of memory")
+        if status == "error":
+            self._count("failed")
+            raise value
+        self._count("completed")
+        return value
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def metrics(self):
+        """Snapshot of call counters, workers and limits"""
+        with self._cond:
+            return dict(
+                self._stats,
+                workers=self._workers,
+                idle=len(self._idle),
+                max_workers=self.max_workers,
+                limits={
+                    "timeout_s": self.timeout,
+                    "cpu_s": self.cpu_seconds,
+                    "memory_mb": self.memory_mb,
+                    "max_tasks": self.max_tasks,
+                },
+            )
+
+    def shutdown(self):
+        """Stop the idle workers"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._workers -= len(idle)
+        for worker in idle:
+            worker.stop()
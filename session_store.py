@@ -0,0 +1,189 @@
+# session_store.py
+"""
+Server-side sessions for Flask, stored in SQLite.
+
+Flask's default session is a signed cookie. With Cognito's tokens in it,
+that cookie is kilobytes that every request (static assets included) has to
+carry, verify and deserialize. With SqliteSessionInterface the cookie only
+holds an opaque random session id; the data lives in a small SQLite database
+(WAL mode, one primary-key lookup per request) shared by all worker processes.
+There is deliberately no per-process cache in front: a worker reading a stale
+copy would write it back over another worker's changes (a popped
+pending_upload, consumed flashes, refreshed tokens).
+
+- Sessions expire after the app's PERMANENT_SESSION_LIFETIME; expiry is
+  extended as they are used, and expired rows are swept periodically.
+- session.clear() (done at sign-in and sign-out) deletes the session and
+  rotates its id; revoke_user() deletes every session of a user (the app's
+  /signout/all route).
+- A session revoked meanwhile is never written back, since existing
+  sessions are only ever UPDATEd.
+"""
+import hashlib
+import secrets
+import sqlite3
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# How often (at most) one process sweeps expired sessions
+SWEEP_INTERVAL = 600
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.rotate = False
+
+    def clear(self):
+        # A cleared session (sign-in, sign-out) gets a new id when saved
+        super().clear()
+        self.rotate = True
+
+
+def _key(sid):
+    # Only a hash of the id is stored, so the database does not hold live cookies
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class SqliteSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path="sessions.db"):
+        self.path = path
+        self._ready = False
+        self._last_sweep = time.monotonic()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS sessions(
+                key TEXT PRIMARY KEY,
+                user_id TEXT,
+                data TEXT,
+                expires REAL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_user ON sessions(user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions(expires)")
+            self._ready = True
+        return conn
+
+    def _load(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT data, expires FROM sessions WHERE key=?", (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or row[1] < time.time():
+            return None
+        return row
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            found = self._load(_key(sid))
+            if found is not None:
+                session = ServerSession(self.serializer.loads(found[0]), sid=sid)
+                session.expires = found[1]
+                return session
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        self._maybe_sweep(now)
+
+        if session.rotate and not session.new:
+            self._delete(_key(session.sid))
+            session.sid, session.new = secrets.token_urlsafe(32), True
+
+        if not session:
+            if not session.new:
+                self._delete(_key(session.sid))
+            if session.modified or session.rotate:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Extend expiry once less than half of the lifetime is left
+        stale = not session.new and getattr(session, "expires", 0) - now < lifetime / 2
+        if not (session.new or session.modified or stale):
+            return
+
+        key = _key(session.sid)
+        expires = now + lifetime
+        data = self.serializer.dumps(dict(session))
+        user_id = session.get("user_id")
+        user_id = None if user_id is None else str(user_id)
+        conn = self._connect()
+        try:
+            if session.new:
+                conn.execute(
+                    "INSERT INTO sessions(key, user_id, data, expires) VALUES(?,?,?,?)",
+                    (key, user_id, data, expires),
+                )
+                written = True
+            else:
+                # Never resurrect a session that was revoked meanwhile
+                written = conn.execute(
+                    "UPDATE sessions SET user_id=?, data=?, expires=? WHERE key=?",
+                    (user_id, data, expires, key),
+                ).rowcount > 0
+        finally:
+            conn.close()
+        if not written:
+            response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
+
+    def _delete(self, key):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM sessions WHERE key=?", (key,))
+        finally:
+            conn.close()
+
+    def revoke_user(self, user_id):
+        """Delete all sessions of a user; returns how many there were"""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM sessions WHERE user_id=?", (str(user_id),)).rowcount
+        finally:
+            conn.close()
+
+    def sweep(self, now=None):
+        """Delete expired sessions; returns how many"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "DELETE FROM sessions WHERE expires < ?", (time.time() if now is None else now,)
+            ).rowcount
+        finally:
+            conn.close()
+
+    def _maybe_sweep(self, now):
+        if time.monotonic() - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = time.monotonic()
+        self.sweep(now)
@@ -0,0 +1,151 @@
+# startup.py
+"""
+Fast worker startup: lazy imports, lazy clients and an import-time report.
+
+boto3, google-genai, PyPDF2, python-pptx, python-docx, lxml and reportlab together
+take well over a second to import, and building the S3/Gemini clients at
+import time makes the app crash when their settings are missing. The apps
+therefore load these libraries on first use through load(), and build their
+clients on first use through LazyClient. Under gunicorn, gunicorn.conf.py
+calls preload() in the master instead so every forked worker shares the
+already-imported modules copy-on-write and boots in milliseconds.
+
+Every load() records how long the first import took; report() returns those
+timings together with the app's own module load time, and
+
+    python startup.py [module]
+
+measures a cold import of the app in a fresh interpreter (python -X importtime).
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Libraries the apps only need once a request actually uses them
+HEAVY_MODULES = [
+    "boto3",
+    "google.genai",
+    "PyPDF2",
+    "pptx",
+    "docx",
+    "lxml.etree",
+    "reportlab.platypus",
+    "numpy",
+    "markdown_pdf",
+    "flashcards_pptx",
+]
+
+PROCESS_STARTED = time.time()
+_import_times = {}
+_ready_times = {}
+_lock = threading.Lock()
+
+
+def load(name):
+    """Import a module on first use, recording how long the import took"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _import_times.setdefault(name, round((time.perf_counter() - started) * 1000, 1))
+    return module
+
+
+def preload(modules=None):
+    """Import the heavy libraries up front (e.g. in the gunicorn master before forking)"""
+    for name in modules or HEAVY_MODULES:
+        load(name)
+
+
+def mark_ready(name, started):
+    """Record that module `name` finished loading; `started` is a perf_counter() taken at its top"""
+    with _lock:
+        _ready_times[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def report():
+    """Module load and first-use import timings for this process, in milliseconds"""
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - PROCESS_STARTED, 1),
+            "ready_ms": dict(_ready_times),
+            "imports_ms": dict(_import_times),
+        }
+
+
+class LazyClient:
+    """
+    Builds a client on first call and reuses it. Creation is serialised (boto3's
+    default session is not thread-safe) and forgotten in forked children, since
+    neither boto3 nor httpx clients survive a fork.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def __call__(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def reset(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+
+def require_env(name):
+    """Read a required setting when it is first needed rather than at import"""
+    value = os.environ.get(name)
+    if not value:
+        raise RuntimeError(f"{name} is not set")
+    return value
+
+
+def cold_import(module="app", top=15):
+    """Import `module` in a fresh interpreter and return (total_ms, [(ms, name), ...])"""
+    env = dict(os.environ)
+    env.setdefault("S3_BUCKET", "startup-report")
+    env.setdefault("GEMINI_API_KEY", "startup-report")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    # Keep the module itself and its direct imports (-X importtime indents two spaces per level)
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative.strip().isdigit() and depth <= 1:
+            timings.append((int(cumulative) / 1000, name.strip()))
+    timings.sort(reverse=True)
+    return wall_ms, timings[:top]
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "app"
+    wall_ms, timings = cold_import(target)
+    print(f"cold start: python -c 'import {target}' took {wall_ms:.0f} ms")
+    print("slowest top-level imports (cumulative):")
+    for ms, name in timings:
+        print(f"  {ms:8.1f} ms  {name}")
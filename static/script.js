@@ -31,6 +31,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initFormSubmission();
     initFlashMessages();
     initDownloadButtons();
+    initProcessingPoll();
 });
 
 // ==================== Sidebar Functionality ====================
@@ -303,7 +304,65 @@ function initFormSubmission() {
                 </span>
             `;
         }
+
+        // Send the file straight to storage when the server offers it,
+        // falling back to a regular form upload if anything goes wrong
+        if (uploadForm.dataset.presignUrl) {
+            e.preventDefault();
+            directUpload(uploadForm, fileInput.files[0])
+                .then(() => window.location.reload())
+                .catch(() => uploadForm.submit());
+        }
+    });
+}
+
+// ==================== Direct Uploads ====================
+async function directUpload(form, file) {
+    const kind = document.getElementById('toolKind').value;
+    const presign = await fetch(form.dataset.presignUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            filename: file.name,
+            kind: kind,
+            content_type: file.type || 'application/octet-stream'
+        })
+    });
+    if (!presign.ok) throw new Error('presign failed');
+    const { url, fields, token } = await presign.json();
+
+    const body = new FormData();
+    Object.entries(fields).forEach(([name, value]) => body.append(name, value));
+    body.append('file', file);
+    const upload = await fetch(url, { method: 'POST', body: body });
+    if (!upload.ok) throw new Error('upload failed');
+
+    const complete = await fetch(form.dataset.completeUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ token: token })
     });
+    if (!complete.ok) throw new Error('completion failed');
+}
+
+function initProcessingPoll() {
+    const notice = document.getElementById('processingNotice');
+    if (!notice) return;
+
+    const count = parseInt(notice.dataset.count, 10);
+    const timer = setInterval(async () => {
+        try {
+            const resp = await fetch(notice.dataset.statusUrl);
+            const data = await resp.json();
+            // Reload to show the new output once something has finished
+            if (data.uploads.length < count) {
+                clearInterval(timer);
+                window.location.reload();
+            }
+        } catch (err) {
+            clearInterval(timer);
+        }
+    }, 3000);
 }
 
 // ==================== Flash Messages ====================
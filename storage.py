@@ -0,0 +1,370 @@
+# storage.py
+"""
+Object storage for uploads and generated artifacts.
+
+The apps used to call the S3 client directly, so every deployment (and every
+test) needed a bucket. They now go through a Storage backend:
+
+- LocalStorage: files under a directory (single-node deployments, tests)
+- S3Storage: the S3 bucket, as before
+- TieredStorage: writes go through to S3 and are kept on local disk, reads
+  are served from local disk and fall back to S3 (filling the local copy);
+  local copies are never evicted, so size the disk for the working set
+
+All backends offer whole-object and streaming reads/writes, ranged reads,
+copy/delete and batch deletes. Keys are "/"-separated paths such as
+inputs/<user>/<file>, where <file> is the client's file name cut down by
+safe_filename(). make_storage() picks the backend from STORAGE_BACKEND.
+
+Text artifacts (quiz and mind map JSON, flashcard text) are written with
+put_artifact(), which gzips them and records that in the object metadata;
+get_artifact() hands the compressed bytes to clients that accept gzip and
+decompresses for everyone else. Objects without the marker (PDFs, uploads,
+artifacts stored before compression) are returned as they are.
+"""
+import abc
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+# S3 DeleteObjects accepts at most this many keys per call
+S3_DELETE_BATCH = 1000
+# Artifacts of these types are stored gzip-compressed
+COMPRESSIBLE_TYPES = {"application/json", "text/plain", "text/markdown"}
+GZIP_LEVEL = 6
+
+
+class ObjectInfo:
+    def __init__(self, size, content_type=None, metadata=None):
+        self.size = size
+        self.content_type = content_type or "application/octet-stream"
+        self.metadata = metadata or {}
+
+
+def safe_filename(filename):
+    """Last path component of a client-supplied file name, for use in a key ("" if there is none)"""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    return "" if name in (".", "..") else name
+
+
+class Storage(abc.ABC):
+    """Interface shared by the backends; delete_many defaults to one call per key"""
+
+    @abc.abstractmethod
+    def put(self, key, data, content_type=None, metadata=None):
+        pass
+
+    @abc.abstractmethod
+    def put_stream(self, key, fileobj, content_type=None, metadata=None):
+        pass
+
+    @abc.abstractmethod
+    def get(self, key):
+        pass
+
+    @abc.abstractmethod
+    def open(self, key):
+        """(readable stream, ObjectInfo); the caller closes the stream"""
+
+    @abc.abstractmethod
+    def get_range(self, key, start, end):
+        """Bytes start..end of an object (inclusive, like an HTTP Range)"""
+
+    @abc.abstractmethod
+    def head(self, key):
+        """ObjectInfo, or None if there is no such object"""
+
+    @abc.abstractmethod
+    def copy(self, src_key, dst_key):
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key):
+        pass
+
+    # Whether presigned_post() works, i.e. browsers can upload straight to the backend
+    supports_presigned_post = False
+
+    def presigned_post(self, key, content_type, max_bytes, expires):
+        """{"url", "fields"} for a browser form upload straight to key (S3 only)"""
+        raise NotImplementedError("direct uploads need the S3 backend")
+
+    def invalidate(self, key):
+        """Forget cached copies of key after it was written behind the backend's back"""
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.delete(key)
+
+
+class LocalStorage(Storage):
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep) or path.endswith(".meta"):
+            raise ValueError(f"Invalid storage key: {key!r}")
+        return path
+
+    def _write_meta(self, path, content_type, metadata):
+        with open(path + ".meta", "w") as f:
+            json.dump({"content_type": content_type, "metadata": metadata or {}}, f)
+
+    def put_stream(self, key, fileobj, content_type=None, metadata=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial object
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(fileobj, out, 1024 * 1024)
+            self._write_meta(path, content_type, metadata)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def put(self, key, data, content_type=None, metadata=None):
+        self.put_stream(key, io.BytesIO(data), content_type, metadata)
+
+    def head(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(path + ".meta") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            meta = {}
+        return ObjectInfo(size, meta.get("content_type"), meta.get("metadata"))
+
+    def open(self, key):
+        info = self.head(key)
+        if info is None:
+            raise KeyError(key)
+        return open(self._path(key), "rb"), info
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def get_range(self, key, start, end):
+        try:
+            with open(self._path(key), "rb") as f:
+                f.seek(start)
+                return f.read(end - start + 1)
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def copy(self, src_key, dst_key):
+        stream, info = self.open(src_key)
+        with stream:
+            self.put_stream(dst_key, stream, info.content_type, info.metadata)
+
+    def delete(self, key):
+        path = self._path(key)
+        for p in (path, path + ".meta"):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+class S3Storage(Storage):
+    def __init__(self, get_client, bucket):
+        # get_client: callable returning the (lazily built) boto3 client
+        self.get_client = get_client
+        self.bucket = bucket
+
+    def _missing(self, e):
+        code = getattr(e, "response", {}).get("Error", {}).get("Code")
+        return code in ("NoSuchKey", "404", "NotFound")
+
+    def put(self, key, data, content_type=None, metadata=None):
+        extra = {"Metadata": metadata} if metadata else {}
+        self.get_client().put_object(
+            Bucket=self.bucket, Key=key, Body=data,
+            ContentType=content_type or "application/octet-stream", **extra,
+        )
+
+    def put_stream(self, key, fileobj, content_type=None, metadata=None):
+        extra = {"ContentType": content_type or "application/octet-stream"}
+        if metadata:
+            extra["Metadata"] = metadata
+        # upload_fileobj switches to a multipart upload for large files
+        self.get_client().upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra)
+
+    def _get_object(self, key, **kwargs):
+        try:
+            return self.get_client().get_object(Bucket=self.bucket, Key=key, **kwargs)
+        except Exception as e:
+            if self._missing(e):
+                raise KeyError(key)
+            raise
+
+    def open(self, key):
+        obj = self._get_object(key)
+        return obj["Body"], ObjectInfo(obj.get("ContentLength"), obj.get("ContentType"), obj.get("Metadata"))
+
+    def get(self, key):
+        return self._get_object(key)["Body"].read()
+
+    def get_range(self, key, start, end):
+        return self._get_object(key, Range=f"bytes={start}-{end}")["Body"].read()
+
+    def head(self, key):
+        try:
+            obj = self.get_client().head_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._missing(e):
+                return None
+            raise
+        return ObjectInfo(obj.get("ContentLength"), obj.get("ContentType"), obj.get("Metadata"))
+
+    def copy(self, src_key, dst_key):
+        self.get_client().copy_object(
+            Bucket=self.bucket, Key=dst_key, CopySource={"Bucket": self.bucket, "Key": src_key},
+        )
+
+    def delete(self, key):
+        self.get_client().delete_object(Bucket=self.bucket, Key=key)
+
+    supports_presigned_post = True
+
+    def presigned_post(self, key, content_type, max_bytes, expires):
+        return self.get_client().generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+            ExpiresIn=expires,
+        )
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            batch = keys[start:start + S3_DELETE_BATCH]
+            self.get_client().delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+
+
+class TieredStorage(Storage):
+    """Write-through to `remote`, reads served from `local` when it has the object"""
+
+    def __init__(self, local, remote):
+        self.local = local
+        self.remote = remote
+
+    def put(self, key, data, content_type=None, metadata=None):
+        self.remote.put(key, data, content_type, metadata)
+        self.local.put(key, data, content_type, metadata)
+
+    def put_stream(self, key, fileobj, content_type=None, metadata=None):
+        # Spool locally first, then upload the local copy
+        self.local.put_stream(key, fileobj, content_type, metadata)
+        stream, _ = self.local.open(key)
+        with stream:
+            self.remote.put_stream(key, stream, content_type, metadata)
+
+    def _fill(self, key):
+        stream, info = self.remote.open(key)
+        with stream:
+            self.local.put_stream(key, stream, info.content_type, info.metadata)
+
+    def open(self, key):
+        if self.local.head(key) is None:
+            self._fill(key)
+        return self.local.open(key)
+
+    def get(self, key):
+        try:
+            return self.local.get(key)
+        except KeyError:
+            self._fill(key)
+            return self.local.get(key)
+
+    def get_range(self, key, start, end):
+        # Ranged reads of objects not cached yet go to S3 without filling the cache
+        if self.local.head(key) is not None:
+            return self.local.get_range(key, start, end)
+        return self.remote.get_range(key, start, end)
+
+    def head(self, key):
+        return self.local.head(key) or self.remote.head(key)
+
+    def copy(self, src_key, dst_key):
+        self.remote.copy(src_key, dst_key)
+        if self.local.head(src_key) is not None:
+            self.local.copy(src_key, dst_key)
+
+    def delete(self, key):
+        self.remote.delete(key)
+        self.local.delete(key)
+
+    @property
+    def supports_presigned_post(self):
+        return self.remote.supports_presigned_post
+
+    def presigned_post(self, key, content_type, max_bytes, expires):
+        return self.remote.presigned_post(key, content_type, max_bytes, expires)
+
+    def invalidate(self, key):
+        self.local.delete(key)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self.remote.delete_many(keys)
+        self.local.delete_many(keys)
+
+
+def put_artifact(storage, key, data, content_type):
+    """Store a generated artifact, gzip-compressed if it is text"""
+    if content_type in COMPRESSIBLE_TYPES:
+        storage.put(key, gzip.compress(data, GZIP_LEVEL, mtime=0), content_type, {"encoding": "gzip"})
+    else:
+        storage.put(key, data, content_type)
+
+
+def get_artifact(storage, key, accept_gzip=False):
+    """
+    (data, encoding) of an artifact: the stored gzip bytes with encoding "gzip"
+    if accept_gzip, otherwise the plain bytes with encoding None.
+    """
+    stream, info = storage.open(key)
+    try:
+        data = stream.read()
+    finally:
+        stream.close()
+    if info.metadata.get("encoding") != "gzip":
+        return data, None
+    if accept_gzip:
+        return data, "gzip"
+    return gzip.decompress(data), None
+
+
+def read_artifact(storage, key):
+    """Plain bytes of an artifact"""
+    return get_artifact(storage, key)[0]
+
+
+def make_storage(backend, get_s3_client=None, bucket=None, local_dir="storage"):
+    """Storage for STORAGE_BACKEND: "s3" (default), "local" or "tiered"""
+    if backend == "local":
+        return LocalStorage(local_dir)
+    remote = S3Storage(get_s3_client, bucket)
+    if backend == "tiered":
+        return TieredStorage(LocalStorage(local_dir), remote)
+    if backend != "s3":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}")
+    return remote
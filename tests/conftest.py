@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py on local storage, with its databases in a scratch directory"""
+    workdir = str(tmp_path_factory.mktemp("studymate"))
+    # Session-scoped, so the function-scoped monkeypatch fixture cannot be used here;
+    # the working directory and environment are restored after the last test
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(workdir)
+        for name, value in dict(
+            STORAGE_BACKEND="local",
+            STORAGE_DIR=os.path.join(workdir, "storage"),
+            ADMISSION_DB=os.path.join(workdir, "admission.db"),
+            GEMINI_API_KEY="test",
+            ADMISSION_USER_BURST="1000",
+            ADMISSION_USER_RATE="100000",
+        ).items():
+            mp.setenv(name, value)
+        import app
+
+        yield app
+
+
+@pytest.fixture
+def studymate(app_module, tmp_path, monkeypatch):
+    """app.py with a fresh studymate.db and Gemini answering from the prompt"""
+    monkeypatch.chdir(tmp_path)
+
+    async def generate(model, contents, **kwargs):
+        return f"FRONT: {app_module.blob_hash(contents.encode())[:12]}\nBACK: answer"
+
+    monkeypatch.setattr(app_module.gemini_async, "generate", generate)
+    return app_module
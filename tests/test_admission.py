@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import BULK, INTERACTIVE, AdmissionController
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return AdmissionController(
+        path=str(tmp_path / "admission.db"), global_inflight=1, user_inflight=2,
+        user_rate=60, user_burst=3, max_wait=0.5, poll=0.01, max_poll=0.05,
+    )
+
+
+def attempt(controller, slot, user_id, priority=INTERACTIVE, waiting=False):
+    return controller._attempt(slot, user_id, priority, waiting)
+
+
+def test_token_bucket(tmp_path):
+    controller = AdmissionController(path=str(tmp_path / "admission.db"), user_inflight=10, user_rate=60, user_burst=2)
+    for _ in range(2):
+        controller.release(controller.acquire("u1"))
+
+    rejected = controller.acquire("u1")
+    assert not rejected.granted
+    assert rejected.reason == "upload rate limit"
+    assert rejected.retry_after >= 1
+    # Other users have their own bucket
+    assert controller.acquire("u2").granted
+
+    time.sleep(1.1)  # 60/min refills one token a second
+    assert controller.acquire("u1").granted
+
+
+def test_per_user_cap(tmp_path):
+    controller = AdmissionController(path=str(tmp_path / "admission.db"), user_inflight=2)
+    first, second = controller.acquire("u1"), controller.acquire("u1")
+    assert first.granted and second.granted
+
+    rejected = controller.acquire("u1")
+    assert not rejected.granted
+    assert rejected.reason == "too many uploads in progress"
+    assert controller.acquire("u2").granted
+
+    controller.release(first)
+    assert controller.acquire("u1").granted
+
+
+def test_waiting_requests_count_against_the_user_cap(controller):
+    held = controller.acquire("u1")
+    assert attempt(controller, "w1", "u2") is None  # queued behind the global cap
+    assert attempt(controller, "w2", "u2") is None
+
+    assert attempt(controller, "w3", "u2").reason == "too many uploads in progress"
+    controller.release(held)
+
+
+def test_interactive_requests_go_before_bulk(controller):
+    held = controller.acquire("u1")
+    assert attempt(controller, "bulk", "u2", BULK) is None
+    assert attempt(controller, "interactive", "u3", INTERACTIVE) is None
+    controller.release(held)
+
+    # The bulk request arrived first but waits while an interactive one is queued
+    assert attempt(controller, "bulk", "u2", BULK, waiting=True) is None
+    assert attempt(controller, "interactive", "u3", INTERACTIVE, waiting=True).granted
+    assert controller.snapshot()["inflight"] == {"interactive": 1, "bulk": 0}
+
+
+def test_same_priority_is_first_come_first_served(controller):
+    held = controller.acquire("u1")
+    assert attempt(controller, "early", "u2") is None
+    time.sleep(0.01)
+    assert attempt(controller, "late", "u3") is None
+    controller.release(held)
+
+    assert attempt(controller, "late", "u3", waiting=True) is None
+    assert attempt(controller, "early", "u2", waiting=True).granted
+
+
+def test_waiters_give_up_after_max_wait(controller):
+    held = controller.acquire("u1")
+    started = time.monotonic()
+    rejected = asyncio.run(controller.acquire_async("u2"))
+
+    assert not rejected.granted
+    assert rejected.reason == "server busy"
+    assert 0.5 <= time.monotonic() - started < 5
+    # Gave up: no longer queued
+    assert controller.snapshot()["waiting"] == {"interactive": 0, "bulk": 0}
+    controller.release(held)
+
+
+def test_waiter_is_admitted_when_a_slot_frees(controller):
+    held = controller.acquire("u1")
+
+    async def main():
+        waiting = asyncio.ensure_future(controller.acquire_async("u2"))
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(controller.release, held)
+        return await waiting
+
+    assert asyncio.run(main()).granted
+
+
+def test_expired_leases_free_their_slot(tmp_path):
+    controller = AdmissionController(path=str(tmp_path / "admission.db"), global_inflight=1, lease=0.1, max_wait=0)
+    assert controller.acquire("u1").granted
+    assert not controller.acquire("u2").granted
+
+    time.sleep(0.2)
+    assert controller.acquire("u2").granted
+
+
+def test_bulk_runs_skip_the_user_quotas(tmp_path):
+    controller = AdmissionController(path=str(tmp_path / "admission.db"), user_inflight=1, user_burst=1)
+    assert controller.acquire("batch").granted
+    assert controller.acquire("batch", BULK, user_quotas=False).granted
@@ -0,0 +1,41 @@
+from blob_store import blob_hash, blob_key
+
+DATA = b"the same lecture, uploaded twice"
+
+
+def test_failed_upload_keeps_a_blob_another_upload_is_storing(studymate):
+    blobs = studymate.blobs
+    digest = blob_hash(DATA)
+    blobs.store(digest, DATA)  # upload A, still generating
+    blobs.store(digest, DATA)  # upload B of the same bytes, which then fails
+    blobs.discard(digest)
+
+    assert studymate.storage.head(blob_key(digest)) is not None
+    blobs.link_job(1, digest)  # A records its job
+    assert blobs.job_blob(1) == digest
+    refs, pending = studymate.get_db().execute(
+        "SELECT refs, pending FROM input_blobs WHERE sha256=?", (digest,)
+    ).fetchone()
+    assert (refs, pending) == (1, 0)
+
+
+def test_last_failed_upload_drops_the_blob(studymate):
+    blobs = studymate.blobs
+    digest = blob_hash(DATA)
+    blobs.store(digest, DATA)
+    blobs.store(digest, DATA)
+    blobs.discard(digest)
+    blobs.discard(digest)
+
+    assert studymate.storage.head(blob_key(digest)) is None
+
+
+def test_referenced_blob_survives_a_failed_upload(studymate):
+    blobs = studymate.blobs
+    digest = blob_hash(DATA)
+    blobs.store(digest, DATA)
+    blobs.link_job(1, digest)
+    blobs.store(digest, DATA)
+    blobs.discard(digest)
+
+    assert studymate.storage.head(blob_key(digest)) is not None
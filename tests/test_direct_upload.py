@@ -0,0 +1,66 @@
+import pytest
+
+from blob_store import blob_hash, blob_key
+from storage import LocalStorage, TieredStorage
+
+LECTURE = b"Photosynthesis turns light, water and carbon dioxide into glucose and oxygen. " * 40
+
+
+@pytest.fixture
+def direct(studymate, monkeypatch):
+    """Direct uploads on: the "bucket" is local storage, and queued uploads are collected"""
+    monkeypatch.setattr(studymate, "DIRECT_UPLOADS", True)
+    monkeypatch.setattr(
+        studymate.storage, "presigned_post",
+        lambda key, content_type, max_bytes, expires: {"url": "https://bucket.example", "fields": {"key": key}},
+        raising=False,
+    )
+    submitted = []
+    submit = studymate.background_loop.submit
+    monkeypatch.setattr(studymate.background_loop, "submit", lambda coro: submitted.append(submit(coro)))
+    client = studymate.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+    return client, submitted
+
+
+def test_presign_complete_and_process(studymate, direct):
+    client, submitted = direct
+    presigned = client.post("/upload/presign", json={"filename": "lecture.txt", "kind": "flashcards"}).get_json()
+    key = presigned["fields"]["key"]
+    # The browser's POST to the bucket
+    studymate.storage.put(key, LECTURE, "text/plain")
+
+    completed = client.post("/upload/complete", json={"token": presigned["token"]})
+    assert completed.status_code == 202
+    for future in submitted:
+        future.result(timeout=30)
+
+    db = studymate.get_db()
+    status, job_id = db.execute(
+        "SELECT status, job_id FROM direct_uploads WHERE id=?", (completed.get_json()["id"],)
+    ).fetchone()
+    assert status == "done"
+    assert db.execute("SELECT s3_input_key FROM jobs WHERE id=?", (job_id,)).fetchone() == ("inputs/1/lecture.txt",)
+    assert studymate.blobs.job_blob(job_id) == blob_hash(LECTURE)
+    # The staged object moved into the content-addressed store
+    assert studymate.storage.head(key) is None
+    assert studymate.storage.head(blob_key(blob_hash(LECTURE))) is not None
+
+    # Completing again reports the same upload instead of queueing another
+    again = client.post("/upload/complete", json={"token": presigned["token"]})
+    assert again.status_code == 200
+    assert again.get_json()["job_id"] == job_id
+
+
+def test_complete_without_the_file(studymate, direct):
+    client, submitted = direct
+    presigned = client.post("/upload/presign", json={"filename": "lecture.txt", "kind": "flashcards"}).get_json()
+
+    assert client.post("/upload/complete", json={"token": presigned["token"]}).status_code == 409
+    assert submitted == []
+
+
+def test_presigned_post_support(tmp_path):
+    assert not LocalStorage(tmp_path).supports_presigned_post
+    assert not TieredStorage(LocalStorage(tmp_path / "a"), LocalStorage(tmp_path / "b")).supports_presigned_post
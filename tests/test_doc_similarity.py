@@ -0,0 +1,93 @@
+import random
+import sqlite3
+
+import pytest
+
+from doc_similarity import (
+    BLOCK, NUM_PERM, add_signature, find_similar, get_signature, minhash, similarity,
+)
+
+random.seed(5)
+WORDS = [f"term{i}" for i in range(2000)]
+LECTURE = " ".join(random.choice(WORDS) for _ in range(3000))
+
+
+def edit(text, fraction):
+    """The text with a run of a fraction of its words replaced, like one slide changed"""
+    words = text.split()
+    n = int(len(words) * fraction)
+    start = random.randrange(len(words) - n)
+    words[start:start + n] = [f"changed{i}" for i in range(n)]
+    return " ".join(words)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "studymate.db"))
+    conn.execute("CREATE TABLE jobs(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, kind TEXT)")
+    conn.execute("CREATE TABLE doc_signatures(job_id INTEGER PRIMARY KEY, signature BLOB)")
+    conn.execute("CREATE TABLE doc_lsh(band INTEGER, bucket INTEGER, job_id INTEGER)")
+    return conn
+
+
+def add_job(conn, text, user_id=1, kind="notes"):
+    job_id = conn.execute("INSERT INTO jobs(user_id, kind) VALUES(?,?)", (user_id, kind)).lastrowid
+    add_signature(conn, job_id, minhash(text))
+    return job_id
+
+
+def test_signature_ignores_case_and_punctuation():
+    signature = minhash(LECTURE)
+
+    assert len(signature) == NUM_PERM
+    assert similarity(signature, minhash(LECTURE.upper().replace(" ", ", "))) == 1.0
+    assert minhash("too short to shingle") is None
+
+
+def test_similarity_tracks_the_share_of_edited_text():
+    signature = minhash(LECTURE)
+
+    assert similarity(signature, minhash(edit(LECTURE, 0.02))) > 0.8
+    assert similarity(signature, minhash(edit(LECTURE, 0.5))) < 0.5
+    assert similarity(signature, minhash(" ".join(random.choice(WORDS) for _ in range(3000)))) < 0.1
+
+
+def test_signature_does_not_depend_on_block_size():
+    # More shingles than one block, so the running minimum spans blocks
+    text = " ".join(random.choice(WORDS) for _ in range(BLOCK * 2))
+    signature = minhash(text)
+
+    assert similarity(signature, minhash(text)) == 1.0
+    assert similarity(signature, minhash(text + " term1 term2 term3 term4 term5")) > 0.95
+
+
+def test_find_similar_returns_the_best_match(conn):
+    add_job(conn, edit(LECTURE, 0.05))
+    closest = add_job(conn, edit(LECTURE, 0.01))
+    add_job(conn, " ".join(random.choice(WORDS) for _ in range(3000)))
+
+    job_id, score = find_similar(conn, minhash(LECTURE), "notes")
+    assert job_id == closest
+    assert score > 0.9
+    assert find_similar(conn, minhash(edit(LECTURE, 0.5)), "notes") is None
+
+
+def test_find_similar_is_scoped_to_kind_and_user(conn):
+    job_id = add_job(conn, LECTURE, user_id=1, kind="notes")
+    signature = minhash(LECTURE)
+
+    assert find_similar(conn, signature, "mcq") is None
+    assert find_similar(conn, signature, "notes", user_id=2) is None
+    assert find_similar(conn, signature, "notes", user_id=1)[0] == job_id
+    assert find_similar(conn, signature, "notes")[0] == job_id
+
+
+def test_add_signature_replaces_the_previous_one(conn):
+    job_id = add_job(conn, LECTURE)
+    other = " ".join(random.choice(WORDS) for _ in range(3000))
+    add_signature(conn, job_id, minhash(other))
+
+    assert similarity(get_signature(conn, job_id), minhash(other)) == 1.0
+    assert conn.execute("SELECT COUNT(*) FROM doc_lsh WHERE job_id=?", (job_id,)).fetchone()[0] == 16
+    assert find_similar(conn, minhash(LECTURE), "notes") is None
+    assert get_signature(conn, job_id + 1) is None
@@ -0,0 +1,140 @@
+import io
+import time
+
+import docx
+import pytest
+
+from extractors import (
+    BINARY, DOC, DOCX, OLE_MAGIC, PDF, TEXT, ExtractorRegistry, default_registry, sniff,
+)
+
+
+def docx_bytes(text):
+    document = docx.Document()
+    document.add_paragraph(text)
+    stream = io.BytesIO()
+    document.save(stream)
+    return stream.getvalue()
+
+
+def backend(text, seconds=0.0, calls=None):
+    def extract(file_stream):
+        if calls is not None:
+            calls.append(text)
+        time.sleep(seconds)
+        return text
+    return extract
+
+
+def failing(file_stream):
+    raise ValueError("corrupt")
+
+
+class Aborted(Exception):
+    pass
+
+
+def aborting(file_stream):
+    raise Aborted()
+
+
+def test_sniff_uses_the_bytes_not_the_name():
+    assert sniff(b"%PDF-1.7\n...", "notes.txt") == PDF
+    assert sniff(docx_bytes("hello"), "slides.pdf") == DOCX
+    assert sniff(b"PK\x03\x04 not really a zip") == BINARY
+    assert sniff(OLE_MAGIC + b"\x00" * 64, "old.DOC") == DOC
+    assert sniff(b"\x89PNG\r\n\x1a\n\x00\x00") == BINARY
+    assert sniff("Überblick".encode()) == TEXT
+
+
+def test_calibration_picks_the_fastest_good_backend():
+    registry = ExtractorRegistry(calibration_docs=2)
+    registry.register(TEXT, "slow", backend("full text here", seconds=0.05))
+    registry.register(TEXT, "fast", backend("full text here"))
+    registry.register(TEXT, "lossy", backend("full"))
+
+    for _ in range(2):
+        assert registry.extract(b"doc") == ("full text here", "slow", TEXT)
+    assert registry.backends(TEXT) == ["fast", "slow", "lossy"]
+    assert registry.extract(b"doc") == ("full text here", "fast", TEXT)
+    assert registry.ranking()[TEXT]["documents"] == 2
+
+
+def test_calibrated_registry_runs_only_the_chosen_backend():
+    calls = []
+    registry = ExtractorRegistry(calibration_docs=1)
+    registry.register(TEXT, "a", backend("text", calls=calls))
+    registry.register(TEXT, "b", backend("text", seconds=0.05, calls=calls))
+    registry.calibrate(TEXT, [b"sample"])
+
+    calls.clear()
+    registry.extract(b"doc")
+    assert len(calls) == 1
+
+
+def test_documents_without_text_do_not_count_towards_calibration():
+    registry = ExtractorRegistry(calibration_docs=1)
+    registry.register(PDF, "a", backend(""))
+    registry.register(PDF, "b", backend("   "))
+
+    assert registry.extract(b"%PDF-1.4 scanned") == ("", None, PDF)
+    assert registry.ranking()[PDF]["documents"] == 0
+
+
+def test_failing_backend_falls_back():
+    logged = []
+    registry = ExtractorRegistry(calibration_docs=0)
+    registry.register(TEXT, "broken", failing)
+    registry.register(TEXT, "empty", backend(""))
+    registry.register(TEXT, "works", backend("text"))
+
+    text, name, _ = registry.extract(b"doc", "notes.txt", log=lambda message, e: logged.append(message))
+    assert (text, name) == ("text", "works")
+    assert logged == ["broken could not extract notes.txt"]
+
+
+def test_fallback_only_backends_are_tried_last_and_never_benchmarked():
+    calls = []
+    registry = ExtractorRegistry(calibration_docs=5)
+    registry.register(TEXT, "lossy", backend("l", calls=calls), fallback_only=True)
+    registry.register(TEXT, "a", backend("text", calls=calls))
+    registry.register(TEXT, "b", backend("text", calls=calls))
+
+    registry.extract(b"doc")
+    assert "l" not in calls
+    assert registry.backends(TEXT)[-1] == "lossy"
+
+
+def test_abort_on_errors_are_not_retried_by_other_backends():
+    calls = []
+    registry = ExtractorRegistry(calibration_docs=0, abort_on=(Aborted,))
+    registry.register(TEXT, "killed", aborting)
+    registry.register(TEXT, "other", backend("text", calls=calls))
+
+    with pytest.raises(Aborted):
+        registry.extract(b"doc")
+    assert calls == []
+
+
+def test_backends_go_through_run():
+    ran = []
+
+    def run(fn, *args):
+        ran.append(fn.__name__)
+        return fn(*args)
+
+    registry = ExtractorRegistry(calibration_docs=0, run=run)
+    registry.register(TEXT, "a", backend("text"))
+
+    assert registry.extract(b"doc")[0] == "text"
+    assert ran == ["run_backend"]
+
+
+def test_default_registry_extracts_real_documents():
+    registry = default_registry()
+
+    text, name, content_type = registry.extract(docx_bytes("Photosynthesis converts light energy."), "lecture.docx")
+    assert text == "Photosynthesis converts light energy."
+    assert content_type == DOCX and name in ("streaming", "python-docx")
+    assert registry.extract("café".encode("cp1252"))[:2] == ("café", "cp1252")
+    assert registry.extract("café".encode())[:2] == ("café", "utf-8")
@@ -0,0 +1,137 @@
+import asyncio
+import io
+import sqlite3
+import time
+
+import pytest
+
+from idempotency import IdempotencyStore, idempotency_key
+
+
+@pytest.fixture
+def connect(tmp_path):
+    path = str(tmp_path / "studymate.db")
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE IF NOT EXISTS upload_requests(
+            key TEXT PRIMARY KEY,
+            user_id INTEGER,
+            status TEXT,
+            job_id INTEGER,
+            message TEXT,
+            updated REAL
+        )""")
+        return conn
+    return connect
+
+
+def acquire(store, key="k", user_id=1):
+    return asyncio.run(store.acquire(key, user_id))
+
+
+def test_key_depends_on_user_kind_and_content():
+    key = idempotency_key(1, "notes", "abc")
+    assert key == idempotency_key(1, "notes", "abc")
+    assert len({key, idempotency_key(2, "notes", "abc"), idempotency_key(1, "mcq", "abc"),
+                idempotency_key(1, "notes", "abd")}) == 4
+
+
+def test_duplicate_waits_for_the_owner(connect):
+    store = IdempotencyStore(connect, poll=0.01)
+    assert acquire(store) is None
+
+    async def main():
+        duplicate = asyncio.ensure_future(store.acquire("k", 1))
+        await asyncio.sleep(0.1)
+        assert not duplicate.done()
+        await asyncio.to_thread(store.finish, "k", 42, "Notes ready to download.")
+        return await duplicate
+
+    assert asyncio.run(main()) == ("done", 42, "Notes ready to download.")
+
+
+def test_finished_outcome_is_replayed(connect):
+    store = IdempotencyStore(connect)
+    assert acquire(store) is None
+    store.finish("k", 42, "ready")
+
+    assert acquire(store) == ("done", 42, "ready")
+    assert acquire(store, key="other") is None
+
+
+def test_duplicate_stops_waiting_after_wait(connect):
+    store = IdempotencyStore(connect, wait=0.2, poll=0.01)
+    assert acquire(store) is None
+
+    started = time.monotonic()
+    assert acquire(store) == ("running", None, None)
+    assert time.monotonic() - started < 2
+
+
+def test_failed_upload_is_taken_over_by_a_fresh_submission(connect):
+    store = IdempotencyStore(connect, poll=0.01)
+    assert acquire(store) is None
+    store.finish("k", None, "AI generation failed")
+
+    # A retry owns the key again instead of replaying the failure
+    assert acquire(store) is None
+
+
+def test_waiting_duplicate_reports_the_failure(connect):
+    store = IdempotencyStore(connect, poll=0.01)
+    assert acquire(store) is None
+
+    async def main():
+        duplicate = asyncio.ensure_future(store.acquire("k", 1))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(store.finish, "k", None, "AI generation failed")
+        return await duplicate
+
+    assert asyncio.run(main()) == ("failed", None, "AI generation failed")
+
+
+def test_finish_without_outcome_releases_the_key(connect):
+    store = IdempotencyStore(connect)
+    assert acquire(store) is None
+    store.finish("k")
+
+    assert acquire(store) is None
+
+
+def test_lease_expiry_lets_another_request_take_over(connect):
+    store = IdempotencyStore(connect, lease=0.1, wait=0, poll=0.01)
+    assert acquire(store) is None  # its worker then crashes
+    assert acquire(store) == ("running", None, None)
+
+    time.sleep(0.15)
+    assert acquire(store) is None
+
+
+def test_outcomes_expire_after_ttl(connect):
+    store = IdempotencyStore(connect, ttl=0.1)
+    assert acquire(store) is None
+    store.finish("k", 42, "ready")
+
+    time.sleep(0.15)
+    assert acquire(store) is None
+
+
+def test_replayed_upload_takes_no_admission_slot(studymate, monkeypatch):
+    admitted = []
+    acquire_async = studymate.admission.acquire_async
+
+    async def counting(user_id, *args, **kwargs):
+        admitted.append(user_id)
+        return await acquire_async(user_id, *args, **kwargs)
+
+    monkeypatch.setattr(studymate.admission, "acquire_async", counting)
+    client = studymate.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+    lecture = b"Mitochondria produce most of the cell's ATP through oxidative phosphorylation. " * 40
+    for _ in range(2):
+        client.post("/upload", data={"kind": "flashcards", "file": (io.BytesIO(lecture), "cells.txt")})
+
+    assert admitted == [1]
+    assert studymate.get_db().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 1
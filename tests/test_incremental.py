@@ -0,0 +1,110 @@
+import io
+import json
+import random
+import sqlite3
+
+import pytest
+
+from incremental import (
+    CHUNK_MAX_CHARS, chunk_hash, item_counts, load_chunk_outputs, merge_quiz, parse_quiz_chunk,
+    save_chunk_outputs, split_chunks,
+)
+
+random.seed(11)
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def paragraph():
+    return " ".join(random.choice(WORDS) for _ in range(random.randint(40, 120)))
+
+
+PARAGRAPHS = [paragraph() for _ in range(400)]
+DOCUMENT = "\n\n".join(PARAGRAPHS)
+
+
+def test_chunks_cover_the_text_in_order():
+    chunks = split_chunks(DOCUMENT)
+
+    assert len(chunks) > 5
+    assert all(len(chunk) <= CHUNK_MAX_CHARS for chunk in chunks)
+    assert "\n\n".join(chunks).split() == DOCUMENT.split()
+
+
+def test_an_early_edit_only_changes_nearby_chunks():
+    edited = list(PARAGRAPHS)
+    edited[3] = paragraph()
+    before = [chunk_hash(c) for c in split_chunks(DOCUMENT)]
+    after = [chunk_hash(c) for c in split_chunks("\n\n".join(edited))]
+
+    changed = set(after) - set(before)
+    assert 1 <= len(changed) <= 2
+    # Chunks after the edit are found unchanged, not shifted
+    assert after[-(len(after) - 2):] == before[-(len(after) - 2):]
+
+
+def test_text_without_paragraphs_is_still_cut():
+    chunks = split_chunks(" ".join(PARAGRAPHS))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= CHUNK_MAX_CHARS for chunk in chunks)
+
+
+@pytest.mark.parametrize("total", [1, 15, 18])
+def test_item_counts_add_up(total):
+    chunks = ["a" * 100, "b" * 3000, "c" * 900]
+    counts = item_counts(chunks, total)
+
+    assert all(count >= 1 for count in counts)
+    assert sum(counts) == max(total, len(chunks))
+    assert counts[1] == max(counts)
+
+
+def test_quiz_chunks_merge():
+    merged = merge_quiz([
+        '```json\n{"questions": [{"q": 1}]}\n```',
+        '[{"q": 2}, {"q": 3}]',
+    ])
+    assert json.loads(merged) == {"questions": [{"q": 1}, {"q": 2}, {"q": 3}]}
+    with pytest.raises(ValueError):
+        parse_quiz_chunk('{"answers": []}')
+
+
+def test_chunk_outputs_are_replaced(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "studymate.db"))
+    conn.execute("CREATE TABLE chunk_outputs(job_id INTEGER, chunk_hash TEXT, output TEXT, PRIMARY KEY (job_id, chunk_hash))")
+    save_chunk_outputs(conn, 1, {"a": "first", "b": "second"})
+    save_chunk_outputs(conn, 1, {"b": "second", "c": "third"})
+
+    assert load_chunk_outputs(conn, 1) == {"b": "second", "c": "third"}
+    assert load_chunk_outputs(conn, 2) == {}
+
+
+def test_reupload_regenerates_only_changed_chunks(studymate, monkeypatch):
+    prompts = []
+    generate = studymate.gemini_async.generate
+
+    async def counting(model, contents, **kwargs):
+        prompts.append(contents)
+        return await generate(model, contents, **kwargs)
+
+    monkeypatch.setattr(studymate.gemini_async, "generate", counting)
+    client = studymate.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+
+    def upload(text):
+        prompts.clear()
+        client.post("/upload", data={"kind": "flashcards", "file": (io.BytesIO(text.encode()), "lecture.txt")})
+        return len(prompts)
+
+    # Short enough to stay within the prompt window as a whole
+    document = PARAGRAPHS[:30]
+    first = upload("\n\n".join(document))
+    edited = list(document)
+    edited[-1] = paragraph()
+    second = upload("\n\n".join(edited))
+
+    assert first > 1
+    assert 1 <= second < first
+    db = studymate.get_db()
+    assert db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 1
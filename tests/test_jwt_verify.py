@@ -0,0 +1,136 @@
+import json
+import time
+
+import pytest
+import rsa
+
+from jwt_verify import JWKSCache, TokenError, TokenVerifier, b64url_encode, jwk_from_public_key
+
+REGION = "eu-west-1"
+POOL = "eu-west-1_TestPool"
+CLIENT = "test-client"
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{POOL}"
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return rsa.newkeys(1024), rsa.newkeys(1024)
+
+
+def sign(private_key, claims, kid="k1", alg="RS256"):
+    header = b64url_encode(json.dumps({"alg": alg, "kid": kid}).encode())
+    payload = b64url_encode(json.dumps(claims).encode())
+    signature = rsa.sign(f"{header}.{payload}".encode(), private_key, "SHA-256")
+    return f"{header}.{payload}.{b64url_encode(signature)}"
+
+
+def claims(**overrides):
+    now = int(time.time())
+    values = {"sub": "user-1", "iss": ISSUER, "aud": CLIENT, "token_use": "id", "iat": now, "exp": now + 3600}
+    values.update(overrides)
+    return values
+
+
+class StaticJWKS:
+    """fetch() for JWKSCache serving whichever public keys are set, counting fetches"""
+
+    def __init__(self, **public_keys):
+        self.public_keys = public_keys
+        self.fetches = 0
+
+    def __call__(self, url):
+        self.fetches += 1
+        return {"keys": [jwk_from_public_key(key, kid) for kid, key in self.public_keys.items()]}
+
+
+@pytest.fixture
+def jwks(keys):
+    return StaticJWKS(k1=keys[0][0])
+
+
+@pytest.fixture
+def verifier(jwks):
+    return TokenVerifier(REGION, POOL, CLIENT, jwks=JWKSCache(ISSUER + "/.well-known/jwks.json", fetch=jwks))
+
+
+def test_valid_id_token(keys, verifier):
+    assert verifier.verify(sign(keys[0][1], claims()))["sub"] == "user-1"
+
+
+def test_valid_access_token(keys, verifier):
+    token = sign(keys[0][1], claims(token_use="access", aud=None, client_id=CLIENT))
+    assert verifier.verify(token, token_use="access")["sub"] == "user-1"
+
+
+def test_bad_signature(keys, verifier):
+    # Signed by another key under the pool's key id
+    with pytest.raises(TokenError, match="signature"):
+        verifier.verify(sign(keys[1][1], claims()))
+
+
+def test_tampered_payload(keys, verifier):
+    header, _, signature = sign(keys[0][1], claims()).split(".")
+    payload = b64url_encode(json.dumps(claims(sub="admin")).encode())
+    with pytest.raises(TokenError, match="signature"):
+        verifier.verify(f"{header}.{payload}.{signature}")
+
+
+def test_expired(keys, verifier):
+    now = int(time.time())
+    with pytest.raises(TokenError, match="expired"):
+        verifier.verify(sign(keys[0][1], claims(iat=now - 7200, exp=now - 3600)))
+
+
+def test_expiry_leeway(keys, verifier):
+    now = int(time.time())
+    assert verifier.verify(sign(keys[0][1], claims(exp=now - 10)))
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({"iss": "https://cognito-idp.eu-west-1.amazonaws.com/eu-west-1_Other"}, "another user pool"),
+    ({"aud": "other-client"}, "another app client"),
+])
+def test_wrong_issuer_or_audience(keys, verifier, overrides, message):
+    with pytest.raises(TokenError, match=message):
+        verifier.verify(sign(keys[0][1], claims(**overrides)))
+
+
+def test_access_token_for_another_client(keys, verifier):
+    token = sign(keys[0][1], claims(token_use="access", client_id="other-client"))
+    with pytest.raises(TokenError, match="another app client"):
+        verifier.verify(token, token_use="access")
+
+
+def test_wrong_token_use(keys, verifier):
+    with pytest.raises(TokenError, match="id token"):
+        verifier.verify(sign(keys[0][1], claims(token_use="access")))
+
+
+def test_unknown_kid(keys, jwks, verifier):
+    with pytest.raises(TokenError, match="unknown key"):
+        verifier.verify(sign(keys[1][1], claims(), kid="k2"))
+    # A second unknown kid right after does not refetch the JWKS
+    with pytest.raises(TokenError, match="unknown key"):
+        verifier.verify(sign(keys[1][1], claims(), kid="k3"))
+    assert jwks.fetches == 1
+
+
+def test_rotated_key_is_refetched(keys, jwks):
+    verifier = TokenVerifier(
+        REGION, POOL, CLIENT, jwks=JWKSCache(ISSUER + "/.well-known/jwks.json", fetch=jwks, min_refetch=0)
+    )
+    assert verifier.verify(sign(keys[0][1], claims()))
+    jwks.public_keys["k2"] = keys[1][0]
+    assert verifier.verify(sign(keys[1][1], claims(), kid="k2"))
+    assert jwks.fetches == 2
+
+
+@pytest.mark.parametrize("token", ["", "not-a-token", "a.b.c", None])
+def test_malformed(verifier, token):
+    with pytest.raises(TokenError):
+        verifier.verify(token)
+
+
+def test_other_algorithm(keys, verifier):
+    with pytest.raises(TokenError, match="algorithm"):
+        verifier.verify(sign(keys[0][1], claims(), alg="none"))
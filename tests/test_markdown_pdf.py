@@ -0,0 +1,27 @@
+import pytest
+
+from markdown_pdf import inline_markup, render_markdown_pdf
+
+
+@pytest.mark.parametrize("text", [
+    "**a *b** c*",
+    "[a*b](https://example.com/x) c*",
+    "*[a](https://example.com/__init__)* and `x**y`",
+])
+def test_overlapping_emphasis_still_renders(text):
+    assert render_markdown_pdf(f"# Notes\n\n{text}\n\n- {text}", "Notes").startswith(b"%PDF")
+
+
+def test_overlapping_emphasis_is_kept_as_text():
+    assert inline_markup("**a *b** c*") == "**a *b** c*"
+
+
+def test_emphasis():
+    assert inline_markup("**b**, *i*, ***both*** and __Very bold__") == (
+        "<b>b</b>, <i>i</i>, <b><i>both</i></b> and <b>Very bold</b>"
+    )
+
+
+@pytest.mark.parametrize("text", ["use __init__ here", "call obj.__init__() now", "if __name__ == '__main__':"])
+def test_dunder_names_are_not_bold(text):
+    assert "<b>" not in inline_markup(text)
@@ -0,0 +1,39 @@
+import json
+
+from mindmap_export import MindmapExporter
+
+
+def test_new_output_key_renders_again():
+    sources = {"outputs/1/aaa/map.json": {"title": "Cells"}, "outputs/1/bbb/map.json": {"title": "Cells, revised"}}
+    loads = []
+
+    def load(key):
+        def load_source():
+            loads.append(key)
+            return json.dumps(sources[key])
+        return load_source
+
+    exporter = MindmapExporter(run=lambda fn, tree, title: tree["title"].encode())
+    assert exporter.export((7, "outputs/1/aaa/map.json"), "png", load("outputs/1/aaa/map.json")) == b"Cells"
+    assert exporter.export((7, "outputs/1/aaa/map.json"), "png", load("outputs/1/aaa/map.json")) == b"Cells"
+    # The revised job points at a new content-hashed output
+    assert exporter.export((7, "outputs/1/bbb/map.json"), "png", load("outputs/1/bbb/map.json")) == b"Cells, revised"
+    assert loads == ["outputs/1/aaa/map.json", "outputs/1/bbb/map.json"]
+
+
+def test_failed_render_is_retried():
+    attempts = []
+
+    def run(fn, tree, title):
+        attempts.append(title)
+        if len(attempts) == 1:
+            raise RuntimeError("renderer crashed")
+        return b"png"
+
+    exporter = MindmapExporter(run=run)
+    try:
+        exporter.export(7, "png", lambda: "{}")
+    except RuntimeError:
+        pass
+    assert exporter.export(7, "png", lambda: "{}") == b"png"
+    assert len(attempts) == 2
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+from model_router import (
+    HEAVY_MINDMAP_CHARS, SHORT_CHARS, ModelRouter, default_routes, parse_experiment, record_route, route_stats,
+)
+
+
+def router(**kwargs):
+    routes, rules = default_routes("gemini-standard", "gemini-fast", mindmap_model="gemini-big", mindmap_tokens=32768)
+    return ModelRouter(routes, rules, **kwargs)
+
+
+def test_default_rules():
+    r = router()
+
+    assert r.choose("notes", SHORT_CHARS)[0].name == "fast"
+    assert r.choose("notes", SHORT_CHARS + 1)[0].name == "standard"
+    assert r.choose("mindmap", HEAVY_MINDMAP_CHARS - 1)[0].name == "standard"
+    route, arm = r.choose("mindmap", HEAVY_MINDMAP_CHARS)
+    assert (route.name, route.model, arm) == ("mindmap", "gemini-big", None)
+
+
+def test_route_config():
+    r = router()
+    mindmap = r.routes["mindmap"]
+
+    assert mindmap.config("mindmap") == {
+        "max_output_tokens": 32768, "temperature": 0.2, "response_mime_type": "application/json",
+    }
+    assert r.routes["standard"].config("notes") == {"max_output_tokens": 8192}
+
+
+def test_cost_slo_takes_the_cheapest_candidate():
+    assert router(slo="cost").choose("notes", SHORT_CHARS + 1)[0].name == "fast"
+
+
+def test_latency_slo_skips_routes_over_the_target():
+    r = router(slo="latency", latency_slo=10)
+    assert r.choose("notes", 100)[0].name == "fast"  # no samples yet
+
+    for _ in range(10):
+        r.observe(r.routes["fast"], 20)
+    assert r.choose("notes", 100)[0].name == "standard"
+
+    # Both over the target: the faster one
+    for _ in range(10):
+        r.observe(r.routes["standard"], 40)
+    assert r.choose("notes", 100)[0].name == "fast"
+    assert r.snapshot()["routes"]["fast"] == {"model": "gemini-fast", "recent": 10, "p90_s": 20}
+
+
+def test_latency_window_forgets_old_generations():
+    r = router(slo="latency", latency_slo=10, window=5)
+    for seconds in [60] * 5 + [1] * 5:
+        r.observe(r.routes["fast"], seconds)
+
+    assert r.choose("notes", 100)[0].name == "fast"
+
+
+def test_experiment_arms_are_stable_per_subject():
+    r = router(experiment=parse_experiment("standard:fast:0.3"))
+    arms = [r.choose("notes", SHORT_CHARS + 1, subject=f"doc{i}") for i in range(1000)]
+
+    assert all((route.name, arm) in {("standard", "A"), ("fast", "B")} for route, arm in arms)
+    assert 200 < sum(arm == "B" for _, arm in arms) < 400
+    assert [r.choose("notes", SHORT_CHARS + 1, subject=f"doc{i}") for i in range(20)] == arms[:20]
+    # Jobs that would not use route a are left alone
+    assert r.choose("notes", 100, subject="doc1") == (r.routes["fast"], None)
+
+
+def test_invalid_configuration():
+    assert parse_experiment("") is None
+    with pytest.raises(ValueError):
+        router(slo="fastest")
+    with pytest.raises(ValueError):
+        router(experiment=("standard", "premium", 0.1))
+
+
+def test_route_stats_per_route_and_arm(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "studymate.db"))
+    conn.execute(
+        "CREATE TABLE job_routes(job_id INTEGER, kind TEXT, route TEXT, model TEXT, arm TEXT, chars INTEGER, seconds REAL)"
+    )
+    r = router()
+    for i, seconds in enumerate([1, 2, 3, 10]):
+        record_route(conn, i, "notes", r.routes["standard"], "A", 5000, seconds)
+    record_route(conn, 9, "notes", r.routes["fast"], "B", 5000, 0.5)
+    record_route(conn, 10, "mcq", r.routes["fast"], None, 100, 0.25)
+
+    assert route_stats(conn, "notes") == [
+        {"route": "fast", "model": "gemini-fast", "arm": "B", "count": 1, "avg_s": 0.5, "p50_s": 0.5, "p90_s": 0.5},
+        {"route": "standard", "model": "gemini-standard", "arm": "A", "count": 4, "avg_s": 4.0, "p50_s": 2, "p90_s": 3},
+    ]
+    assert len(route_stats(conn)) == 3
@@ -0,0 +1,99 @@
+import io
+import zipfile
+
+import docx
+import pptx
+import pytest
+from pptx.util import Inches
+
+from ooxml_text import docx_text, pptx_text
+from text_normalize import PAGE_BREAK
+
+
+def saved(document):
+    stream = io.BytesIO()
+    document.save(stream)
+    stream.seek(0)
+    return stream
+
+
+def test_docx_paragraphs_and_tables_in_reading_order():
+    document = docx.Document()
+    document.add_heading("Enzymes", level=1)
+    document.add_paragraph("Enzymes lower the activation energy.")
+    table = document.add_table(rows=2, cols=2)
+    for r, row in enumerate([["Enzyme", "Substrate"], ["Amylase", "Starch"]]):
+        for c, text in enumerate(row):
+            table.cell(r, c).text = text
+    document.add_paragraph("Summary")
+
+    assert docx_text(saved(document)) == (
+        "Enzymes\nEnzymes lower the activation energy.\nEnzyme | Substrate\nAmylase | Starch\nSummary"
+    )
+
+
+def test_docx_nested_table_joins_the_enclosing_cell():
+    document = docx.Document()
+    outer = document.add_table(rows=1, cols=2)
+    outer.cell(0, 0).text = "Outer"
+    inner = outer.cell(0, 1).add_table(rows=1, cols=2)
+    inner.cell(0, 0).text = "a"
+    inner.cell(0, 1).text = "b"
+
+    assert docx_text(saved(document)) == "Outer | a | b"
+
+
+def test_docx_breaks_and_tabs():
+    document = docx.Document()
+    run = document.add_paragraph().add_run("Line one")
+    run.add_break()
+    run.add_text("Line two\tindented")
+
+    assert docx_text(saved(document)) == "Line one\nLine two\tindented"
+
+
+def slide(presentation, title, body=None):
+    s = presentation.slides.add_slide(presentation.slide_layouts[1])
+    s.shapes.title.text = title
+    if body is not None:
+        s.placeholders[1].text = body
+    return s
+
+
+def test_pptx_slides_tables_groups_and_notes():
+    presentation = pptx.Presentation()
+    first = slide(presentation, "Cells", "Mitochondria make ATP")
+    first.notes_slide.notes_text_frame.text = "Mention the Krebs cycle"
+    second = presentation.slides.add_slide(presentation.slide_layouts[6])
+    table = second.shapes.add_table(2, 2, Inches(1), Inches(1), Inches(4), Inches(1)).table
+    for r, row in enumerate([["Organelle", "Role"], ["Ribosome", "Protein synthesis"]]):
+        for c, text in enumerate(row):
+            table.cell(r, c).text = text
+    group = second.shapes.add_group_shape()
+    group.shapes.add_textbox(Inches(1), Inches(3), Inches(2), Inches(1)).text_frame.text = "Grouped label"
+
+    slides = pptx_text(saved(presentation)).split(PAGE_BREAK)
+    assert slides == [
+        "Cells\nMitochondria make ATP\nMention the Krebs cycle",
+        "Organelle | Role\nRibosome | Protein synthesis\nGrouped label",
+    ]
+
+
+def test_pptx_follows_presentation_order_and_keeps_empty_slides():
+    presentation = pptx.Presentation()
+    slide(presentation, "First")
+    presentation.slides.add_slide(presentation.slide_layouts[6])
+    slide(presentation, "Third")
+    # Move the last slide to the front
+    ids = presentation.slides._sldIdLst
+    ids.insert(0, ids[-1])
+
+    assert pptx_text(saved(presentation)).split(PAGE_BREAK) == ["Third", "First", ""]
+
+
+def test_not_ooxml_raises():
+    with pytest.raises(zipfile.BadZipFile):
+        docx_text(io.BytesIO(b"plain text"))
+    presentation = saved(pptx.Presentation())
+    with pytest.raises(KeyError):
+        docx_text(presentation)
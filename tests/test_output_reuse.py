@@ -0,0 +1,61 @@
+import io
+import random
+
+import pytest
+
+from storage import read_artifact
+
+random.seed(7)
+WORDS = [f"term{i}" for i in range(2000)]
+LECTURE = " ".join(random.choice(WORDS) for _ in range(3000))
+# The lecture with every 60th word changed: a near-duplicate, not the same file
+EDITED = " ".join("edited" if i % 60 == 0 else w for i, w in enumerate(LECTURE.split()))
+UNRELATED = " ".join(random.choice(WORDS) for _ in range(3000))
+
+
+def upload(client, user_id, text, filename):
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+    client.post("/upload", data={"kind": "flashcards", "file": (io.BytesIO(text.encode()), filename)})
+
+
+def output_of(studymate, user_id):
+    db = studymate.get_db()
+    key = db.execute("SELECT s3_output_key FROM jobs WHERE user_id=? ORDER BY id DESC", (user_id,)).fetchone()[0]
+    return key, read_artifact(studymate.storage, key)
+
+
+@pytest.fixture
+def shared_output(studymate, monkeypatch):
+    """User 2's job reusing user 1's flashcards for lecture.txt"""
+    monkeypatch.setattr(studymate, "DEDUP_SCOPE", "global")
+    client = studymate.app.test_client()
+    upload(client, 1, LECTURE, "lecture.txt")
+    upload(client, 2, EDITED, "notes.txt")
+    with client.session_transaction() as s:
+        assert s["pending_upload"]["match_filename"] == "lecture.txt"
+    client.post("/upload/resolve", data={"action": "reuse"})
+    assert output_of(studymate, 2) == output_of(studymate, 1)
+    return client
+
+
+def test_owner_reupload_does_not_change_reused_output(studymate, shared_output):
+    reused_key, reused = output_of(studymate, 2)
+    upload(shared_output, 1, UNRELATED, "lecture.txt")
+
+    owner_key, owner_output = output_of(studymate, 1)
+    assert owner_key != reused_key
+    assert owner_output != reused
+    assert output_of(studymate, 2) == (reused_key, reused)
+
+
+def test_revision_deletes_its_unshared_output(studymate):
+    client = studymate.app.test_client()
+    upload(client, 1, LECTURE, "lecture.txt")
+    old_key, _ = output_of(studymate, 1)
+    upload(client, 1, UNRELATED, "lecture.txt")
+
+    new_key, _ = output_of(studymate, 1)
+    assert new_key != old_key
+    assert studymate.storage.head(old_key) is None
+    assert studymate.get_db().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 1
@@ -0,0 +1,49 @@
+import random
+
+from prompt_window import SPAN_MAX_CHARS, select_window, split_spans
+
+random.seed(3)
+TERMS = [f"enzyme{i}" for i in range(300)]
+
+
+def content(words=150):
+    return " ".join(random.choice(TERMS) for _ in range(words)) + "."
+
+
+def test_short_documents_pass_through():
+    text = "Agenda\n\n" + content()
+    assert select_window(text) is text
+
+
+def test_long_paragraphs_are_cut_at_sentences():
+    sentences = [f"Sentence {i} explains {random.choice(TERMS)} in detail." for i in range(200)]
+    spans = split_spans(" ".join(sentences))
+
+    assert all(len(span) <= SPAN_MAX_CHARS for span in spans)
+    assert all(span.endswith(".") for span in spans)
+    assert " ".join(spans) == " ".join(sentences)
+
+
+def test_window_prefers_content_and_keeps_document_order():
+    # A slide deck: title, agenda and section slides first, a divider repeated on every slide
+    slides = ["Biology 101\nLecture 4", "Agenda\nIntro\nEnzymes\nSummary"]
+    slides += [f"Section {i}\nOverview" for i in range(300)]
+    for _ in range(30):
+        slides += ["Department of Biology - University", content()]
+    text = "\n\n".join(slides)
+    window = select_window(text, budget=5000)
+    spans = window.split("\n\n")
+
+    assert len(window) <= 5000
+    assert "enzyme" not in text[:5000]
+    assert sum("enzyme" in span for span in spans) >= 4
+    # Repeated template text is kept at most once
+    assert spans.count("Department of Biology - University") <= 1
+    # The divider is not unique in the text, so only the other spans can be located
+    unique = [span for span in spans if span != "Department of Biology - University"]
+    assert sorted(unique, key=text.index) == unique
+
+
+def test_text_without_any_words_falls_back_to_the_start():
+    text = "-" * 30000
+    assert select_window(text, budget=1000) == text[:1000]
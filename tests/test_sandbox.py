@@ -0,0 +1,113 @@
+import io
+import os
+import sys
+import time
+
+import pytest
+
+from sandbox import Sandbox, SandboxBusy, SandboxCrashed, SandboxError, SandboxMemoryError, SandboxTimeout
+
+# The CPU and memory limits need rlimits and /proc
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs Linux")
+
+
+def spin():
+    while True:
+        pass
+
+
+def allocate(mb):
+    block = bytearray(mb << 20)
+    block[::4096] = b"x" * len(block[::4096])
+    return len(block)
+
+
+def fail():
+    raise ValueError("not a document")
+
+
+@pytest.fixture
+def sandbox():
+    box = Sandbox(max_workers=1, timeout=20, cpu_seconds=1, memory_mb=128, max_tasks=3)
+    yield box
+    box.shutdown()
+
+
+def test_cpu_limit_stops_the_call_and_replaces_the_worker(sandbox):
+    first = sandbox.run(os.getpid)
+    with pytest.raises(SandboxTimeout):
+        sandbox.run(spin)
+
+    assert sandbox.run(os.getpid) != first
+    metrics = sandbox.metrics()
+    assert metrics["timeouts"] == 1
+    assert metrics["recycled"] == 1
+
+
+def test_wall_clock_timeout_kills_the_worker(sandbox):
+    first = sandbox.run(os.getpid)
+    started = time.monotonic()
+    with pytest.raises(SandboxTimeout):
+        sandbox.run(time.sleep, 30, timeout=0.5)
+
+    assert time.monotonic() - started < 10
+    assert sandbox.run(os.getpid) != first
+
+
+def test_memory_limit(sandbox):
+    assert sandbox.run(allocate, 8) == 8 << 20
+    with pytest.raises(SandboxMemoryError):
+        sandbox.run(allocate, 1024)
+
+    assert sandbox.metrics()["memory_kills"] == 1
+    assert sandbox.run(allocate, 8) == 8 << 20
+
+
+def test_workers_are_recycled_after_max_tasks(sandbox):
+    pids = [sandbox.run(os.getpid) for _ in range(4)]
+
+    assert pids[0] == pids[1] == pids[2] != pids[3]
+    assert sandbox.metrics()["recycled"] == 1
+
+
+def test_errors_of_the_function_keep_the_worker(sandbox):
+    first = sandbox.run(os.getpid)
+    with pytest.raises(ValueError):
+        sandbox.run(fail)
+
+    assert sandbox.run(os.getpid) == first
+
+
+def test_crashed_worker_fails_cleanly(sandbox):
+    with pytest.raises(SandboxCrashed):
+        sandbox.run(os._exit, 3)
+
+    assert sandbox.run(allocate, 1) == 1 << 20
+    assert sandbox.metrics()["workers"] == 1
+
+
+def test_busy_pool(sandbox):
+    worker = sandbox._checkout(1)
+    try:
+        with pytest.raises(SandboxBusy):
+            sandbox.run(os.getpid, timeout=0.2)
+    finally:
+        sandbox._checkin(worker, keep=True)
+    assert issubclass(SandboxBusy, SandboxError)
+
+
+def test_busy_extraction_answers_503_without_blaming_the_file(studymate, monkeypatch):
+    def busy(filename, data):
+        raise SandboxBusy("all 2 parsing workers are busy")
+
+    monkeypatch.setattr(studymate, "prepare_text", busy)
+    client = studymate.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+    response = client.post("/upload", data={"kind": "notes", "file": (io.BytesIO(b"lecture"), "lecture.txt")})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert b"try again" in response.data
+    # Not recorded as a failed upload: a retry is processed afresh
+    assert studymate.get_db().execute("SELECT COUNT(*) FROM upload_requests").fetchone()[0] == 0
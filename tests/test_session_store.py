@@ -0,0 +1,118 @@
+import datetime
+import time
+
+import pytest
+from flask import Flask, request, session
+
+from session_store import SqliteSessionInterface
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.permanent_session_lifetime = datetime.timedelta(seconds=60)
+    app.session_interface = SqliteSessionInterface(str(tmp_path / "sessions.db"))
+
+    @app.route("/signin/<int:user_id>")
+    def signin(user_id):
+        session.clear()
+        session["user_id"] = user_id
+        return "ok"
+
+    @app.route("/whoami")
+    def whoami():
+        return str(session.get("user_id"))
+
+    @app.route("/touch")
+    def touch():
+        session["visits"] = session.get("visits", 0) + 1
+        return "ok"
+
+    @app.route("/signout")
+    def signout():
+        session.clear()
+        return "ok"
+
+    return app
+
+
+def sessions(app):
+    conn = app.session_interface._connect()
+    try:
+        return conn.execute("SELECT key, user_id FROM sessions").fetchall()
+    finally:
+        conn.close()
+
+
+def test_cookie_holds_only_an_opaque_id(app):
+    client = app.test_client()
+    client.get("/signin/5")
+    sid = client.get_cookie("session").value
+
+    assert client.get("/whoami").text == "5"
+    assert len(sid) < 64
+    # Only a hash of the id is stored
+    assert [row[1] for row in sessions(app)] == ["5"]
+    assert sessions(app)[0][0] != sid
+
+
+def test_signin_rotates_the_id_and_signout_deletes_the_session(app):
+    client = app.test_client()
+    client.get("/touch")
+    anonymous = client.get_cookie("session").value
+    client.get("/signin/5")
+    assert client.get_cookie("session").value != anonymous
+    assert len(sessions(app)) == 1
+
+    client.get("/signout")
+    assert sessions(app) == []
+    assert client.get("/whoami").text == "None"
+
+
+def test_expired_sessions_are_not_loaded_and_are_swept(app):
+    app.permanent_session_lifetime = datetime.timedelta(seconds=0.2)
+    client = app.test_client()
+    client.get("/signin/5")
+    time.sleep(0.3)
+
+    assert client.get("/whoami").text == "None"
+    assert app.session_interface.sweep() == 1
+    assert sessions(app) == []
+
+
+def test_expiry_is_extended_while_in_use(app):
+    app.permanent_session_lifetime = datetime.timedelta(seconds=0.6)
+    client = app.test_client()
+    client.get("/signin/5")
+    for _ in range(4):
+        time.sleep(0.2)
+        assert client.get("/whoami").text == "5"
+
+
+def test_revoke_user_signs_out_every_device(app):
+    laptop, phone, other = app.test_client(), app.test_client(), app.test_client()
+    laptop.get("/signin/5")
+    phone.get("/signin/5")
+    other.get("/signin/6")
+
+    assert app.session_interface.revoke_user(5) == 2
+    assert laptop.get("/whoami").text == "None"
+    assert phone.get("/whoami").text == "None"
+    assert other.get("/whoami").text == "6"
+
+
+def test_revoked_session_is_not_written_back(app):
+    client = app.test_client()
+    client.get("/signin/5")
+    # A request that was already running when the user was signed out everywhere
+    with app.test_request_context(headers={"Cookie": f"session={client.get_cookie('session').value}"}):
+        interface = app.session_interface
+        stale = interface.open_session(app, request)
+        interface.revoke_user(5)
+        stale["visits"] = 1
+        response = app.response_class()
+        interface.save_session(app, stale, response)
+
+    assert sessions(app) == []
+    assert "session=;" in response.headers["Set-Cookie"]
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from storage import LocalStorage, Storage, safe_filename
+
+
+@pytest.mark.parametrize("filename, expected", [
+    ("lecture.pdf", "lecture.pdf"),
+    ("../../lecture.pdf", "lecture.pdf"),
+    ("C:\\Users\\me\\lecture.pdf", "lecture.pdf"),
+    ("..", ""),
+    (".", ""),
+    ("", ""),
+    (None, ""),
+])
+def test_safe_filename(filename, expected):
+    assert safe_filename(filename) == expected
+
+
+def test_storage_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        Storage()
+    assert isinstance(LocalStorage(tmp_path), Storage)
+
+
+@pytest.mark.parametrize("filename", ["../../lecture.txt", "sub/dir/lecture.txt"])
+def test_upload_with_a_path_in_the_filename(studymate, filename):
+    client = studymate.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+    data = {"kind": "flashcards", "file": (io.BytesIO(b"cells and osmosis " * 50), filename)}
+    response = client.post("/upload", data=data)
+    assert response.status_code == 302
+    key_in, key_out = studymate.get_db().execute("SELECT s3_input_key, s3_output_key FROM jobs").fetchone()
+    assert key_in == "inputs/1/lecture.txt"
+    assert key_out.endswith("/Flash Cards-lecture.txt.txt")
+
+
+def test_upload_named_dot_dot_is_rejected(studymate):
+    client = studymate.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+    response = client.post("/upload", data={"kind": "flashcards", "file": (io.BytesIO(b"text " * 50), "..")})
+    assert response.status_code == 302
+    assert studymate.get_db().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
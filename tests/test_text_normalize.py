@@ -0,0 +1,54 @@
+from text_normalize import PAGE_BREAK, normalize_text
+
+
+def normalized(text):
+    return normalize_text(text)[0]
+
+
+def lecture(pages=10):
+    """Pages with a running header and footer and a "Questions" heading in the body of some"""
+    out = []
+    for p in range(1, pages + 1):
+        lines = ["CS 101 Lecture Notes", f"Chapter {p}"]
+        lines += [f"Sentence {k} about topic {p * k}" for k in range(8)]
+        if p % 2:
+            lines.insert(5, "Questions")
+        lines += ["University of Somewhere", f"Page {p} of {pages}"]
+        out.append("\n".join(lines))
+    return out
+
+
+def test_running_headers_and_footers_are_dropped():
+    text = normalized(PAGE_BREAK.join(lecture()))
+    assert "Lecture Notes" not in text
+    assert "University of Somewhere" not in text
+    assert "Page 3" not in text
+    assert "Sentence 4 about topic 12" in text
+
+
+def test_lines_repeated_in_the_body_are_kept():
+    assert normalized(PAGE_BREAK.join(lecture())).count("Questions") == 5
+
+
+def test_closing_slide_is_dropped():
+    pages = lecture() + ["Questions?\nUniversity of Somewhere\nPage 11 of 11"]
+    assert "Questions?" not in normalized(PAGE_BREAK.join(pages))
+
+
+def test_slide_titles_differing_in_numbers_are_kept():
+    slides = [f"Slide topic {s}\nPoint about thing {s}\nUniversity of Somewhere" for s in range(8)]
+    text = normalized(PAGE_BREAK.join(slides))
+    assert "Slide topic 3" in text and "Point about thing 3" in text
+    assert "University" not in text
+
+
+def test_hyphenated_line_breaks():
+    text = normalized(
+        "Photosyn-\nthesis needs light. A well-\nknown fact. The state-of-the-\nart model.\n"
+        "Long-\nterm memory differs from long-term goals. API-\nbased tools."
+    )
+    assert "Photosynthesis" in text
+    assert "well-known" in text
+    assert "state-of-the-art" in text
+    assert "Long-term memory" in text
+    assert "API-based" in text
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from user_directory import UserDirectory
+
+
+@pytest.fixture
+def connections(tmp_path):
+    path = str(tmp_path / "studymate.db")
+    opened = []
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE IF NOT EXISTS users(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cognito_sub TEXT UNIQUE,
+            email TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""")
+        opened.append(conn)
+        return conn
+    connect.opened = opened
+    return connect
+
+
+def rows(connect):
+    return connect().execute("SELECT id, cognito_sub, email FROM users ORDER BY id").fetchall()
+
+
+def test_first_login_creates_the_user_and_repeats_are_cached(connections):
+    users = UserDirectory(connections)
+    user_id = users.resolve("sub-1", "a@example.com")
+
+    opened = len(connections.opened)
+    assert users.resolve("sub-1", "a@example.com") == user_id
+    assert len(connections.opened) == opened
+    assert rows(connections) == [(user_id, "sub-1", "a@example.com")]
+
+
+def test_existing_row_is_found_by_a_new_process(connections):
+    user_id = UserDirectory(connections).resolve("sub-1", "a@example.com")
+
+    assert UserDirectory(connections).resolve("sub-1", "a@example.com") == user_id
+    assert len(rows(connections)) == 1
+
+
+def test_email_change_updates_the_row_and_the_profile(connections):
+    users = UserDirectory(connections)
+    user_id = users.resolve("sub-1", "old@example.com")
+    assert users.profile(user_id)["email"] == "old@example.com"
+
+    assert users.resolve("sub-1", "new@example.com") == user_id
+    assert rows(connections) == [(user_id, "sub-1", "new@example.com")]
+    assert users.profile(user_id) == {"id": user_id, "cognito_sub": "sub-1", "email": "new@example.com"}
+
+
+def test_concurrent_first_logins_create_one_row(connections):
+    ids = []
+    barrier = threading.Barrier(8)
+
+    def login():
+        users = UserDirectory(connections)
+        barrier.wait()
+        ids.append(users.resolve("sub-1", "a@example.com"))
+
+    threads = [threading.Thread(target=login) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 1
+    assert len(rows(connections)) == 1
+
+
+def test_profile_of_a_deleted_user_expires(connections):
+    users = UserDirectory(connections, ttl=0.1)
+    user_id = users.resolve("sub-1", "a@example.com")
+    assert users.profile(user_id)["cognito_sub"] == "sub-1"
+    assert users.profile(user_id + 1) is None
+
+    conn = connections()
+    conn.execute("DELETE FROM users")
+    conn.commit()
+    assert users.profile(user_id) is not None  # still cached
+    time.sleep(0.15)
+    assert users.profile(user_id) is None
@@ -0,0 +1,150 @@
+# text_normalize.py
+"""
+Clean-up stage between text extraction and generation.
+
+Extracted PDF text is full of running headers, footers and page numbers that
+repeat on every page, and words hyphenated across line breaks; slide decks
+repeat their template text on every slide. All of it eats prompt budget.
+normalize_text() takes the extracted text with pages (or slides) separated by
+PAGE_BREAK and:
+
+- drops lines that repeat in the same place (among the first or last
+  EDGE_LINES lines) across many pages: headers, footers, templates
+- drops page numbers (number-only lines at the top or bottom of a page, so
+  years and table values in the body stay), common boilerplate (copyright,
+  "Confidential", ...) and the "Questions?" / "Thank you" of closing slides
+- joins lowercase words hyphenated across line breaks ("photosyn-" /
+  "thesis"), keeping the hyphen only for known compounds: the hyphenated
+  form is used elsewhere in the text, or the first part is a prefix such as
+  "well-" or "self-"
+- collapses runs of spaces and blank lines
+
+and reports how many characters it saved.
+"""
+import re
+from collections import Counter
+
+PAGE_BREAK = "\f"
+
+# A line is treated as a running header/footer if it appears in the same place on
+# at least this share of pages (and on at least REPEAT_MIN_PAGES pages)
+REPEAT_MIN_SHARE = 0.4
+REPEAT_MIN_PAGES = 3
+# Longer lines are real content even when repeated
+REPEAT_MAX_LINE_CHARS = 120
+# Lines at the top and bottom of a page where running headers/footers live
+EDGE_LINES = 2
+
+_PAGE_NUMBER = re.compile(r"^(?:page|slide|p\.)?\s*\d{1,4}\s*(?:(?:of|/)\s*\d{1,4})?$", re.I)
+_BOILERPLATE = re.compile(
+    r"^(?:"
+    r"(?:©|\(c\)|copyright)\s.*"
+    r"|all rights reserved\.?"
+    r"|(?:strictly\s+)?(?:confidential|proprietary)(?:\s+(?:and|&)\s+(?:confidential|proprietary))?\.?"
+    r"|click to (?:add|edit) (?:text|title|subtitle)"
+    r")$",
+    re.I,
+)
+# Dropped only from a page with nothing else on it (a closing slide), not as a heading
+_CLOSING = re.compile(r"^(?:thank you!?|questions\s*\??|any questions\s*\??)$", re.I)
+_HYPHEN_BREAK = re.compile(r"(\w+(?:-\w+)*)-\n([a-z]\w*)")
+# First parts whose hyphen is kept across a line break ("well-" / "known")
+COMPOUND_PREFIXES = {"all", "cross", "ex", "half", "ill", "non", "self", "well"}
+_COMPOUND = re.compile(r"\w+(?:-\w+)+")
+_SPACES = re.compile(r"[ \t ]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _line_key(line, loose=True):
+    # Running headers often differ only in the page number
+    return re.sub(r"\d+", "#", line.lower()) if loose else line.lower()
+
+
+def _edges(page):
+    """
+    (line index, position) of the lines where running headers and footers sit: the first
+    and last EDGE_LINES non-empty lines, positions counted from the top (0, 1, ...) and
+    the bottom (-1, -2, ...). On a short page a line can have both.
+    """
+    body = [i for i, line in enumerate(page) if line]
+    top = [(i, n) for n, i in enumerate(body[:EDGE_LINES])]
+    bottom = [(i, -1 - n) for n, i in enumerate(reversed(body[-EDGE_LINES:]))]
+    return top + bottom
+
+
+def _edge_keys(page):
+    """(line index, key) of a page's edge lines, the key under which each counts as a repeat"""
+    edges = _edges(page)
+    # Header/footer lines may differ only in their numbers ("Page 3", "Ch. 2 - p. 14"); on a
+    # short page (a slide) that would match its title and bullets too, so there lines match exactly
+    loose = sum(1 for line in page if line) > 2 * EDGE_LINES
+    return [
+        (i, (pos, _line_key(page[i], loose)))
+        for i, pos in edges
+        if len(page[i]) <= REPEAT_MAX_LINE_CHARS
+    ]
+
+
+def _join_hyphenated(text):
+    # A line-end hyphen between lowercase letters is a break inside a word, unless the
+    # hyphenated form is a known compound (or already one: "state-of-the-" / "art")
+    compounds = set(_COMPOUND.findall(text.lower()))
+
+    def join(match):
+        head, tail = match.group(1), match.group(2)
+        if (
+            not head[-1].islower()
+            or "-" in head
+            or head.lower() in COMPOUND_PREFIXES
+            or f"{head}-{tail}".lower() in compounds
+        ):
+            return f"{head}-{tail}"
+        return head + tail
+
+    return _HYPHEN_BREAK.sub(join, text)
+
+
+def _repeated_lines(pages):
+    if len(pages) < REPEAT_MIN_PAGES:
+        return set()
+    seen = Counter()
+    for page in pages:
+        seen.update({key for _, key in _edge_keys(page)})
+    threshold = max(REPEAT_MIN_PAGES, REPEAT_MIN_SHARE * len(pages))
+    return {key for key, count in seen.items() if count >= threshold}
+
+
+def normalize_text(text):
+    """Return (normalized_text, stats) for extracted text with pages separated by PAGE_BREAK"""
+    pages = [
+        [_SPACES.sub(" ", line).strip() for line in page.splitlines()]
+        for page in text.split(PAGE_BREAK)
+    ]
+    repeated = _repeated_lines(pages)
+
+    removed_lines = 0
+    kept_pages = []
+    for page in pages:
+        dropped = {i for i, key in _edge_keys(page) if key in repeated}
+        # Without page breaks a number-only line is content, not a page number
+        if len(pages) > 1:
+            dropped.update(i for i, pos in _edges(page) if pos in (0, -1) and _PAGE_NUMBER.match(page[i]))
+        dropped.update(i for i, line in enumerate(page) if line and _BOILERPLATE.match(line))
+        rest = [i for i, line in enumerate(page) if line and i not in dropped]
+        if len(rest) == 1 and _CLOSING.match(page[rest[0]]):
+            dropped.add(rest[0])
+        removed_lines += len(dropped)
+        kept_pages.append("\n".join(line for i, line in enumerate(page) if i not in dropped).strip())
+
+    out = "\n\n".join(page for page in kept_pages if page)
+    out = _join_hyphenated(out)
+    out = _BLANK_LINES.sub("\n\n", out)
+
+    stats = {
+        "pages": len(pages),
+        "chars_in": len(text),
+        "chars_out": len(out),
+        "chars_saved": len(text) - len(out),
+        "lines_removed": removed_lines,
+    }
+    return out, stats
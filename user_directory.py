@@ -0,0 +1,76 @@
+# user_directory.py
+"""
+Cognito user -> local user row resolution, cached in-process.
+
+Sign-in used to SELECT, INSERT and SELECT again on every login, and two
+concurrent first logins of the same user could both try the INSERT. resolve()
+is a single upsert (INSERT ... ON CONFLICT(cognito_sub) DO UPDATE ...
+RETURNING id) and its result is kept in a TTL cache, so repeat logins within
+the TTL do not touch the database at all. profile() gives login_required a
+cached view of the signed-in user.
+
+Caches are per process and entries expire after `ttl` seconds. resolve() is
+the only writer of the users table: an email change goes through it and
+refreshes the entries it affects, and a user row that no longer exists is
+picked up once its cached profile expires.
+"""
+import threading
+
+
+class UserDirectory:
+    def __init__(self, connect, ttl=300, maxsize=10000):
+        from cachetools import TTLCache
+
+        self._connect = connect
+        self._by_sub = TTLCache(maxsize=maxsize, ttl=ttl)  # cognito_sub -> (id, email)
+        self._profiles = TTLCache(maxsize=maxsize, ttl=ttl)  # id -> profile dict
+        # TTLCache is not thread-safe
+        self._lock = threading.Lock()
+
+    def resolve(self, cognito_sub, email):
+        """Local user id for a Cognito user, creating the row (or updating its email) as needed"""
+        with self._lock:
+            cached = self._by_sub.get(cognito_sub)
+        if cached is not None and cached[1] == email:
+            return cached[0]
+
+        conn = self._connect()
+        try:
+            user_id = conn.execute(
+                "INSERT INTO users(cognito_sub, email) VALUES(?,?) "
+                "ON CONFLICT(cognito_sub) DO UPDATE SET email=excluded.email "
+                "WHERE users.email IS NOT excluded.email "
+                "RETURNING id",
+                (cognito_sub, email),
+            ).fetchone()
+            if user_id is None:
+                # Row exists and is unchanged (the DO UPDATE was skipped, so nothing was returned)
+                user_id = conn.execute("SELECT id FROM users WHERE cognito_sub=?", (cognito_sub,)).fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+
+        user_id = user_id[0]
+        with self._lock:
+            self._by_sub[cognito_sub] = (user_id, email)
+            self._profiles.pop(user_id, None)
+        return user_id
+
+    def profile(self, user_id):
+        """{"id", "cognito_sub", "email"} of a local user, or None if there is no such user"""
+        with self._lock:
+            found = self._profiles.get(user_id)
+        if found is not None:
+            return found
+
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT id, cognito_sub, email FROM users WHERE id=?", (user_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        found = {"id": row[0], "cognito_sub": row[1], "email": row[2]}
+        with self._lock:
+            self._profiles[user_id] = found
+        return found